@@ -0,0 +1,177 @@
+import os
+import re
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from bazel2snyk import logger
+from bazel2snyk.converter import Converter
+from bazel2snyk.converter import NoDependenciesFoundError
+from bazel2snyk.depgraph import iter_json
+from bazel2snyk.export import GraphExporter
+from bazel2snyk.rules import BazelRule
+from bazel2snyk.rules import rule_deps
+
+
+def target_costs(
+    rules_index: Dict[str, BazelRule], targets: Iterable[str]
+) -> Dict[str, int]:
+    """
+    Estimate the cost of converting each target as the number of rules
+    reachable from it
+    """
+    costs = {}
+    for target in targets:
+        reachable = {target}
+        stack = [target]
+        while stack:
+            rule = rules_index.get(stack.pop())
+            if rule is None:
+                continue
+            for dep in rule_deps(rule):
+                if dep not in reachable:
+                    reachable.add(dep)
+                    stack.append(dep)
+        costs[target] = len(reachable)
+    return costs
+
+
+def assign_shards(costs: Dict[str, int], shard_count: int) -> List[List[str]]:
+    """
+    Assign targets to shard_count shards, costliest first to the shard with
+    the least cost so far. Ties are broken by name and shard index, so every
+    machine computes the same assignment from the same rules index.
+    """
+    shards = [[] for _ in range(shard_count)]
+    loads = [0] * shard_count
+    for target in sorted(costs, key=lambda x: (-costs[x], x)):
+        shard_index = min(range(shard_count), key=lambda x: (loads[x], x))
+        shards[shard_index].append(target)
+        loads[shard_index] += costs[target]
+    return shards
+
+
+def output_name(target: str) -> str:
+    """
+    File name for the depGraphs of a target, e.g. app_package_main for
+    //app/package:main
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", target.lstrip("@/")).strip("_")
+
+
+def _convert_target(
+    converter: Converter,
+    target: str,
+    entry: Dict[str, Any],
+    output_dir: str,
+    exporter: GraphExporter = None,
+    **kwargs,
+):
+    """
+    Convert a target and write its depGraphs, recording them in its
+    manifest entry
+    """
+    dep_graphs = converter.convert(target, **kwargs)
+    for source, dep_graph in dep_graphs.items():
+        if dep_graph.is_empty():
+            continue
+        name = output_name(target)
+        if len(dep_graphs) > 1:
+            name = f"{name}.{source}"
+        path = os.path.join(output_dir, f"{name}.json")
+        with open(path, "w") as f:
+            for chunk in iter_json(dep_graph.serializable()):
+                f.write(chunk)
+        entry["outputs"][source] = path
+        if exporter:
+            exporter.export(target, source, dep_graph)
+
+
+def run_shard(
+    converter: Converter,
+    targets: List[str],
+    costs: Dict[str, int],
+    output_dir: str,
+    shard_index: int,
+    shard_count: int,
+    exporter: GraphExporter = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Convert the targets of a shard, write their depGraphs to output_dir and
+    return the shard's manifest of outputs and timings. The depGraphs are
+    also appended to exporter if given. kwargs are passed to
+    Converter.convert().
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    entries = []
+    for target in targets:
+        target_start = time.perf_counter()
+        entry = {"target": target, "estimated_cost": costs[target], "outputs": {}}
+        # a failing target is recorded, so the shard's manifest still lists
+        # the outputs and timings of every other target
+        try:
+            _convert_target(converter, target, entry, output_dir, exporter, **kwargs)
+        except NoDependenciesFoundError as e:
+            logger.error(e)
+            entry["error"] = str(e)
+        except Exception as e:
+            logger.exception(f"Converting {target} failed")
+            entry["error"] = f"{type(e).__name__}: {e}"
+
+        entry["seconds"] = round(time.perf_counter() - target_start, 3)
+        logger.debug(f"{target} converted in {entry['seconds']}s")
+        entries.append(entry)
+
+    return {
+        "shard_index": shard_index,
+        "shard_count": shard_count,
+        "estimated_cost": sum(costs[x] for x in targets),
+        "seconds": round(time.perf_counter() - start, 3),
+        "targets": entries,
+    }
+
+
+def merge_manifests(manifests: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine the manifests of the shards of a batch into one report.
+    Raises ValueError if the manifests are from different batches or
+    repeat a shard.
+    """
+    shard_counts = {x["shard_count"] for x in manifests}
+    if len(shard_counts) != 1:
+        raise ValueError(f"Manifests have different shard counts: {shard_counts}")
+    shard_count = shard_counts.pop()
+
+    shard_indexes = [x["shard_index"] for x in manifests]
+    if len(set(shard_indexes)) != len(shard_indexes):
+        raise ValueError(f"Manifests repeat shards: {sorted(shard_indexes)}")
+
+    manifests = sorted(manifests, key=lambda x: x["shard_index"])
+    targets = sorted(
+        (
+            {**entry, "shard_index": x["shard_index"]}
+            for x in manifests
+            for entry in x["targets"]
+        ),
+        key=lambda x: x["target"],
+    )
+    return {
+        "shard_count": shard_count,
+        "missing_shards": sorted(set(range(shard_count)) - set(shard_indexes)),
+        "shards": [
+            {
+                "shard_index": x["shard_index"],
+                "targets": len(x["targets"]),
+                "estimated_cost": x["estimated_cost"],
+                "seconds": x["seconds"],
+            }
+            for x in manifests
+        ],
+        "seconds": round(sum(x["seconds"] for x in manifests), 3),
+        "max_shard_seconds": max((x["seconds"] for x in manifests), default=0),
+        "failed": [x["target"] for x in targets if "error" in x],
+        "targets": targets,
+    }
@@ -1,8 +1,19 @@
 import re
+import subprocess
 from enum import Enum
+from typing import Dict
 from typing import List
+from typing import Optional
 from xml.etree import ElementTree
 from bazel2snyk import logger
+from bazel2snyk.extractors import EXTRACTORS
+from bazel2snyk.extractors import RepoMatch
+from bazel2snyk.extractors import RepoMatcher
+from bazel2snyk.rules import BazelRule
+from bazel2snyk.rules import ScopeFilter
+from bazel2snyk.rules import build_rules_index
+from bazel2snyk.rules import build_rules_index_from_stream
+from bazel2snyk.rules import rule_deps
 
 
 class BazelNodeType(Enum):
@@ -18,136 +29,91 @@ class BazelNodeType(Enum):
 class BazelXmlParser(object):
     def __init__(
         self,
-        rules_xml: str,
+        rules_xml: str = None,
         pkg_manager_name: str = "maven",
         alt_repo_names: str = None,
+        rules_index: Dict[str, BazelRule] = None,
     ):
+        """
+        Either the query XML output as a string or an already
+        built rules index, e.g. from build_rules_index_from_stream()
+        """
         self.pkg_manager_name = pkg_manager_name
         self.alt_repo_names = alt_repo_names
-        self.package_sources = {"maven": ["@maven"], "pip": ["@py_deps", "@pypi"]}
+        self.package_sources = {
+            name: list(extractor.default_repo_names)
+            for name, extractor in EXTRACTORS.items()
+        }
         if self.alt_repo_names:
             logger.debug(f"{alt_repo_names=}")
-            self.package_sources[pkg_manager_name].extend(
-                alt_repo_names.replace(" ", "").split(",")
-            )
+            for alt_repo_name in alt_repo_names.replace(" ", "").split(","):
+                # alt repo names may be scoped to a package source,
+                # e.g. pip:@snyk_py_deps, otherwise they are added
+                # to the package source being converted
+                package_source, _, repo_name = alt_repo_name.rpartition(":")
+                if package_source and package_source not in self.package_sources:
+                    raise ValueError(
+                        f"Unknown package source {package_source} in "
+                        f"{alt_repo_name}, allowable values are "
+                        f"{','.join(self.package_sources)}"
+                    )
+                self.package_sources[package_source or pkg_manager_name].append(
+                    repo_name
+                )
 
         logger.debug(f"{self.package_sources=}")
 
-        self.rules_xml = rules_xml
-        self.rules = ElementTree.fromstring(rules_xml)
-        self.dep_cache = []
+        if rules_index is None:
+            rules_index = build_rules_index(ElementTree.fromstring(rules_xml))
+        self.rules_index = rules_index
+        logger.debug(f"indexed {len(self.rules_index)} rules")
+        self.dep_cache = {}
+
+        self.extractors = {
+            name: extractor(self.package_sources[name])
+            for name, extractor in EXTRACTORS.items()
+        }
+        for extractor in self.extractors.values():
+            extractor.prepare(self.rules_index)
+
+        self.repo_matcher = RepoMatcher(self.extractors)
+        self._coordinates = self._extract_coordinates()
+
+    def _extract_coordinates(self):
+        """
+        Resolve the coordinates of every dependency in the rule index,
+        one batch per package source
+        """
+        rules_by_package_source = {name: [] for name in self.extractors}
+        for rule in self.rules_index.values():
+            package_source = self.get_package_source(rule.name)
+            if package_source:
+                rules_by_package_source[package_source].append(rule)
+
+        coordinates = {}
+        for name, rules in rules_by_package_source.items():
+            coordinates[name] = self.extractors[name].extract(rules)
+            logger.debug(f"extracted {len(coordinates[name])} {name} coordinates")
+        return coordinates
+
+    def get_package_source(self, node_id: str) -> Optional[str]:
+        """
+        Return the package source a dependency label belongs to, if any
+        """
+        return self.repo_matcher.package_source(node_id)
+
+    def get_repo_match(self, node_id: str) -> Optional[RepoMatch]:
+        """
+        Return the package source and hub repo a dependency label belongs to
+        """
+        return self.repo_matcher.match(node_id)
 
     def get_coordinates_from_bazel_dep(self, bazel_dep, package_source):
-        dep_coordinates = bazel_dep
-        logger.debug(f"{dep_coordinates=}")
-        logger.debug(f"{self.package_sources[package_source]=}")
-        bazel_rules = self.rules
-
-        starts_with_strings = tuple(
-            [x + "//" for x in self.package_sources[package_source]]
-        )
-
-        logger.debug(f"{starts_with_strings=}")
-
-        package_source_match_re_string = ""
-        for index, x in enumerate(self.package_sources[package_source]):
-            if index == 0:
-                package_source_match_re_string = "(" + x + ")"
-            else:
-                package_source_match_re_string += "|(" + x + ")"
-
-            logger.debug(f"{package_source_match_re_string=}")
-
-        re_match_string = rf"^({package_source_match_re_string})_\w+//"
-        logger.debug(f"{re_match_string=}")
-
-        for rule in bazel_rules.findall("rule"):
-            # logger.debug(f"processing {rule.attrib['name']=}")
-            if (
-                re.match(
-                    r".*/BUILD(\.bzl|\.bazel)?\:\d+\:\d+$", rule.attrib["location"]
-                )
-                and rule.attrib["name"] == bazel_dep
-                and (
-                    rule.attrib["name"].startswith(starts_with_strings)
-                    or re.match(rf"{re_match_string}", rule.attrib["name"])
-                )
-            ):
-                # logger.debug(f"found the rule with name: {rule.attrib['name']}")
-                # dynamically call the correct conversion function by name
-                func = getattr(self, f"_get_coordinates_{package_source}")
-                dep_coordinates = func(bazel_dep, rule)
-                dep_coordinates = self.get_snyk_dep_from_coordinates(
-                    dep_coordinates, package_source
-                )
-                logger.debug(f"{dep_coordinates=}")
-        return dep_coordinates
-
-    def _get_coordinates_pip(self, bazel_dep, rule):
         # if we dont find a match, return itself
-        dep_coordinates = bazel_dep
-
-        bazel_dep_prefix = bazel_dep.split(":")[0]
-        logger.debug(f"{bazel_dep_prefix=}")
-
-        children = rule.findall("./list[@name='data']/label")
-        # child of data looks like this
-        # <label value="@py_deps//pypi__requests:requests-2.23.0.dist-info/LICENSE"/>
-        for child in children:
-            logger.debug(f"{ElementTree.tostring(child)=}")
-            if child.attrib["value"].startswith(bazel_dep_prefix):
-                child_value = str(child.attrib["value"])
-                dep_coordinates = child_value
-                logger.debug(f"{dep_coordinates=}")
-                return dep_coordinates
-
-        return dep_coordinates
-
-    def _get_coordinates_maven(self, bazel_dep, rule: ElementTree):
-        # if we dont find a match, return itself
-        dep_coordinates = bazel_dep
-
-        children = rule.findall("./list[@name='tags']/string")
-        # child of data looks like this
-        # <string value="maven_coordinates=org.eclipse.jetty.websocket:websocket-servlet:9.4.40.v20210413"/>
-        for child in children:
-            if child.attrib["value"].startswith("maven_coordinates="):
-                logger.debug(f"processing {child.attrib['value']=}")
-                child_value = str(child.attrib["value"]).split("=").pop()
-                dep_coordinates = child_value
-                return dep_coordinates
-
-        return dep_coordinates
-
-    def get_snyk_dep_from_coordinates(self, dep_coordinates: str, package_source):
-        logger.debug(f"{package_source=}")
-        if package_source in self.package_sources:
-            func = getattr(self, f"{package_source}_bazel_dep_to_snyk_dep")
-            return func(dep_coordinates)
-
-    def maven_bazel_dep_to_snyk_dep(self, dep_coordinates: str):
-        k = dep_coordinates.rfind(":")
-        snyk_dep = dep_coordinates[:k] + "@" + dep_coordinates[k + 1 :]
-        return snyk_dep
-
-    def pip_bazel_dep_to_snyk_dep(self, dep_coordinates: str):
-        snyk_dep = dep_coordinates
-        logger.debug(f"PYTHON TEST: {snyk_dep=}")
-        match = re.search(
-            r"\@.*_.*\:site-packages\/(.*).dist\-info.*\/.*", dep_coordinates
-        )
-        if not match:
-            match = re.search(r"\@.*\/\/pypi__.*\:(.*).dist\-info.*\/", dep_coordinates)
-        if match:
-            snyk_dep = match.group(1)
-            k = snyk_dep.rfind("-")
-            snyk_dep = snyk_dep[:k] + "@" + snyk_dep[k + 1 :]
-            logger.debug(f"{snyk_dep=}")
-
-        return snyk_dep
+        return self._coordinates[package_source].get(bazel_dep, bazel_dep)
 
     def get_node_type(self, node_id: str) -> BazelNodeType:
-        if node_id.startswith(tuple(sum(self.package_sources.values(), []))):
+        if self.repo_matcher.package_source(node_id, prefix=True):
             node_type = BazelNodeType.DEPENDENCY
         elif re.match(r"^\/\/.+\:.+$", node_id):
             node_type = BazelNodeType.INTERNAL_TARGET
@@ -160,42 +126,58 @@ class BazelXmlParser(object):
     def get_children_from_rule(self, parent_node_id: str) -> List[str]:
         logger.debug(f"{parent_node_id}")
 
-        filtered_list = [
-            x for x in self.dep_cache if x["parent_node_id"] == parent_node_id
-        ]
-        if filtered_list:
-            # print("cache hit")
-            return filtered_list[0]["children"]
+        if parent_node_id in self.dep_cache:
+            return self.dep_cache[parent_node_id]
 
-        bazel_rules = self.rules
         child_deps = []
 
-        node_type = BazelNodeType.OTHER
-
-        for rule in bazel_rules.findall("rule"):
-            match = re.match(
-                r".*/BUILD(\.bzl|\.bazel)?\:\d+\:\d+$", rule.attrib["location"]
-            )
-            if not match:
-                continue
-
-            if rule.attrib["name"] == parent_node_id:
-                # print(f"found {parent_node_id=}")
-                node_type = self.get_node_type(rule.attrib["name"])
+        rule = self.rules_index.get(parent_node_id)
+        if rule and self.get_node_type(rule.name) != BazelNodeType.OTHER:
+            child_deps.extend(rule_deps(rule))
 
-                logger.debug(f"{node_type}")
+        self.dep_cache[parent_node_id] = child_deps
 
-                if node_type == BazelNodeType.OTHER:
-                    continue
+        return child_deps
 
-                for dep_list in rule.findall(".//list[@name='deps']") or rule.findall(
-                    ".//list[@name='runtime_deps']"
-                ):
-                    for dep in dep_list:
-                        child_deps.append(dep.attrib["value"])
 
-        self.dep_cache.append(
-            {"parent_node_id": parent_node_id, "children": child_deps}
+class BazelQueryError(Exception):
+    pass
+
+
+def run_bazel_query(
+    query: str,
+    bazel_binary: str = "bazel",
+    workspace_dir: str = None,
+    scope: ScopeFilter = None,
+) -> Dict[str, BazelRule]:
+    """
+    Run bazel query with XML output and index its stdout as it is
+    streamed, so parsing overlaps with bazel producing the output
+    """
+    command = [
+        bazel_binary,
+        "query",
+        query,
+        "--noimplicit_deps",
+        "--output",
+        "xml",
+    ]
+    logger.debug(f"{command=}")
+
+    parse_error = None
+    with subprocess.Popen(command, stdout=subprocess.PIPE, cwd=workspace_dir) as proc:
+        try:
+            rules_index = build_rules_index_from_stream(proc.stdout, scope)
+        except ElementTree.ParseError as e:
+            parse_error = e
+        # drain anything left so bazel can exit
+        proc.stdout.read()
+
+    if proc.returncode != 0:
+        raise BazelQueryError(f"{' '.join(command)} exited with code {proc.returncode}")
+    if parse_error:
+        raise BazelQueryError(
+            f"failed to parse output of {' '.join(command)}: {parse_error}"
         )
 
-        return child_deps
+    return rules_index
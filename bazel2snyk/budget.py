@@ -0,0 +1,142 @@
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+# cut points listed in a truncation report, those with the most work left
+REPORT_CUTS = 20
+
+
+class TraversalBudget(object):
+    """
+    Limits on one traversal: at most max_nodes bazel nodes, expanded at
+    most max_depth levels below the target, within time_budget seconds.
+    Once a limit is hit the traversal stops expanding nodes, which become
+    leaves of the depGraph, and records where it cut.
+    """
+
+    def __init__(
+        self,
+        max_nodes: int = None,
+        max_depth: int = None,
+        time_budget: float = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_nodes is not None and max_nodes < 1:
+            raise ValueError(f"Invalid max nodes of {max_nodes}")
+        if max_depth is not None and max_depth < 0:
+            raise ValueError(f"Invalid max depth of {max_depth}")
+        if time_budget is not None and time_budget <= 0:
+            raise ValueError(f"Invalid time budget of {time_budget}s")
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.clock = clock
+        self.started = clock()
+        self._expired = False
+        self.nodes = set()
+        # bazel node -> {"depth", "reason", "skipped"}, in traversal order
+        self.cuts: Dict[str, dict] = {}
+
+    @classmethod
+    def from_limits(
+        cls, max_nodes: int = None, max_depth: int = None, time_budget: float = None
+    ) -> Optional["TraversalBudget"]:
+        """
+        Budget of the limits given, or None without any
+        """
+        if max_nodes is None and max_depth is None and time_budget is None:
+            return None
+        return cls(max_nodes, max_depth, time_budget)
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.cuts)
+
+    def expired(self) -> bool:
+        if self.time_budget is not None and not self._expired:
+            self._expired = self.clock() - self.started >= self.time_budget
+        return self._expired
+
+    def admit(self, node: str, depth: int, children: List[str]) -> List[str]:
+        """
+        The children of node, at depth below the target, which the
+        traversal may still expand
+        """
+        if not self.nodes:
+            self.nodes.add(node)
+        if not children:
+            return children
+
+        reason = None
+        if self.expired():
+            reason = "time_budget"
+        elif self.max_depth is not None and depth >= self.max_depth:
+            reason = "max_depth"
+        if reason:
+            admitted = []
+        elif self.max_nodes is None:
+            admitted = children
+        else:
+            admitted = []
+            for child in children:
+                if child in self.nodes or len(self.nodes) < self.max_nodes:
+                    self.nodes.add(child)
+                    admitted.append(child)
+                else:
+                    reason = "max_nodes"
+
+        if reason:
+            self.cuts[node] = {
+                "depth": depth,
+                "reason": reason,
+                "skipped": [x for x in children if x not in admitted],
+            }
+        else:
+            # expanded in full on another path
+            self.cuts.pop(node, None)
+            self.nodes.update(children)
+        return admitted
+
+    def report(self, get_children: Callable[[str], List[str]]) -> dict:
+        """
+        What the traversal cut and how much work remained below the cuts.
+        remaining_nodes counts the bazel nodes never reached, each under
+        the first cut it is reachable from.
+        """
+        reached = set(self.nodes).union(self.cuts)
+        cuts = []
+        for node, cut in self.cuts.items():
+            remaining = 0
+            stack = [x for x in cut["skipped"] if x not in reached]
+            reached.update(stack)
+            while stack:
+                remaining += 1
+                for child in get_children(stack.pop()):
+                    if child not in reached:
+                        reached.add(child)
+                        stack.append(child)
+            cuts.append(
+                {
+                    "node": node,
+                    "depth": cut["depth"],
+                    "reason": cut["reason"],
+                    "skipped_children": len(cut["skipped"]),
+                    "remaining_nodes": remaining,
+                }
+            )
+        return {
+            "truncated": self.truncated,
+            "reasons": sorted({x["reason"] for x in cuts}),
+            "limits": {
+                "max_nodes": self.max_nodes,
+                "max_depth": self.max_depth,
+                "time_budget": self.time_budget,
+            },
+            "elapsed_seconds": round(self.clock() - self.started, 3),
+            "nodes": len(self.nodes),
+            "cut_count": len(cuts),
+            "remaining_nodes": sum(x["remaining_nodes"] for x in cuts),
+            "cuts": sorted(cuts, key=lambda x: -x["remaining_nodes"])[:REPORT_CUTS],
+        }
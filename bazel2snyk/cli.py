@@ -1,134 +1,82 @@
+import asyncio
 import requests
 import typer
 import time
 import sys
-import traceback
 import json
+import os
+import sqlite3
 import logging
-from enum import Enum
+from contextlib import ExitStack
+from contextlib import contextmanager
+from typing import Iterable
+from typing import List
 from typing import Optional
+from typing import Tuple
+from typing import Union
 from snyk import SnykClient
+from snyk.errors import SnykHTTPError
+from bazel2snyk.batch import assign_shards
+from bazel2snyk.batch import merge_manifests
+from bazel2snyk.batch import run_shard
+from bazel2snyk.batch import target_costs
+from bazel2snyk.bazel import BazelQueryError
+from bazel2snyk.bazel import run_bazel_query
+from bazel2snyk.budget import TraversalBudget
+from bazel2snyk.client import DEPGRAPH_BASE_MONITOR_URL
+from bazel2snyk.client import DEPGRAPH_BASE_TEST_URL
+from bazel2snyk.client import SessionSnykClient
+from bazel2snyk.converter import BAZEL_TARGET_VERSION_STRING
+from bazel2snyk.converter import Bazel2Snyk  # noqa: F401
+from bazel2snyk.converter import BazelPackageSource  # noqa: F401
+from bazel2snyk.converter import Converter
+from bazel2snyk.converter import allowable_package_sources
+from bazel2snyk.converter import truncation_summary
 from bazel2snyk.depgraph import DepGraph
-from bazel2snyk.bazel import BazelXmlParser
-from bazel2snyk.bazel import BazelNodeType
+from bazel2snyk.depgraph import iter_json
+from bazel2snyk.export import GraphExporter
+from bazel2snyk.graph_store import GRAPH_STORES
+from bazel2snyk.maven_install import load_maven_install
+from bazel2snyk.maven_install import merge_maven_install
+from bazel2snyk.rate_limit import DEFAULT_RATE_LIMIT_FILE
+from bazel2snyk.rate_limit import RateLimiter
+from bazel2snyk.result_cache import ResultCache
+from bazel2snyk.result_cache import depgraph_digest
+from bazel2snyk.reverse_index import reverse_dependencies
+from bazel2snyk.reverse_index import top_level_targets
+from bazel2snyk.reverse_index import write_reverse_index
+from bazel2snyk.reverse_index import who_depends as lookup_reverse_dependencies
+from bazel2snyk.rules import ScopeFilter
+from bazel2snyk.rules import apply_scope
+from bazel2snyk.rules import build_rules_index_parallel
+from bazel2snyk.rules import load_rules_index
+from bazel2snyk.rules import subset_rules_index
+from bazel2snyk.rules import write_rules_index
+from bazel2snyk.sharding import merge_test_responses
+from bazel2snyk.sharding import shard_dep_graph
+from bazel2snyk.streaming import iter_response_members
+from bazel2snyk.streaming import merge_test_summaries
+from bazel2snyk.streaming import response_ok
+from bazel2snyk.streaming import summarize_test_response
+from bazel2snyk.tree import TREE_FORMATS
+from bazel2snyk.tree import write_dependency_tree
+from bazel2snyk.upload import status_table
+from bazel2snyk.upload import upload_targets
 from bazel2snyk import logger
 
 cli = typer.Typer(add_completion=False)
 
-# globals
-# snyk depgraph test/monitor base URLs
-DEPGRAPH_BASE_TEST_URL = "/test/dep-graph?org="
-DEPGRAPH_BASE_MONITOR_URL = "/monitor/dep-graph?org="
+# default location of cached test results
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "bazel2snyk"
+)
 
-# version is required by Snyk depGraph API
-# setting bazel targets version as "bazel"
-BAZEL_TARGET_VERSION_STRING = "bazel"
-
-# set allowable package sources
-allowable_package_sources = ["maven", "pip"]
-BazelPackageSource = Enum("PackageSource", allowable_package_sources)
-
-
-# Class for app methods and state
-# -----------------
-class Bazel2Snyk(object):
-    def __init__(
-        self,
-        bazel_xml_parser: BazelXmlParser,
-        dep_graph: DepGraph,
-    ):
-        self.bazel_xml_parser = bazel_xml_parser
-        self.dep_graph = dep_graph
-        self._visited = []
-        self._visited_temp = []
-        self._oss_deps_count = 0
-
-    def bazel_to_depgraph(self, parent_node_id: str, depth: int):
-        """
-        Recursive function that will walk the bazel dep tree.
-        """
-        logger.debug(f"{parent_node_id=},{depth=}")
-        logger.debug(f"{self._visited_temp=}")
-
-        children = self.bazel_xml_parser.get_children_from_rule(
-            parent_node_id=parent_node_id
-        )
-        logger.debug(f"{parent_node_id} child count: {len(children)}")
-
-        parent_dep_snyk = self.snyk_dep_from_bazel_dep(
-            parent_node_id, self.bazel_xml_parser.pkg_manager_name
-        )
-
-        if parent_dep_snyk != parent_node_id and not parent_dep_snyk.endswith(
-            f"{BAZEL_TARGET_VERSION_STRING}"
-        ):
-            self._oss_deps_count += 1
-            logger.debug(f"{self._oss_deps_count=}")
-
-        # special entry for the root node of the dep graph
-        if depth == 0:
-            self.dep_graph.set_root_node_package(parent_dep_snyk)
-
-        for child in children:
-            child_dep_for_snyk = self.snyk_dep_from_bazel_dep(
-                child, self.bazel_xml_parser.pkg_manager_name
-            )
-            output_padding = ""
-
-            # set output padding for --print-deps option
-            for i in range(0, depth):
-                output_padding += "- - "
-
-            if self.bazel_xml_parser.get_node_type(child) in [
-                BazelNodeType.INTERNAL_TARGET,
-                BazelNodeType.EXTERNAL_TARGET,
-                BazelNodeType.DEPENDENCY,
-            ]:
-                logger.info(f"{output_padding}{child_dep_for_snyk}")
-
-            logger.debug(f"adding pkg {child_dep_for_snyk=}")
-            self.dep_graph.add_pkg(child_dep_for_snyk)
-
-            logger.debug(f"adding dep {child_dep_for_snyk=} for {parent_dep_snyk=}")
-            self.dep_graph.add_dep(child_dep_for_snyk, parent_dep_snyk)
-
-            self._visited_temp.append(parent_node_id)
-
-            # if we've already processed this subtree, then just return
-            if child not in self._visited:
-                logger.debug(f"{child} not yet visited, traversing...")
-                self.bazel_to_depgraph(child, depth=depth + 1)
-        # else:
-        # future use for smarter pruning
-        # account for node in the subtree to count all paths
-
-        # we've reach a leaf node and just need to add an entry with empty deps array
-        if len(children) == 0:
-            self.dep_graph.add_dep(child_node_id=None, parent_node_id=parent_dep_snyk)
-            self._visited.extend(self._visited_temp)
-
-            self._visited_temp = []
-
-    def snyk_dep_from_bazel_dep(
-        self, bazel_dep_id: str, package_source: BazelPackageSource
-    ) -> str:
-        """
-        Produce dependency coordinates in format package@version for Snyk
-        from the bazel dependency identifier
-        """
-        logger.debug(f"{package_source=},{bazel_dep_id=}")
-
-        node_type: BazelNodeType = self.bazel_xml_parser.get_node_type(bazel_dep_id)
-        logger.debug(f"{node_type=}")
-
-        if node_type == BazelNodeType.DEPENDENCY:
-            snyk_dep = self.bazel_xml_parser.get_coordinates_from_bazel_dep(
-                bazel_dep_id, package_source
-            )
-            logger.debug(f"{snyk_dep=}")
-            return snyk_dep
-        else:
-            return f"{bazel_dep_id}@{BAZEL_TARGET_VERSION_STRING}"
+# output formats of the test command
+TEST_OUTPUT_FORMATS = ("json", "summary", "raw", "none")
+# endpoints the upload command posts depGraphs to
+UPLOAD_PATHS = {"test": DEPGRAPH_BASE_TEST_URL, "monitor": DEPGRAPH_BASE_MONITOR_URL}
+# bytes of a streamed test response read at a time
+RESPONSE_CHUNK_SIZE = 64 << 10
 
 
 def load_file(file_path: str) -> str:
@@ -141,50 +89,359 @@ def load_file(file_path: str) -> str:
     return data
 
 
+def comma_delimited(value: Optional[str]) -> Tuple[str, ...]:
+    """
+    Split a comma-delimited option value
+    """
+    if not value:
+        return ()
+    return tuple(value.replace(" ", "").split(","))
+
+
 def package_source_callback(value: str):
     """
     Check if specified package-source is a valid value
     """
     typer.echo(f"package_source: {value}", file=sys.stderr)
 
-    if value not in allowable_package_sources:
+    for package_source in value.replace(" ", "").split(","):
+        if package_source not in allowable_package_sources:
+            raise typer.BadParameter(
+                f"Allowable values are {','.join(allowable_package_sources)}, you entered: {value}"
+            )
+
+    return value
+
+
+def alt_repo_names_callback(value: Optional[str]):
+    """
+    Check that the package sources alt repo names are prefixed with are valid
+    """
+    for alt_repo_name in comma_delimited(value):
+        package_source = alt_repo_name.rpartition(":")[0]
+        if package_source and package_source not in allowable_package_sources:
+            raise typer.BadParameter(
+                f"Unknown package source {package_source} in {alt_repo_name}, "
+                f"allowable values are {','.join(allowable_package_sources)}"
+            )
+
+    return value
+
+
+def graph_store_callback(value: str):
+    """
+    Check if specified graph-store is a valid value
+    """
+    if value not in GRAPH_STORES:
         raise typer.BadParameter(
-            f"Allowable values are {','.join(allowable_package_sources)}, you entered: {value}"
+            f"Allowable values are {','.join(GRAPH_STORES)}, you entered: {value}"
         )
 
     return value
 
 
+def output_format_callback(value: str):
+    """
+    Check if specified output-format is a valid value
+    """
+    if value not in TEST_OUTPUT_FORMATS:
+        raise typer.BadParameter(
+            f"Allowable values are {','.join(TEST_OUTPUT_FORMATS)}, "
+            f"you entered: {value}"
+        )
+
+    return value
+
+
+def print_deps_format_callback(value: str):
+    """
+    Check if specified print-deps-format is a valid value
+    """
+    if value not in TREE_FORMATS:
+        raise typer.BadParameter(
+            f"Allowable values are {','.join(TREE_FORMATS)}, you entered: {value}"
+        )
+
+    return value
+
+
+def upload_command_callback(value: str):
+    """
+    Check if specified upload command is a valid value
+    """
+    if value not in UPLOAD_PATHS:
+        raise typer.BadParameter(
+            f"Allowable values are {','.join(UPLOAD_PATHS)}, you entered: {value}"
+        )
+
+    return value
+
+
+def per_package_source(func):
+    """
+    Apply func to the converted depGraph, or to each depGraph keyed by
+    package source when several package sources were converted
+    """
+    if len(bazel2snyk.dep_graphs) == 1:
+        return func(bazel2snyk.dep_graph)
+    return {
+        source: func(dep_graph) for source, dep_graph in bazel2snyk.dep_graphs.items()
+    }
+
+
+def request_body(body: Union[dict, DepGraph]):
+    """
+    A DepGraph's request body spooled to a temporary file, see
+    DepGraph.request_body(), or a request body dict as is
+    """
+    if isinstance(body, DepGraph):
+        return body.request_body()
+    return body
+
+
+def close_request_bodies(posts: Iterable[tuple]):
+    """
+    Close the spooled request bodies of (path, body) POSTs
+    """
+    for _, body in posts:
+        if hasattr(body, "close"):
+            body.close()
+
+
+@contextmanager
+def exit_on_api_error(action: str):
+    """
+    Log a failed Snyk API request in one line, and any other failure with
+    its traceback, and exit with code 2. Exit code 1 means vulnerabilities
+    were found, so a response that is not JSON must not exit with it either.
+    """
+    try:
+        yield
+    except SnykHTTPError:
+        # the response body was logged by the client
+        logger.error(f"Snyk API {action} request failed")
+        sys.exit(2)
+    except requests.RequestException as e:
+        logger.error(f"Snyk API {action} request failed: {e}")
+        sys.exit(2)
+    except Exception:
+        logger.exception(f"Snyk API {action} failed")
+        sys.exit(2)
+
+
+def responses_ok(json_response) -> bool:
+    """
+    Check the ok status of a Snyk API response, or of every response
+    keyed by package source
+    """
+    if "ok" in json_response:
+        return str(json_response["ok"]) != "False"
+    return all(str(x["ok"]) != "False" for x in json_response.values())
+
+
 @cli.callback(no_args_is_help=True)
 def main(
     ctx: typer.Context,
     bazel_deps_xml: str = typer.Option(
         "bazel_deps.xml",
         envvar=" bazel_deps_xml",
-        help="Path to bazel query XML output file",
+        help="Path to bazel query XML output file, or to a rules index written with "
+        "--write-subset",
+    ),
+    bazel_query: str = typer.Option(
+        None,
+        envvar="BAZEL_QUERY",
+        help="Run bazel query with this expression and stream its output instead of "
+        "reading --bazel-deps-xml, e.g. deps(//store/api:main)",
+    ),
+    bazel_binary: str = typer.Option(
+        "bazel",
+        envvar="BAZEL_BINARY",
+        help="Path to the bazel binary used with --bazel-query",
+    ),
+    parse_workers: int = typer.Option(
+        1,
+        envvar="PARSE_WORKERS",
+        min=0,
+        help="Number of processes used to parse --bazel-deps-xml in chunks, 0 to use "
+        "all cores",
+    ),
+    maven_install: str = typer.Option(
+        None,
+        envvar="MAVEN_INSTALL",
+        help="Path to a rules_jvm_external maven_install.json lockfile to read the "
+        "maven artifact graph from, so the query output only needs the targets down "
+        "to the maven repo",
+    ),
+    maven_install_repo: str = typer.Option(
+        "@maven",
+        envvar="MAVEN_INSTALL_REPO",
+        help="Name of the repo the artifacts of --maven-install are in",
+    ),
+    maven_install_cache_dir: str = typer.Option(
+        None,
+        envvar="MAVEN_INSTALL_CACHE_DIR",
+        help="Directory to keep the artifact closures of --maven-install in, so they "
+        "are computed once per lockfile",
     ),
     bazel_target: str = typer.Option(
-        ..., envvar="BAZEL_TARGET", help="Name of the target, e.g. //store/api:main"
+        None,
+        envvar="BAZEL_TARGET",
+        help="Name of the target, e.g. //store/api:main. Not used by index, batch, "
+        "upload, who-depends and merge",
+    ),
+    write_subset: str = typer.Option(
+        None,
+        envvar="WRITE_SUBSET",
+        help="Write the rules reachable from --bazel-target to this path for reuse "
+        "with --bazel-deps-xml, as query XML if it ends with .xml and as a JSON index "
+        "otherwise",
     ),
     package_source: str = typer.Option(
         "maven",
         callback=package_source_callback,
         case_sensitive=False,
         envvar="PACKAGE_SOURCE",
-        help="Name of the target, e.g. //store/api:main",
+        help="Package source to convert, or a comma-delimited list to convert several "
+        "in one pass, e.g. maven,pip",
     ),
     alt_repo_names: str = typer.Option(
         None,
+        callback=alt_repo_names_callback,
         case_sensitive=False,
         envvar="ALT_REPO_NAMES",
-        help="specify comma-delimitied list if you have repos with different names for either @maven or @pypi, e.g. @maven_repo_1, @maven_repo_2",
+        help="specify comma-delimitied list if you have repos with different names "
+        "for either @maven or @pypi, e.g. @maven_repo_1, @maven_repo_2. Prefix with "
+        "the package source when converting several, e.g. pip:@snyk_py_deps",
+    ),
+    graph_store: str = typer.Option(
+        "memory",
+        callback=graph_store_callback,
+        envvar="GRAPH_STORE",
+        help="Storage engine for the depGraph, memory or sqlite to keep graphs too "
+        "large for memory on disk",
+    ),
+    graph_store_dir: str = typer.Option(
+        None,
+        envvar="GRAPH_STORE_DIR",
+        help="Directory for the temporary files of --graph-store=sqlite, SQLite's "
+        "temporary directory by default",
+    ),
+    exclude_testonly: bool = typer.Option(
+        False,
+        envvar="EXCLUDE_TESTONLY",
+        help="Leave out rules with testonly set, and their dependencies",
+    ),
+    exclude_rule_classes: str = typer.Option(
+        None,
+        envvar="EXCLUDE_RULE_CLASSES",
+        help="Comma-delimited list of rule classes to leave out, e.g. "
+        "java_test,sh_binary",
+    ),
+    exclude_tags: str = typer.Option(
+        None,
+        envvar="EXCLUDE_TAGS",
+        help="Comma-delimited list of tag patterns of rules to leave out, e.g. "
+        "manual,no-snyk*",
+    ),
+    include_labels: str = typer.Option(
+        None,
+        envvar="INCLUDE_LABELS",
+        help="Comma-delimited list of label patterns of the first-party rules to "
+        "convert, e.g. //app/*",
+    ),
+    exclude_labels: str = typer.Option(
+        None,
+        envvar="EXCLUDE_LABELS",
+        help="Comma-delimited list of label patterns of rules to leave out, e.g. "
+        "//tools/*,@maven//:junit_*",
+    ),
+    dep_attrs: str = typer.Option(
+        None,
+        envvar="DEP_ATTRS",
+        help="Comma-delimited list of attributes followed to dependencies, by default "
+        "deps or, without deps, runtime_deps",
+    ),
+    rate_limit: float = typer.Option(
+        None,
+        envvar="RATE_LIMIT",
+        help="Requests per second to the Snyk API, shared by every bazel2snyk process "
+        "on the host using the same --rate-limit-file",
+    ),
+    rate_limit_burst: int = typer.Option(
+        1,
+        min=1,
+        envvar="RATE_LIMIT_BURST",
+        help="Number of requests that may be issued at once within --rate-limit",
+    ),
+    rate_limit_file: str = typer.Option(
+        DEFAULT_RATE_LIMIT_FILE,
+        envvar="RATE_LIMIT_FILE",
+        help="File through which processes share --rate-limit",
     ),
     debug: bool = typer.Option(False, help="Set log level to debug"),
     print_deps: bool = typer.Option(False, help="Print bazel dependency structure"),
+    print_deps_file: str = typer.Option(
+        None,
+        envvar="PRINT_DEPS_FILE",
+        help="File to write --print-deps to, - for stdout, stderr by default",
+    ),
+    print_deps_format: str = typer.Option(
+        "text",
+        envvar="PRINT_DEPS_FORMAT",
+        callback=print_deps_format_callback,
+        help=f"Format of --print-deps, one of {', '.join(TREE_FORMATS)}",
+    ),
+    print_deps_depth: Optional[int] = typer.Option(
+        None,
+        envvar="PRINT_DEPS_DEPTH",
+        min=0,
+        help="Print at most this many levels below the target with --print-deps",
+    ),
     prune_all: bool = typer.Option(False, help="Prune all repeated sub-dependencies"),
     prune: bool = typer.Option(
         False, help="Prune repeated sub-dependencies that cross a threshold"
     ),
+    collapse: bool = typer.Option(
+        False,
+        envvar="COLLAPSE",
+        help="Leave bazel targets out of the depGraph, connecting each dependency to "
+        "its nearest dependency or the root",
+    ),
+    collapse_depth: int = typer.Option(
+        0,
+        envvar="COLLAPSE_DEPTH",
+        min=0,
+        help="Keep the bazel targets up to this many levels below the root with "
+        "--collapse",
+    ),
+    max_nodes: Optional[int] = typer.Option(
+        None,
+        envvar="MAX_NODES",
+        min=1,
+        help="Stop expanding the traversal once it reached this many bazel nodes, "
+        "producing a depGraph marked as truncated",
+    ),
+    max_depth: Optional[int] = typer.Option(
+        None,
+        envvar="MAX_DEPTH",
+        min=0,
+        help="Expand the traversal at most this many levels below the target, "
+        "producing a depGraph marked as truncated",
+    ),
+    time_budget: Optional[float] = typer.Option(
+        None,
+        envvar="TIME_BUDGET",
+        min=0.001,
+        help="Stop expanding the traversal after this many seconds, producing a "
+        "depGraph marked as truncated",
+    ),
+    truncation_report: Optional[str] = typer.Option(
+        None,
+        envvar="TRUNCATION_REPORT",
+        help="Write a JSON report of what --max-nodes, --max-depth or --time-budget "
+        "cut to this file",
+    ),
 ):
     """
     Convert Bazel query output to Snyk depGraph for testing and monitoring
@@ -198,19 +455,116 @@ def main(
     logger.debug(f"{prune=}")
     logger.debug(f"{prune_all=}")
 
-    bazel_deps_xml_contents = load_file(bazel_deps_xml)
+    global rate_limiter
+    rate_limiter = None
+    if rate_limit is not None:
+        try:
+            rate_limiter = RateLimiter(rate_limit, rate_limit_burst, rate_limit_file)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--rate-limit")
+        ctx.call_on_close(
+            lambda: typer.echo(
+                f"Rate limiter: {json.dumps(rate_limiter.metrics())}", file=sys.stderr
+            )
+        )
+
+    # who-depends and merge read previously written files alone
+    if ctx.invoked_subcommand in ("who-depends", "merge"):
+        return
 
-    typer.echo("Bazel query output file loaded", file=sys.stderr)
+    if bazel_target is None and ctx.invoked_subcommand not in (
+        "index",
+        "batch",
+        "upload",
+    ):
+        raise typer.BadParameter(
+            "Missing option '--bazel-target'", param_hint="--bazel-target"
+        )
+
+    scope = None
+    scope_options = (exclude_rule_classes, exclude_tags, include_labels, exclude_labels)
+    if exclude_testonly or dep_attrs or any(scope_options):
+        scope = ScopeFilter(
+            exclude_testonly,
+            *(comma_delimited(x) for x in scope_options),
+            dep_attrs=comma_delimited(dep_attrs),
+        )
+        logger.debug(f"{scope=}")
+
+    if bazel_query:
+        typer.echo(f"Running bazel query: {bazel_query}", file=sys.stderr)
+        try:
+            rules_index = run_bazel_query(bazel_query, bazel_binary, scope=scope)
+        except (BazelQueryError, OSError) as e:
+            logger.error(e)
+            sys.exit(2)
+        typer.echo("Bazel query output loaded", file=sys.stderr)
+    else:
+        try:
+            if parse_workers != 1:
+                rules_index = build_rules_index_parallel(
+                    bazel_deps_xml, parse_workers or None, scope=scope
+                )
+            else:
+                rules_index = load_rules_index(bazel_deps_xml, scope)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--bazel-deps-xml")
+        typer.echo("Bazel query output file loaded", file=sys.stderr)
     typer.echo("----------------------------", file=sys.stderr)
 
-    global bazel2snyk
-    bazel2snyk = Bazel2Snyk(
-        BazelXmlParser(
-            rules_xml=bazel_deps_xml_contents,
-            pkg_manager_name=package_source,
+    closures = None
+    if maven_install:
+        lockfile = load_maven_install(
+            maven_install, maven_install_repo, maven_install_cache_dir
+        )
+        rules_index = merge_maven_install(rules_index, lockfile)
+        closures = lockfile.closures
+        if scope:
+            # the artifacts of the lockfile are in scope only if admitted too
+            rules_index = apply_scope(rules_index, scope)
+            closures = None
+        typer.echo(f"{maven_install} loaded", file=sys.stderr)
+
+    package_sources = package_source.replace(" ", "").split(",")
+
+    # index, batch and upload walk many targets, so the whole index is kept
+    if ctx.invoked_subcommand in ("index", "batch", "upload"):
+        global converter, convert_options
+        converter = Converter(
+            rules_index,
+            package_sources=package_sources,
             alt_repo_names=alt_repo_names,
-        ),
-        DepGraph(package_source),
+            graph_store=graph_store,
+            graph_store_dir=graph_store_dir,
+        )
+        convert_options = {
+            "prune": prune,
+            "prune_all": prune_all,
+            "collapse": collapse,
+            "collapse_depth": collapse_depth,
+            "max_nodes": max_nodes,
+            "max_depth": max_depth,
+            "time_budget": time_budget,
+        }
+        return
+
+    # only the closure of the target is needed for the conversion
+    logger.debug(f"{len(rules_index)} rules loaded")
+    rules_index = subset_rules_index(rules_index, [bazel_target], closures)
+    logger.debug(f"{len(rules_index)} rules reachable from {bazel_target}")
+
+    if write_subset:
+        write_rules_index(rules_index, write_subset)
+        typer.echo(
+            f"Rules reachable from target written to {write_subset}", file=sys.stderr
+        )
+
+    converter = Converter(
+        rules_index,
+        package_sources=package_sources,
+        alt_repo_names=alt_repo_names,
+        graph_store=graph_store,
+        graph_store_dir=graph_store_dir,
     )
 
     typer.echo(
@@ -219,24 +573,56 @@ def main(
         file=sys.stderr,
     )
 
-    bazel2snyk.bazel_to_depgraph(parent_node_id=bazel_target, depth=0)
+    global bazel2snyk
+    bazel2snyk = converter.traverse(
+        bazel_target, TraversalBudget.from_limits(max_nodes, max_depth, time_budget)
+    )
+    if bazel2snyk.truncation:
+        logger.warning(truncation_summary(bazel_target, bazel2snyk.truncation))
+    if truncation_report:
+        with open(truncation_report, "w") as f:
+            json.dump(bazel2snyk.truncation or {"truncated": False}, f, indent=4)
+        typer.echo(f"Truncation report written to {truncation_report}", file=sys.stderr)
 
-    if len(bazel2snyk.dep_graph.graph().depGraph.graph.nodes) <= 1:
+    if print_deps:
+        tree_options = {
+            "max_depth": print_deps_depth,
+            "output_format": print_deps_format,
+        }
+        if print_deps_file in (None, "-"):
+            out = sys.stdout if print_deps_file == "-" else sys.stderr
+            write_dependency_tree(bazel2snyk, bazel_target, out, **tree_options)
+            out.flush()
+        else:
+            with open(print_deps_file, "w") as f:
+                write_dependency_tree(bazel2snyk, bazel_target, f, **tree_options)
+
+    empty_package_sources = bazel2snyk.empty_package_sources()
+    for source in empty_package_sources:
         logger.error(
-            f"No {package_source} dependencies found for given target, please verify --bazel-target exists in the source data"
+            f"No {source} dependencies found for given target, "
+            "please verify --bazel-target exists in the source data"
         )
+    if len(empty_package_sources) == len(bazel2snyk.dep_graphs):
         sys.exit(2)
 
     if prune_all:
         logger.info("Pruning graph ...")
         time.sleep(2)
         # bazel2snyk.prune_graph_all()
-        bazel2snyk.dep_graph.prune_graph_all()
+        for dep_graph in bazel2snyk.dep_graphs.values():
+            dep_graph.prune_graph_all()
     elif prune:
         time.sleep(2)
         logger.info("Smart pruning graph (experimental) ...")
         # bazel2snyk.prune_graph(20, 5)
-        bazel2snyk.dep_graph.prune_graph(20, 5)
+        for dep_graph in bazel2snyk.dep_graphs.values():
+            dep_graph.prune_graph(20, 5)
+
+    if collapse:
+        logger.info("Collapsing bazel targets ...")
+        for dep_graph in bazel2snyk.dep_graphs.values():
+            dep_graph.collapse_graph(BAZEL_TARGET_VERSION_STRING, collapse_depth)
     return
 
 
@@ -247,7 +633,36 @@ def print_graph():
     """
     # print(f"{json.dumps(bazel2snyk.dep_graph.graph(), indent=4)}")
     # print({bazel2snyk.dep_graph.graph().model_dump_json(indent=4)})
-    print(json.dumps(bazel2snyk.dep_graph.graph().model_dump(), indent=4))
+    # written in chunks, so disk-backed graphs are never loaded in full
+    for chunk in iter_json(
+        per_package_source(lambda dep_graph: dep_graph.serializable()), indent=4
+    ):
+        sys.stdout.write(chunk)
+    sys.stdout.write("\n")
+
+
+@cli.command()
+def export(
+    ctx: typer.Context,
+    export_dir: str = typer.Option(
+        "bazel2snyk_export",
+        envvar="EXPORT_DIR",
+        help="Directory of the NDJSON tables to append the depGraph to",
+    ),
+    run: str = typer.Option(
+        None,
+        envvar="EXPORT_RUN",
+        help="Label of this run in the tables, by default the current time",
+    ),
+):
+    """
+    Append the depGraph's targets, pkgs, nodes and edges to NDJSON tables
+    """
+    with GraphExporter(export_dir, run) as exporter:
+        for source, dep_graph in bazel2snyk.dep_graphs.items():
+            if not dep_graph.is_empty():
+                exporter.export(ctx.parent.params["bazel_target"], source, dep_graph)
+    typer.echo(f"depGraph exported to {export_dir}", file=sys.stderr)
 
 
 @cli.command()
@@ -260,27 +675,170 @@ def test(
         envvar="SNYK_ORG_ID",
         help="Please specify the Snyk ORG ID to run commands against",
     ),
+    snyk_api_url: str = typer.Option(
+        SnykClient.API_URL, envvar="SNYK_API", help="Snyk API base URL"
+    ),
+    cache: bool = typer.Option(
+        True,
+        "--cache/--no-cache",
+        help="Reuse test results of depGraphs with identical packages and edges",
+    ),
+    cache_dir: str = typer.Option(
+        DEFAULT_CACHE_DIR,
+        envvar="BAZEL2SNYK_CACHE_DIR",
+        help="Directory to cache test results in, may be shared between runs and "
+        "machines",
+    ),
+    cache_ttl: int = typer.Option(
+        3600,
+        envvar="BAZEL2SNYK_CACHE_TTL",
+        help="Seconds a cached test result is reused for",
+    ),
+    cache_max_mb: int = typer.Option(
+        256,
+        envvar="BAZEL2SNYK_CACHE_MAX_MB",
+        help="Size of the cache directory above which the least recently used results "
+        "are evicted",
+    ),
+    shards: int = typer.Option(
+        1,
+        envvar="SHARDS",
+        help="Split the depGraph into up to this many depGraphs by top-level "
+        "dependency, test them concurrently and merge the results",
+    ),
+    output_format: str = typer.Option(
+        "json",
+        callback=output_format_callback,
+        envvar="OUTPUT_FORMAT",
+        help="json for the full response, summary for the issue ids, severities and "
+        "vulnerable packages alone, raw to copy the response bytes unmodified, or "
+        "none to read no further than the ok status",
+    ),
+    output_file: Optional[str] = typer.Option(
+        None,
+        envvar="OUTPUT_FILE",
+        help="Write the test result to this file instead of STDOUT",
+    ),
 ):
     """
     Test your Bazel target's OSS depedencies for security issues with Snyk
     """
-    try:
-        snyk_client = SnykClient(snyk_token)
-        typer.echo("Snyk client created successfully", file=sys.stderr)
+    if output_format == "raw" and shards > 1:
+        raise typer.BadParameter(
+            "raw responses cannot be merged, use json or summary with --shards",
+            param_hint="--output-format",
+        )
+
+    result_cache = None
+    # streamed responses are never held in full, so are not cached
+    if cache and output_format == "json":
+        try:
+            result_cache = ResultCache(cache_dir, cache_ttl, cache_max_mb << 20)
+        except OSError as e:
+            # e.g. a read-only home directory, which should not fail the test
+            logger.warning(f"Not caching test results in {cache_dir}: {e}")
 
-        typer.echo("Testing depGraph via Snyk API ...", file=sys.stderr)
-        response: requests.Response = snyk_client.post(
-            f"{DEPGRAPH_BASE_TEST_URL}{snyk_org_id}",
-            body=bazel2snyk.dep_graph.graph().model_dump(),
+    def stream_summary(resp) -> dict:
+        return summarize_test_response(
+            iter_response_members(resp.iter_content(RESPONSE_CHUNK_SIZE))
         )
 
-        json_response = response.json()
-        print(json.dumps(json_response, indent=4))
-    except:  # noqa: E722
-        traceback.print_exc()
-        sys.exit(2)
+    def stream_ok(resp) -> dict:
+        # the response is left unread after ok
+        ok = response_ok(iter_response_members(resp.iter_content(RESPONSE_CHUNK_SIZE)))
+        return {"ok": ok, "issues": {}}
+
+    def stream_raw(resp) -> dict:
+        chunks = resp.iter_content(RESPONSE_CHUNK_SIZE)
+
+        def written():
+            for chunk in chunks:
+                out.write(chunk)
+                yield chunk
+
+        ok = response_ok(iter_response_members(written()))
+        # copy the rest without parsing it
+        for chunk in chunks:
+            out.write(chunk)
+        return {"ok": ok, "issues": {}}
+
+    stream = {"summary": stream_summary, "none": stream_ok, "raw": stream_raw}
+
+    def test_dep_graph(dep_graph: DepGraph):
+        # a DepGraph is posted from a temporary file, but sharding splits
+        # the depGraph in memory
+        bodies = [dep_graph]
+        if shards > 1:
+            bodies = shard_dep_graph(dep_graph.graph().model_dump(), shards)
+        if len(bodies) > 1:
+            typer.echo(f"Testing {len(bodies)} depGraph shards", file=sys.stderr)
+
+        responses = {}
+        keys = {}
+        for i, body in enumerate(bodies):
+            if result_cache:
+                keys[i] = depgraph_digest(body, snyk_api_url, snyk_org_id)
+                json_response = result_cache.get(keys[i])
+                if json_response is not None:
+                    typer.echo(f"Using cached test result {keys[i]}", file=sys.stderr)
+                    responses[i] = json_response
+
+        posts = {
+            i: (f"{DEPGRAPH_BASE_TEST_URL}{snyk_org_id}", request_body(body))
+            for i, body in enumerate(bodies)
+            if i not in responses
+        }
+        try:
+            posted = snyk_client.post_concurrently(posts, stream.get(output_format))
+        finally:
+            close_request_bodies(posts.values())
+        for i, json_response in posted.items():
+            if result_cache:
+                result_cache.put(keys[i], json_response)
+            responses[i] = json_response
+
+        responses = [responses[i] for i in range(len(bodies))]
+        if output_format == "json":
+            return merge_test_responses(responses)
+        return merge_test_summaries(responses)
+
+    # the output file is closed on every exit, including sys.exit(2)
+    with ExitStack() as stack:
+        if output_file:
+            out = stack.enter_context(open(output_file, "wb"))
+        else:
+            out = sys.stdout.buffer
+            sys.stdout.flush()
+
+        with exit_on_api_error("test"):
+            snyk_client = SessionSnykClient(
+                snyk_token, url=snyk_api_url, rate_limiter=rate_limiter
+            )
+            typer.echo("Snyk client created successfully", file=sys.stderr)
+
+            typer.echo("Testing depGraph via Snyk API ...", file=sys.stderr)
+            if output_format == "raw" and len(bazel2snyk.dep_graphs) > 1:
+                # the raw responses, keyed by package source
+                json_response = {}
+                for i, (source, dep_graph) in enumerate(bazel2snyk.dep_graphs.items()):
+                    out.write(f"{', ' if i else '{'}{json.dumps(source)}: ".encode())
+                    json_response[source] = test_dep_graph(dep_graph)
+                out.write(b"}")
+            else:
+                json_response = per_package_source(test_dep_graph)
+
+        if output_format in ("json", "summary"):
+            out.write(json.dumps(json_response, indent=4).encode())
+        if output_format != "none":
+            out.write(b"\n")
+        out.flush()
+    if output_file:
+        typer.echo(f"Test result written to {output_file}", file=sys.stderr)
 
-    if str(json_response["ok"]) == "False":
+    if result_cache:
+        typer.echo(result_cache.summary(), file=sys.stderr)
+
+    if not responses_ok(json_response):
         typer.echo("exiting with code 1", file=sys.stderr)
         sys.exit(1)
 
@@ -304,28 +862,398 @@ def monitor(
     """
     Continously retest your Bazel target's OSS dependencies for new issues with Snyk
     """
-    snyk_client = SnykClient(snyk_token)
+    snyk_client = SessionSnykClient(snyk_token, rate_limiter=rate_limiter)
     typer.echo("Snyk client created successfully", file=sys.stderr)
 
     # If an optional project name is passed, then rename the depgraph
     if snyk_project_name:
         typer.echo("Custom project name passed - renaming depgraph", file=sys.stderr)
-        bazel2snyk.dep_graph.rename_depgraph(snyk_project_name)
+        for dep_graph in bazel2snyk.dep_graphs.values():
+            dep_graph.rename_depgraph(snyk_project_name)
 
     typer.echo("Monitoring depGraph via Snyk API ...", file=sys.stderr)
-    response: requests.Response = snyk_client.post(
-        f"{DEPGRAPH_BASE_MONITOR_URL}{snyk_org_id}",
-        body=bazel2snyk.dep_graph.graph().model_dump(),
-    )
 
-    json_response = response.json()
+    def monitor_dep_graph(dep_graph: DepGraph):
+        with dep_graph.request_body() as body:
+            return snyk_client.post(
+                f"{DEPGRAPH_BASE_MONITOR_URL}{snyk_org_id}", body=body
+            ).json()
+
+    json_response = per_package_source(monitor_dep_graph)
+    print(json.dumps(json_response, indent=4))
+
+    if not responses_ok(json_response):
+        typer.echo("exiting with code 1", file=sys.stderr)
+        sys.exit(1)
+
+
+@cli.command()
+def pipeline(
+    output_file: Optional[str] = typer.Option(
+        None,
+        help="Write the Snyk depGraph JSON to this file, or - for STDOUT",
+    ),
+    run_test: bool = typer.Option(
+        False, "--test/--no-test", help="Test the depGraph for issues"
+    ),
+    run_monitor: bool = typer.Option(
+        False, "--monitor/--no-monitor", help="Monitor the depGraph"
+    ),
+    snyk_token: str = typer.Option(
+        None, envvar="SNYK_TOKEN", help="Please specify your Snyk token"
+    ),
+    snyk_org_id: str = typer.Option(
+        None,
+        envvar="SNYK_ORG_ID",
+        help="Please specify the Snyk ORG ID to run commands against",
+    ),
+    snyk_project_name: Optional[str] = typer.Option(
+        None,
+        envvar="SNYK_PROJECT_NAME",
+        help="Specify a custom Snyk project name. By default Snyk will use the name of the root node.",
+    ),
+    snyk_api_url: str = typer.Option(
+        SnykClient.API_URL, envvar="SNYK_API", help="Snyk API base URL"
+    ),
+):
+    """
+    Write, test and monitor the depGraph from a single conversion
+    """
+    if output_file:
+        # written in chunks, so disk-backed graphs are never loaded in full
+        chunks = iter_json(
+            per_package_source(lambda dep_graph: dep_graph.serializable()), indent=4
+        )
+        if output_file == "-":
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            sys.stdout.write("\n")
+        else:
+            with open(output_file, "w") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            typer.echo(f"depGraph written to {output_file}", file=sys.stderr)
+
+    if not run_test and not run_monitor:
+        return
+
+    if not snyk_org_id:
+        raise typer.BadParameter("--snyk-org-id is required to test or monitor")
+
+    posts = {}
+    if run_test:
+        # spooled before renaming for monitor
+        test_bodies = per_package_source(lambda x: x.request_body())
+        posts["test"] = (f"{DEPGRAPH_BASE_TEST_URL}{snyk_org_id}", test_bodies)
+    if run_monitor:
+        if snyk_project_name:
+            typer.echo(
+                "Custom project name passed - renaming depgraph", file=sys.stderr
+            )
+            for dep_graph in bazel2snyk.dep_graphs.values():
+                dep_graph.rename_depgraph(snyk_project_name)
+        monitor_bodies = per_package_source(lambda x: x.request_body())
+        posts["monitor"] = (f"{DEPGRAPH_BASE_MONITOR_URL}{snyk_org_id}", monitor_bodies)
+
+    # flatten to one POST per command and package source
+    if len(bazel2snyk.dep_graphs) > 1:
+        posts = {
+            (command, source): (path, body)
+            for command, (path, bodies) in posts.items()
+            for source, body in bodies.items()
+        }
+
+    try:
+        with exit_on_api_error("pipeline"):
+            snyk_client = SessionSnykClient(
+                snyk_token, url=snyk_api_url, rate_limiter=rate_limiter
+            )
+            typer.echo(
+                f"Submitting depGraph via Snyk API: {', '.join(map(str, posts))} ...",
+                file=sys.stderr,
+            )
+            responses = snyk_client.post_concurrently(posts)
+    finally:
+        close_request_bodies(posts.values())
+
+    json_response = {}
+    for key, response in responses.items():
+        if isinstance(key, tuple):
+            json_response.setdefault(key[0], {})[key[1]] = response
+        else:
+            json_response[key] = response
     print(json.dumps(json_response, indent=4))
 
-    if str(json_response["ok"]) == "False":
+    if not all(responses_ok(x) for x in json_response.values()):
+        typer.echo("exiting with code 1", file=sys.stderr)
+        sys.exit(1)
+
+
+@cli.command()
+def index(
+    index_file: str = typer.Option(
+        "bazel2snyk_index.sqlite",
+        envvar="INDEX_FILE",
+        help="Path to write the reverse dependency index to",
+    ),
+    top_level_targets: str = typer.Option(
+        None,
+        envvar="TOP_LEVEL_TARGETS",
+        help="Comma-delimited list of targets to index, by default every first-party "
+        "target no other first-party target depends on",
+    ),
+):
+    """
+    Index which top-level targets depend on each package, for who-depends
+    """
+    targets = None
+    if top_level_targets:
+        targets = top_level_targets.replace(" ", "").split(",")
+
+    count = write_reverse_index(reverse_dependencies(converter, targets), index_file)
+    typer.echo(f"{count} reverse dependencies written to {index_file}", file=sys.stderr)
+
+
+@cli.command()
+def who_depends(
+    package: str = typer.Option(
+        ...,
+        envvar="PACKAGE",
+        help="Package to look up as name@version, or as name to match every version, "
+        "e.g. com.google.guava:guava",
+    ),
+    index_file: str = typer.Option(
+        "bazel2snyk_index.sqlite",
+        envvar="INDEX_FILE",
+        help="Path to an index written by the index command",
+    ),
+):
+    """
+    Print the top-level targets depending on a package, using the index
+    """
+    try:
+        reverse_deps = lookup_reverse_dependencies(index_file, package)
+    except sqlite3.Error as e:
+        logger.error(f"Unable to read {index_file}: {e}")
+        sys.exit(2)
+
+    # package -> target -> labels and path counts
+    targets = {}
+    for reverse_dep in reverse_deps:
+        targets.setdefault(reverse_dep.package, {}).setdefault(
+            reverse_dep.target, []
+        ).append({"label": reverse_dep.label, "paths": reverse_dep.paths})
+    print(json.dumps(targets, indent=4))
+
+
+@cli.command()
+def batch(
+    shard_index: int = typer.Option(
+        0,
+        envvar="SHARD_INDEX",
+        help="Index of this machine's shard, from 0 to --shard-count - 1",
+    ),
+    shard_count: int = typer.Option(
+        1,
+        envvar="SHARD_COUNT",
+        help="Number of shards the targets are split into",
+    ),
+    targets: str = typer.Option(
+        None,
+        envvar="TARGETS",
+        help="Comma-delimited list of targets to convert, by default every "
+        "first-party target no other first-party target depends on",
+    ),
+    output_dir: str = typer.Option(
+        "bazel2snyk_batch",
+        envvar="OUTPUT_DIR",
+        help="Directory to write the depGraphs and manifest of this shard to",
+    ),
+    manifest_file: str = typer.Option(
+        None,
+        envvar="MANIFEST_FILE",
+        help="Path to write the shard's manifest to, by default "
+        "manifest-<index>-of-<count>.json in --output-dir",
+    ),
+    export_dir: str = typer.Option(
+        None,
+        envvar="EXPORT_DIR",
+        help="Also append the depGraphs to the NDJSON tables in this directory, see "
+        "export",
+    ),
+    run: str = typer.Option(
+        None,
+        envvar="EXPORT_RUN",
+        help="Label of this run in the tables of --export-dir, by default the current "
+        "time",
+    ),
+):
+    """
+    Convert this machine's shard of many targets, balanced by estimated cost
+    """
+    if not 0 <= shard_index < shard_count:
+        raise typer.BadParameter(
+            f"must be from 0 to {shard_count - 1}", param_hint="--shard-index"
+        )
+
+    if targets:
+        target_list = targets.replace(" ", "").split(",")
+    else:
+        target_list = top_level_targets(converter)
+    costs = target_costs(converter.rules_index, target_list)
+    shard = assign_shards(costs, shard_count)[shard_index]
+    typer.echo(
+        f"Shard {shard_index} of {shard_count}: "
+        f"{len(shard)} of {len(target_list)} targets",
+        file=sys.stderr,
+    )
+
+    exporter = GraphExporter(export_dir, run) if export_dir else None
+    try:
+        manifest = run_shard(
+            converter,
+            shard,
+            costs,
+            output_dir,
+            shard_index,
+            shard_count,
+            exporter=exporter,
+            **convert_options,
+        )
+        manifest_file = manifest_file or os.path.join(
+            output_dir, f"manifest-{shard_index}-of-{shard_count}.json"
+        )
+        with open(manifest_file, "w") as f:
+            json.dump(manifest, f, indent=4)
+        typer.echo(f"Manifest written to {manifest_file}", file=sys.stderr)
+    finally:
+        if exporter:
+            exporter.close()
+
+    if any("error" in x for x in manifest["targets"]):
+        sys.exit(2)
+
+
+@cli.command()
+def upload(
+    command: str = typer.Option(
+        "monitor",
+        callback=upload_command_callback,
+        envvar="UPLOAD_COMMAND",
+        help="Snyk API to submit the depGraphs to, test or monitor",
+    ),
+    targets: str = typer.Option(
+        None,
+        envvar="TARGETS",
+        help="Comma-delimited list of targets to convert, by default every "
+        "first-party target no other first-party target depends on",
+    ),
+    snyk_token: str = typer.Option(
+        None, envvar="SNYK_TOKEN", help="Please specify your Snyk token"
+    ),
+    snyk_org_id: str = typer.Option(
+        ...,
+        envvar="SNYK_ORG_ID",
+        help="Please specify the Snyk ORG ID to run commands against",
+    ),
+    snyk_api_url: str = typer.Option(
+        SnykClient.API_URL, envvar="SNYK_API", help="Snyk API base URL"
+    ),
+    convert_workers: int = typer.Option(
+        1,
+        min=1,
+        envvar="CONVERT_WORKERS",
+        help="Number of targets converted at once, "
+        "each in its own process if more than 1",
+    ),
+    upload_workers: int = typer.Option(
+        4, min=1, envvar="UPLOAD_WORKERS", help="Number of depGraphs posted at once"
+    ),
+    queue_size: int = typer.Option(
+        4,
+        min=1,
+        envvar="QUEUE_SIZE",
+        help="Number of converted depGraphs that may wait for an uploader, beyond "
+        "which conversion pauses",
+    ),
+    status_file: Optional[str] = typer.Option(
+        None,
+        envvar="STATUS_FILE",
+        help="Write the status of every target as JSON to this file",
+    ),
+):
+    """
+    Convert many targets and submit their depGraphs, uploading while converting
+    """
+    if targets:
+        target_list = targets.replace(" ", "").split(",")
+    else:
+        target_list = top_level_targets(converter)
+    typer.echo(
+        f"Converting and submitting {len(target_list)} targets via Snyk API ...",
+        file=sys.stderr,
+    )
+
+    snyk_client = SessionSnykClient(
+        snyk_token, url=snyk_api_url, rate_limiter=rate_limiter
+    )
+    statuses = asyncio.run(
+        upload_targets(
+            converter,
+            target_list,
+            snyk_client,
+            f"{UPLOAD_PATHS[command]}{snyk_org_id}",
+            convert_workers=convert_workers,
+            upload_workers=upload_workers,
+            queue_size=queue_size,
+            **convert_options,
+        )
+    )
+    print(status_table(statuses))
+
+    if status_file:
+        with open(status_file, "w") as f:
+            json.dump(statuses, f, indent=4)
+        typer.echo(f"Status written to {status_file}", file=sys.stderr)
+
+    uploads = [x for status in statuses for x in status["uploads"].values()]
+    if any("error" in x for x in statuses + uploads):
+        sys.exit(2)
+    if not all(x["ok"] for x in uploads):
         typer.echo("exiting with code 1", file=sys.stderr)
         sys.exit(1)
 
 
+@cli.command()
+def merge(
+    manifests: List[str] = typer.Argument(
+        ..., help="Manifests written by batch, one per shard"
+    ),
+    output_file: Optional[str] = typer.Option(
+        None, help="Write the report to this file instead of STDOUT"
+    ),
+):
+    """
+    Combine the manifests of every batch shard into one report
+    """
+    try:
+        report = merge_manifests([json.loads(load_file(x)) for x in manifests])
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Unable to merge manifests: {e}")
+        sys.exit(2)
+
+    if output_file:
+        with open(output_file, "w") as f:
+            json.dump(report, f, indent=4)
+        typer.echo(f"Report written to {output_file}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if report["missing_shards"]:
+        logger.error(f"Missing manifests of shards {report['missing_shards']}")
+        sys.exit(2)
+
+
 # application entrypoint
 # -----------------------
 if __name__ == "__main__":
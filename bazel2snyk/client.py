@@ -0,0 +1,139 @@
+import functools
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Dict
+from retry.api import retry_call
+from snyk import SnykClient
+from snyk.errors import SnykHTTPError
+from bazel2snyk import logger
+from bazel2snyk.rate_limit import RateLimiter
+from bazel2snyk.rate_limit import retry_after
+
+# snyk depgraph test/monitor base URLs
+DEPGRAPH_BASE_TEST_URL = "/test/dep-graph?org="
+DEPGRAPH_BASE_MONITOR_URL = "/monitor/dep-graph?org="
+
+# times a request rate limited with a 429 is retried after its Retry-After
+RATE_LIMITED_TRIES = 10
+
+
+class SessionSnykClient(SnykClient):
+    """
+    SnykClient that issues its POSTs over a single requests.Session,
+    so concurrent calls share authentication headers and connections.
+    With a rate_limiter, every request waits for it first.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        url: str = None,
+        rate_limiter: RateLimiter = None,
+        **kwargs,
+    ):
+        super().__init__(token, url=url, **kwargs)
+        self.session = requests.Session()
+        self.session.headers.update(self.api_post_headers)
+        self.rate_limiter = rate_limiter
+
+    def request(
+        self,
+        method,
+        url: str,
+        headers: object,
+        params: object = None,
+        json: object = None,
+    ) -> requests.Response:
+        """
+        SnykClient.request(), waiting for the rate limiter before each
+        attempt. A 429 defers every process sharing the rate limiter by its
+        Retry-After, and the request is retried up to RATE_LIMITED_TRIES times.
+        """
+        if self.rate_limiter is None:
+            return super().request(method, url, headers, params, json)
+
+        for attempt in range(1, RATE_LIMITED_TRIES + 1):
+            self.rate_limiter.acquire()
+            resp = method(
+                url, headers=headers, params=params, json=json, verify=self.verify
+            )
+            if (
+                resp.status_code != requests.codes.too_many_requests
+                or attempt == RATE_LIMITED_TRIES
+            ):
+                break
+            resp.close()
+            self.rate_limiter.defer(retry_after(resp))
+
+        if not resp or resp.status_code >= requests.codes.server_error:
+            logger.warning(f"Retrying: {resp.text}")
+            raise SnykHTTPError(resp)
+        return resp
+
+    def post(
+        self, path: str, body: Any, headers: dict = None, stream: bool = False
+    ) -> requests.Response:
+        """
+        POST body as JSON, or the JSON in body if it is a binary file, e.g.
+        from DepGraph.request_body(), which is rewound for every attempt.
+        With stream, the response body is left unread for the caller to
+        consume with iter_content().
+        """
+        url = f"{self.api_url}/{path.lstrip('/')}"
+        logger.debug(f"POST: {url}")
+        headers = headers or {}
+
+        if hasattr(body, "read"):
+
+            def method(url: str, json: Any = None, **kwargs) -> requests.Response:
+                body.seek(0)
+                return self.session.post(url, data=body, stream=stream, **kwargs)
+
+            fkwargs = {"headers": headers}
+        else:
+            method = functools.partial(self.session.post, stream=stream)
+            fkwargs = {"json": body, "headers": headers}
+
+        resp = retry_call(
+            self.request,
+            fargs=[method, url],
+            fkwargs=fkwargs,
+            tries=self.tries,
+            delay=self.delay,
+            backoff=self.backoff,
+            exceptions=SnykHTTPError,
+            logger=logger,
+        )
+
+        if not resp.ok:
+            logger.error(resp.text)
+            raise SnykHTTPError(resp)
+
+        return resp
+
+    def post_concurrently(
+        self,
+        posts: Dict[str, tuple],
+        handle: Callable[[requests.Response], Any] = None,
+    ) -> Dict[str, Any]:
+        """
+        Issue several (path, body) POSTs concurrently and return their JSON
+        responses under the same keys. With handle, responses are streamed
+        and handle(response) is returned instead, called in the same thread
+        as the POST.
+        """
+
+        def post(path: str, body: Any) -> Any:
+            if handle is None:
+                return self.post(path, body).json()
+            with self.post(path, body, stream=True) as resp:
+                return handle(resp)
+
+        with ThreadPoolExecutor(max_workers=max(len(posts), 1)) as executor:
+            futures = {
+                key: executor.submit(post, path, body)
+                for key, (path, body) in posts.items()
+            }
+            return {key: future.result() for key, future in futures.items()}
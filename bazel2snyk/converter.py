@@ -0,0 +1,359 @@
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Dict
+from typing import Iterable
+from typing import List
+from xml.etree import ElementTree
+from bazel2snyk import logger
+from bazel2snyk.bazel import BazelNodeType
+from bazel2snyk.bazel import BazelXmlParser
+from bazel2snyk.budget import TraversalBudget
+from bazel2snyk.depgraph import DepGraph
+from bazel2snyk.extractors import EXTRACTORS
+from bazel2snyk.graph_store import GRAPH_STORES
+from bazel2snyk.graph_store import create_dep_graph
+from bazel2snyk.maven_install import MavenInstall
+from bazel2snyk.maven_install import merge_maven_install
+from bazel2snyk.rules import BazelRule
+from bazel2snyk.rules import ScopeFilter
+from bazel2snyk.rules import apply_scope
+from bazel2snyk.rules import build_rules_index
+from bazel2snyk.rules import load_rules_index
+
+# globals
+# version is required by Snyk depGraph API
+# setting bazel targets version as "bazel"
+BAZEL_TARGET_VERSION_STRING = "bazel"
+
+# set allowable package sources
+allowable_package_sources = list(EXTRACTORS)
+BazelPackageSource = Enum("PackageSource", allowable_package_sources)
+
+
+# Class for app methods and state
+# -----------------
+class Bazel2Snyk(object):
+    def __init__(
+        self,
+        bazel_xml_parser: BazelXmlParser,
+        dep_graph: DepGraph,
+        dep_graphs: Dict[str, DepGraph] = None,
+        budget: TraversalBudget = None,
+    ):
+        """
+        dep_graphs optionally maps additional package sources to their own
+        DepGraph, so that several ecosystems are converted in one traversal.
+        budget optionally limits the traversal, see TraversalBudget.
+        """
+        self.bazel_xml_parser = bazel_xml_parser
+        self.dep_graph = dep_graph
+        self.dep_graphs = {bazel_xml_parser.pkg_manager_name: dep_graph}
+        if dep_graphs:
+            self.dep_graphs.update(dep_graphs)
+        self.budget = budget
+        self.truncation = None
+        self._visited = []
+        self._visited_temp = []
+        self._oss_deps_count = 0
+
+    def bazel_to_depgraph(self, parent_node_id: str, depth: int):
+        """
+        Recursive function that will walk the bazel dep tree.
+        """
+        logger.debug(f"{parent_node_id=},{depth=}")
+        logger.debug(f"{self._visited_temp=}")
+
+        children = self.bazel_xml_parser.get_children_from_rule(
+            parent_node_id=parent_node_id
+        )
+        logger.debug(f"{parent_node_id} child count: {len(children)}")
+
+        # children cut by the budget are left out, making the node a leaf
+        if self.budget:
+            children = self.budget.admit(parent_node_id, depth, children)
+
+        parent_dep_snyk = self.snyk_dep_from_bazel_dep(
+            parent_node_id, self._package_source_for(parent_node_id)
+        )
+        parent_dep_graphs = self._dep_graphs_for(parent_node_id)
+
+        if parent_dep_snyk != parent_node_id and not parent_dep_snyk.endswith(
+            f"{BAZEL_TARGET_VERSION_STRING}"
+        ):
+            self._oss_deps_count += 1
+            logger.debug(f"{self._oss_deps_count=}")
+
+        # special entry for the root node of the dep graph
+        if depth == 0:
+            for dep_graph in self.dep_graphs.values():
+                dep_graph.set_root_node_package(parent_dep_snyk)
+
+        # depGraphs the node gets deps in, it is a leaf of the others
+        dep_graphs_with_deps = set()
+
+        for child in children:
+            child_dep_for_snyk = self.snyk_dep_from_bazel_dep(
+                child, self._package_source_for(child)
+            )
+
+            for dep_graph in parent_dep_graphs:
+                if dep_graph not in self._dep_graphs_for(child):
+                    continue
+
+                logger.debug(f"adding pkg {child_dep_for_snyk=}")
+                dep_graph.add_pkg(child_dep_for_snyk)
+
+                logger.debug(f"adding dep {child_dep_for_snyk=} for {parent_dep_snyk=}")
+                dep_graph.add_dep(child_dep_for_snyk, parent_dep_snyk)
+                dep_graphs_with_deps.add(dep_graph)
+
+            self._visited_temp.append(parent_node_id)
+
+            # if we've already processed this subtree, then just return
+            if child not in self._visited:
+                logger.debug(f"{child} not yet visited, traversing...")
+                self.bazel_to_depgraph(child, depth=depth + 1)
+        # else:
+        # future use for smarter pruning
+        # account for node in the subtree to count all paths
+
+        # we've reach a leaf node and just need to add an entry with empty deps array
+        if len(children) == 0:
+            for dep_graph in parent_dep_graphs:
+                dep_graph.add_dep(child_node_id=None, parent_node_id=parent_dep_snyk)
+            self._visited.extend(self._visited_temp)
+
+            self._visited_temp = []
+        else:
+            for dep_graph in parent_dep_graphs:
+                if dep_graph not in dep_graphs_with_deps:
+                    dep_graph.add_dep(
+                        child_node_id=None, parent_node_id=parent_dep_snyk
+                    )
+
+    def empty_package_sources(self) -> List[str]:
+        """
+        Package sources for which no dependencies were found
+        """
+        return [
+            source
+            for source, dep_graph in self.dep_graphs.items()
+            if dep_graph.is_empty()
+        ]
+
+    def snyk_dep_id(self, bazel_dep_id: str) -> str:
+        """
+        Snyk package id of a bazel node in the depGraphs
+        """
+        return self.snyk_dep_from_bazel_dep(
+            bazel_dep_id, self._package_source_for(bazel_dep_id)
+        )
+
+    def _package_source_for(self, bazel_dep_id: str) -> BazelPackageSource:
+        """
+        Package source used to resolve the coordinates of a bazel dependency.
+        Dependencies of package sources that are not being converted fall
+        back to the primary package source and keep their bazel label
+        """
+        package_source = self.bazel_xml_parser.get_package_source(bazel_dep_id)
+        if package_source in self.dep_graphs:
+            return package_source
+        return self.bazel_xml_parser.pkg_manager_name
+
+    def _dep_graphs_for(self, bazel_dep_id: str) -> List[DepGraph]:
+        """
+        DepGraphs a bazel node belongs to. Bazel targets belong to every
+        depGraph, dependencies only to the depGraph of their package source
+        """
+        package_source = self.bazel_xml_parser.get_package_source(bazel_dep_id)
+        if package_source in self.dep_graphs:
+            return [self.dep_graphs[package_source]]
+        return list(self.dep_graphs.values())
+
+    def snyk_dep_from_bazel_dep(
+        self, bazel_dep_id: str, package_source: BazelPackageSource
+    ) -> str:
+        """
+        Produce dependency coordinates in format package@version for Snyk
+        from the bazel dependency identifier
+        """
+        logger.debug(f"{package_source=},{bazel_dep_id=}")
+
+        node_type: BazelNodeType = self.bazel_xml_parser.get_node_type(bazel_dep_id)
+        logger.debug(f"{node_type=}")
+
+        if (
+            node_type == BazelNodeType.DEPENDENCY
+            and self.bazel_xml_parser.get_package_source(bazel_dep_id) == package_source
+        ):
+            snyk_dep = self.bazel_xml_parser.get_coordinates_from_bazel_dep(
+                bazel_dep_id, package_source
+            )
+            logger.debug(f"{snyk_dep=}")
+            return snyk_dep
+        else:
+            return f"{bazel_dep_id}@{BAZEL_TARGET_VERSION_STRING}"
+
+
+class NoDependenciesFoundError(Exception):
+    pass
+
+
+def truncation_summary(bazel_target: str, truncation: dict) -> str:
+    """
+    One line summary of the truncation report of bazel_target
+    """
+    return (
+        f"Traversal of {bazel_target} truncated by {','.join(truncation['reasons'])}: "
+        f"{truncation['nodes']} nodes converted, {truncation['remaining_nodes']} left "
+        f"below {truncation['cut_count']} cut points"
+    )
+
+
+class Converter(object):
+    """
+    Library entry point converting bazel targets to Snyk depGraphs.
+    A Converter owns a parsed rules index and may be shared by several
+    threads, every conversion traverses into its own DepGraphs.
+    """
+
+    def __init__(
+        self,
+        rules_index: Dict[str, BazelRule],
+        package_sources: Iterable[str] = ("maven",),
+        alt_repo_names: str = None,
+        maven_install: MavenInstall = None,
+        graph_store: str = "memory",
+        graph_store_dir: str = None,
+        scope: ScopeFilter = None,
+    ):
+        """
+        maven_install optionally supplies the maven artifact graph from a
+        lockfile loaded with load_maven_install(), in which case the rules
+        index only needs the targets down to the maven repo.
+        graph_store selects the storage engine of the DepGraphs built,
+        see GRAPH_STORES.
+        scope optionally limits the rules converted, see ScopeFilter.
+        """
+        if maven_install:
+            rules_index = merge_maven_install(rules_index, maven_install)
+        if scope:
+            rules_index = apply_scope(rules_index, scope)
+        self.package_sources = list(package_sources)
+        for package_source in self.package_sources:
+            if package_source not in EXTRACTORS:
+                raise ValueError(
+                    f"Allowable values are {','.join(allowable_package_sources)}, "
+                    f"you entered: {package_source}"
+                )
+        if graph_store not in GRAPH_STORES:
+            raise ValueError(
+                f"Allowable graph stores are {','.join(GRAPH_STORES)}, "
+                f"you entered: {graph_store}"
+            )
+        self.graph_store = graph_store
+        self.graph_store_dir = graph_store_dir
+        self.bazel_xml_parser = BazelXmlParser(
+            pkg_manager_name=self.package_sources[0],
+            alt_repo_names=alt_repo_names,
+            rules_index=rules_index,
+        )
+
+    @classmethod
+    def from_xml(cls, rules_xml: str, **kwargs) -> "Converter":
+        """
+        Converter for bazel query XML output held in a string
+        """
+        return cls(build_rules_index(ElementTree.fromstring(rules_xml)), **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "Converter":
+        """
+        Converter for a bazel query XML output file or a written rules index
+        """
+        return cls(load_rules_index(path), **kwargs)
+
+    @property
+    def rules_index(self) -> Dict[str, BazelRule]:
+        return self.bazel_xml_parser.rules_index
+
+    def traverse(self, bazel_target: str, budget: TraversalBudget = None) -> Bazel2Snyk:
+        """
+        Walk the dependencies of bazel_target into fresh DepGraphs.
+        If budget cuts the traversal short, the DepGraphs are marked as
+        truncated and Bazel2Snyk.truncation holds its report.
+        """
+        dep_graphs = {
+            x: create_dep_graph(
+                EXTRACTORS[x].pkg_manager_name, self.graph_store, self.graph_store_dir
+            )
+            for x in self.package_sources
+        }
+        bazel2snyk = Bazel2Snyk(
+            self.bazel_xml_parser,
+            dep_graphs.pop(self.package_sources[0]),
+            dep_graphs,
+            budget,
+        )
+        bazel2snyk.bazel_to_depgraph(parent_node_id=bazel_target, depth=0)
+        if budget and budget.truncated:
+            bazel2snyk.truncation = budget.report(
+                self.bazel_xml_parser.get_children_from_rule
+            )
+            for dep_graph in bazel2snyk.dep_graphs.values():
+                dep_graph.mark_truncated(bazel2snyk.truncation)
+        return bazel2snyk
+
+    def convert(
+        self,
+        bazel_target: str,
+        prune: bool = False,
+        prune_all: bool = False,
+        collapse: bool = False,
+        collapse_depth: int = 0,
+        max_nodes: int = None,
+        max_depth: int = None,
+        time_budget: float = None,
+    ) -> Dict[str, DepGraph]:
+        """
+        Convert bazel_target and return its DepGraphs keyed by package source.
+        With collapse, bazel targets deeper than collapse_depth below the
+        root are elided, see DepGraph.collapse_graph().
+        max_nodes, max_depth and time_budget limit the traversal, in which
+        case DepGraph.truncation reports what was cut, see TraversalBudget.
+        Raises NoDependenciesFoundError if no package source has any.
+        """
+        bazel2snyk = self.traverse(
+            bazel_target,
+            TraversalBudget.from_limits(max_nodes, max_depth, time_budget),
+        )
+        if bazel2snyk.truncation:
+            logger.warning(truncation_summary(bazel_target, bazel2snyk.truncation))
+        if len(bazel2snyk.empty_package_sources()) == len(bazel2snyk.dep_graphs):
+            raise NoDependenciesFoundError(
+                f"No dependencies found for {bazel_target}, "
+                "please verify it exists in the source data"
+            )
+
+        for dep_graph in bazel2snyk.dep_graphs.values():
+            if prune_all:
+                dep_graph.prune_graph_all()
+            elif prune:
+                dep_graph.prune_graph(20, 5)
+            if collapse:
+                dep_graph.collapse_graph(BAZEL_TARGET_VERSION_STRING, collapse_depth)
+        return bazel2snyk.dep_graphs
+
+    def convert_many(
+        self, bazel_targets: Iterable[str], workers: int = None, **kwargs
+    ) -> Dict[str, Dict[str, DepGraph]]:
+        """
+        Convert several targets concurrently, keyed by target
+        """
+        bazel_targets = list(bazel_targets)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                target: executor.submit(self.convert, target, **kwargs)
+                for target in bazel_targets
+            }
+            return {target: future.result() for target, future in futures.items()}
@@ -1,7 +1,19 @@
+import json
 import math
+import tempfile
+from collections import deque
 from bazel2snyk import logger
 from pydantic import BaseModel
+from typing import Any
+from typing import IO
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
+
+# package under the root marking a depGraph cut short by a TraversalBudget
+TRUNCATED_PKG_ID = "meta-truncated-dependencies@meta"
 
 
 class Info(BaseModel):
@@ -44,12 +56,82 @@ class DepGraphRoot(BaseModel):
     depGraph: DepGraphData
 
 
+def iter_json(value: Any, indent: int = None, level: int = 0) -> Iterator[str]:
+    """
+    Encode value as JSON in chunks, producing the same text as json.dumps.
+    Generators are encoded as lists, so large lists can be written without
+    being held in memory.
+    """
+    newline = "\n" + " " * (indent * (level + 1)) if indent else ""
+    closing_newline = "\n" + " " * (indent * level) if indent else ""
+    item_separator = "," if indent else ", "
+
+    if isinstance(value, dict):
+        if not value:
+            yield "{}"
+            return
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield (item_separator if i else "") + newline + json.dumps(key) + ": "
+            yield from iter_json(item, indent, level + 1)
+        yield closing_newline + "}"
+    elif isinstance(value, (list, tuple)) or hasattr(value, "__next__"):
+        empty = True
+        for item in value:
+            yield ("[" if empty else item_separator) + newline
+            yield from iter_json(item, indent, level + 1)
+            empty = False
+        if empty:
+            yield "[]"
+        else:
+            yield closing_newline + "]"
+    else:
+        yield json.dumps(value)
+
+
+def spool_json(value: Any, f: IO[bytes] = None) -> IO[bytes]:
+    """
+    Write value as JSON with iter_json() to f, by default a temporary file,
+    and rewind it, so a request body can be sent without being held in
+    memory
+    """
+    if f is None:
+        f = tempfile.TemporaryFile()
+    for chunk in iter_json(value):
+        f.write(chunk.encode())
+    f.seek(0)
+    return f
+
+
+def canonical_members(body: dict) -> Tuple[Iterable[str], Iterable[List[str]]]:
+    """
+    Sorted pkg ids and [pkgId, pkgId] edges of a depGraph request body,
+    leaving out the root node's pkg and naming it "" in edges
+    """
+    dep_graph = body["depGraph"]
+    nodes = dep_graph["graph"]["nodes"]
+    root_node_id = dep_graph["graph"]["rootNodeId"]
+    pkg_ids = {node["nodeId"]: node["pkgId"] for node in nodes}
+    root_pkg_id = pkg_ids.get(root_node_id)
+    pkg_ids[root_node_id] = ""
+
+    pkgs = sorted(x["id"] for x in dep_graph["pkgs"] if x["id"] != root_pkg_id)
+    edges = sorted(
+        [pkg_ids[node["nodeId"]], pkg_ids.get(dep["nodeId"], dep["nodeId"])]
+        for node in nodes
+        for dep in node["deps"]
+    )
+    return pkgs, edges
+
+
 class DepGraph(object):
     def __init__(
         self,
         pkg_manager_name: str,
     ):
         self.pkg_manager_name = pkg_manager_name
+        # report of the TraversalBudget that cut the graph short, if it was
+        self.truncation: Optional[dict] = None
         self.meta_pkg_id = "meta-common-packages@meta"
         self.dep_graph = DepGraphRoot(
             depGraph=DepGraphData(
@@ -67,6 +149,34 @@ class DepGraph(object):
     def graph(self):
         return self.dep_graph
 
+    def serializable(self) -> dict:
+        """
+        depGraph in a form iter_json() can encode
+        """
+        return self.graph().model_dump()
+
+    def request_body(self) -> IO[bytes]:
+        """
+        depGraph as a JSON request body in a temporary file, see spool_json()
+        """
+        return spool_json(self.serializable())
+
+    def canonical(self) -> Tuple[Iterable[str], Iterable[List[str]]]:
+        """
+        canonical_members() of the depGraph
+        """
+        return canonical_members(self.serializable())
+
+    def node_count(self) -> int:
+        return len(self.dep_graph.depGraph.graph.nodes)
+
+    def is_empty(self) -> bool:
+        """
+        Whether the depGraph has no nodes but the root, and the
+        TRUNCATED_PKG_ID node if it was marked truncated
+        """
+        return self.node_count() - (self.truncation is not None) <= 1
+
     def set_dep_graph(self, dep_graph):
         # self.dep_graph = dep_graph
         self.dep_graph: DepGraphRoot = dep_graph
@@ -240,6 +350,16 @@ class DepGraph(object):
         # add to meta-common-packages@meta
         self.add_dep(node_id, self.meta_pkg_id)
 
+    def mark_truncated(self, truncation: dict):
+        """
+        Mark the depGraph as partial with a TRUNCATED_PKG_ID package
+        under the root, keeping the truncation report
+        """
+        self.truncation = truncation
+        self.add_pkg(TRUNCATED_PKG_ID)
+        self.add_dep(TRUNCATED_PKG_ID)
+        self.add_dep(child_node_id=None, parent_node_id=TRUNCATED_PKG_ID)
+
     def prune_graph(
         self, instance_count_threshold: int, instance_percentage_threshold: int
     ):
@@ -282,6 +402,92 @@ class DepGraph(object):
                 logger.info(f"pruning {dep} ({instances=})")
                 self.prune_dep(dep)
 
+    def collapse_graph(self, collapsed_version: str, keep_depth: int = 0) -> int:
+        """
+        Elide the nodes of packages versioned collapsed_version, i.e. bazel
+        targets, connecting each remaining node to the nearest remaining
+        nodes below it. Targets within keep_depth of the root are kept for
+        context. Returns the number of nodes elided.
+        """
+        data = self.serializable()["depGraph"]
+        root_node_id = data["graph"]["rootNodeId"]
+        nodes = {
+            x["nodeId"]: (x["pkgId"], [y["nodeId"] for y in x["deps"]])
+            for x in data["graph"]["nodes"]
+        }
+        pkgs = list(data["pkgs"])
+        suffix = f"@{collapsed_version}"
+
+        # shortest distance of each node from the root
+        depths = {root_node_id: 0}
+        queue = deque([root_node_id])
+        while queue:
+            node_id = queue.popleft()
+            for child in nodes.get(node_id, (None, []))[1]:
+                if child not in depths:
+                    depths[child] = depths[node_id] + 1
+                    queue.append(child)
+
+        def is_kept(node_id: str) -> bool:
+            # targets of other package sources are referenced without a node
+            pkg_id = nodes[node_id][0] if node_id in nodes else node_id
+            return (
+                node_id == root_node_id
+                or not pkg_id.endswith(suffix)
+                or depths[node_id] <= keep_depth
+            )
+
+        frontiers = {}
+
+        def kept_deps(node_id: str) -> List[str]:
+            """
+            Kept nodes reachable from node_id through elided nodes alone
+            """
+            if node_id not in frontiers:
+                # guards against cycles while the frontier is computed
+                frontiers[node_id] = []
+                deps = {}
+                for child in nodes.get(node_id, (None, []))[1]:
+                    for dep in [child] if is_kept(child) else kept_deps(child):
+                        if dep != node_id:
+                            deps[dep] = None
+                frontiers[node_id] = list(deps)
+            return frontiers[node_id]
+
+        kept = {root_node_id}
+        stack = [root_node_id]
+        while stack:
+            for dep in kept_deps(stack.pop()):
+                if dep not in kept:
+                    kept.add(dep)
+                    stack.append(dep)
+
+        kept_nodes = [
+            Node(
+                nodeId=node_id,
+                pkgId=pkg_id,
+                deps=[Dep(nodeId=x) for x in kept_deps(node_id)],
+            )
+            for node_id, (pkg_id, _) in nodes.items()
+            if node_id in kept
+        ]
+        kept_pkg_ids = {x.pkgId for x in kept_nodes}
+        self.set_dep_graph(
+            DepGraphRoot(
+                depGraph=DepGraphData(
+                    pkgManager=PkgManager(name=self.pkg_manager_name),
+                    pkgs=[
+                        Pkg(id=x["id"], info=Info(**x["info"]))
+                        for x in pkgs
+                        if x["id"] in kept_pkg_ids
+                    ],
+                    graph=Graph(rootNodeId=root_node_id, nodes=kept_nodes),
+                )
+            )
+        )
+        logger.info(f"collapsed {len(nodes) - len(kept_nodes)} bazel target nodes")
+        return len(nodes) - len(kept_nodes)
+
     def rename_depgraph(self, new_name):
         root_node_id = self.dep_graph.depGraph.graph.rootNodeId
         root_node_index = self._find_node_index(
@@ -0,0 +1,104 @@
+import datetime
+import hashlib
+import json
+import os
+from typing import Dict
+from typing import IO
+from bazel2snyk.depgraph import DepGraph
+
+# tables written by GraphExporter, one NDJSON file each
+EXPORT_TABLES = ("targets", "pkgs", "nodes", "edges")
+
+
+def intern_id(value: str) -> int:
+    """
+    Stable 63-bit id of a string, the same in every process and run, so
+    exports written separately can be joined on it
+    """
+    digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+class GraphExporter(object):
+    """
+    Appends the depGraphs of converted targets to NDJSON tables in a
+    directory, with package and node names interned to integer ids:
+
+        targets.ndjson  {"target", "name", "package_source", "root", "run"}
+        pkgs.ndjson     {"pkg", "name", "version"}
+        nodes.ndjson    {"target", "node", "pkg"}
+        edges.ndjson    {"target", "parent", "child"}
+
+    Each pkg is written once per directory, also across runs appending to
+    the same directory. run labels the targets exported, e.g. by commit.
+    """
+
+    def __init__(self, directory: str, run: str = None):
+        self.directory = directory
+        self.run = run or datetime.datetime.now(datetime.timezone.utc).isoformat()
+        os.makedirs(directory, exist_ok=True)
+        self.pkg_ids = set()
+        pkgs_path = os.path.join(directory, "pkgs.ndjson")
+        if os.path.exists(pkgs_path):
+            with open(pkgs_path) as f:
+                self.pkg_ids.update(json.loads(line)["pkg"] for line in f if line)
+        self.files: Dict[str, IO] = {
+            x: open(os.path.join(directory, f"{x}.ndjson"), "a") for x in EXPORT_TABLES
+        }
+
+    def _write(self, table: str, row: dict):
+        self.files[table].write(json.dumps(row, separators=(",", ":")) + "\n")
+
+    def export(self, bazel_target: str, package_source: str, dep_graph: DepGraph):
+        """
+        Append the depGraph of bazel_target for package_source
+        """
+        target_id = intern_id(f"{self.run}\0{bazel_target}\0{package_source}")
+        data = dep_graph.serializable()["depGraph"]
+        for pkg in data["pkgs"]:
+            pkg_id = intern_id(pkg["id"])
+            if pkg_id not in self.pkg_ids:
+                self.pkg_ids.add(pkg_id)
+                self._write(
+                    "pkgs",
+                    {
+                        "pkg": pkg_id,
+                        "name": pkg["info"]["name"],
+                        "version": pkg["info"]["version"],
+                    },
+                )
+        for node in data["graph"]["nodes"]:
+            node_id = intern_id(node["nodeId"])
+            self._write(
+                "nodes",
+                {"target": target_id, "node": node_id, "pkg": intern_id(node["pkgId"])},
+            )
+            for dep in node["deps"]:
+                self._write(
+                    "edges",
+                    {
+                        "target": target_id,
+                        "parent": node_id,
+                        "child": intern_id(dep["nodeId"]),
+                    },
+                )
+        self._write(
+            "targets",
+            {
+                "target": target_id,
+                "name": bazel_target,
+                "package_source": package_source,
+                "root": intern_id(data["graph"]["rootNodeId"]),
+                "run": self.run,
+            },
+        )
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,341 @@
+import re
+from abc import ABC
+from abc import abstractmethod
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Type
+from bazel2snyk import logger
+from bazel2snyk.rules import BazelRule
+
+# registered coordinate extractors, keyed by package source
+EXTRACTORS: Dict[str, Type["CoordinateExtractor"]] = {}
+
+
+def register_extractor(cls: Type["CoordinateExtractor"]):
+    """
+    Class decorator registering a coordinate extractor for its package source
+    """
+    EXTRACTORS[cls.package_source] = cls
+    return cls
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regular expression matching any of the given words, with common prefixes
+    factored out so that matching does not slow down as words are added
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def _pattern(node) -> str:
+        is_word = "" in node
+        branches = [
+            re.escape(char) + _pattern(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        pattern = (
+            branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        )
+        if is_word:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    if not trie:
+        return r"(?!)"
+    return _pattern(trie)
+
+
+class RepoMatch(NamedTuple):
+    """
+    The package source of a dependency label, the configured repo name
+    (hub) it matched, e.g. @maven or @pypi, and the label's repo, e.g.
+    @@rules_python~~pip~pypi_311_requests
+    """
+
+    package_source: str
+    hub: str
+    repo: str
+
+
+class RepoMatcher(object):
+    """
+    Classifies labels by their repo, with the repo names of every extractor
+    compiled once into a single trie-factored regular expression, so a
+    label is matched in one pass however many repo names are configured.
+    Canonical repo names of bzlmod module extensions, e.g.
+    @@rules_jvm_external~~maven~maven or @@rules_jvm_external++maven+maven,
+    match on their last part, the apparent name. Extractors not matching
+    by repo name, such as npm, are matched with their label_pattern().
+    """
+
+    # @ of an apparent repo name, or the @@ and module extension prefix of
+    # a canonical one
+    REPO_PREFIX = r"(?:@@(?:[\w.~+-]*[~+])?|@)"
+
+    def __init__(self, extractors: Dict[str, "CoordinateExtractor"]):
+        self.repo_sources = set()
+        hubs = []
+        prefixes = []
+        patterns = []
+        for name, extractor in extractors.items():
+            if not extractor.matches_repo_names:
+                patterns.append(f"(?P<{name}>{extractor.label_pattern()})")
+                continue
+            self.repo_sources.add(name)
+            repo_names = trie_pattern(x.lstrip("@") for x in extractor.repo_names)
+            spoke = f"(?:{extractor.spoke_pattern})?" if extractor.spoke_pattern else ""
+            hubs.append(f"(?P<{name}>{repo_names}){spoke}")
+            prefixes.append(f"(?P<{name}>{repo_names})")
+
+        if hubs:
+            hubs = [f"{self.REPO_PREFIX}(?:{'|'.join(hubs)})//"]
+            prefixes = [f"{self.REPO_PREFIX}(?:{'|'.join(prefixes)})"]
+        self.repo_re = re.compile("^(?:" + "|".join(hubs + patterns or ["(?!)"]) + ")")
+        self.repo_prefix_re = re.compile(
+            "^(?:" + "|".join(prefixes + patterns or ["(?!)"]) + ")"
+        )
+
+    def package_source(self, label: str, prefix: bool = False) -> Optional[str]:
+        """
+        Return the package source of the label, as match() without the hub
+        """
+        match = (self.repo_prefix_re if prefix else self.repo_re).match(label)
+        return match.lastgroup if match else None
+
+    def match(self, label: str, prefix: bool = False) -> Optional[RepoMatch]:
+        """
+        Return the package source and the longest configured repo name the
+        label's repo is, or is a per-package repo of, e.g. @pypi for
+        @pypi_requests//:pkg. With prefix, the label's repo only needs to
+        start with a configured repo name.
+        """
+        match = (self.repo_prefix_re if prefix else self.repo_re).match(label)
+        if not match:
+            return None
+        package_source = match.lastgroup
+        hub = None
+        if package_source in self.repo_sources:
+            hub = "@" + match.group(package_source)
+        return RepoMatch(package_source, hub, label[: max(label.find("//"), 0)])
+
+
+class CoordinateExtractor(ABC):
+    """
+    Base class for resolving the bazel rules of one package source to
+    Snyk dependency coordinates in the form name@version
+    """
+
+    # name used for --package-source
+    package_source: str = None
+    # Snyk depGraph pkgManager name
+    pkg_manager_name: str = None
+    # repos the dependencies of this package source live in by default
+    default_repo_names: List[str] = []
+    # whether labels are matched by their repo name, or by label_pattern()
+    matches_repo_names: bool = True
+    # suffix of the repo names of per-package repos, e.g. _requests of
+    # @pypi_requests, or None if the repos are matched exactly
+    spoke_pattern: Optional[str] = r"_\w+"
+
+    def __init__(self, repo_names: List[str] = None):
+        self.repo_names = list(
+            self.default_repo_names if repo_names is None else repo_names
+        )
+
+    def prepare(self, rules_index: Dict[str, BazelRule]):
+        """
+        Hook for extractors that need to inspect the whole rule index
+        before their labels can be matched
+        """
+
+    def label_pattern(self) -> str:
+        """
+        Regular expression matching the labels of this package source,
+        including per-package repos such as @pypi_requests//.
+        Must not contain named groups.
+        """
+        return rf"{trie_pattern(self.repo_names)}(?:_\w+)?//"
+
+    def extract(self, rules: Iterable[BazelRule]) -> Dict[str, str]:
+        """
+        Resolve the Snyk coordinates of a batch of rules
+        belonging to this package source
+        """
+        coordinates = {}
+        for rule in rules:
+            snyk_dep = self.extract_rule(rule)
+            if snyk_dep:
+                coordinates[rule.name] = snyk_dep
+        return coordinates
+
+    @abstractmethod
+    def extract_rule(self, rule: BazelRule) -> Optional[str]:
+        """
+        Snyk coordinates of a single rule, or None to keep its label
+        """
+
+
+@register_extractor
+class MavenExtractor(CoordinateExtractor):
+    package_source = "maven"
+    pkg_manager_name = "maven"
+    default_repo_names = ["@maven"]
+
+    def extract_rule(self, rule: BazelRule) -> Optional[str]:
+        # if we dont find a match, use the label itself, e.g. aliases
+        # such as @maven//:junit_junit become @maven//@junit_junit
+        dep_coordinates = rule.name
+
+        # child of tags looks like this
+        # <string value="maven_coordinates=
+        #     org.eclipse.jetty.websocket:websocket-servlet:9.4.40.v20210413"/>
+        for tag in rule.lists.get("tags", []):
+            if tag.startswith("maven_coordinates="):
+                dep_coordinates = tag.split("=").pop()
+                break
+        k = dep_coordinates.rfind(":")
+        return dep_coordinates[:k] + "@" + dep_coordinates[k + 1 :]
+
+
+@register_extractor
+class PipExtractor(CoordinateExtractor):
+    package_source = "pip"
+    pkg_manager_name = "pip"
+    default_repo_names = ["@py_deps", "@pypi"]
+
+    site_packages_re = re.compile(r"\@.*_.*\:site-packages\/(.*).dist\-info.*\/.*")
+    pypi_repo_re = re.compile(r"\@.*\/\/pypi__.*\:(.*).dist\-info.*\/")
+
+    def extract_rule(self, rule: BazelRule) -> Optional[str]:
+        bazel_dep_prefix = rule.name.split(":")[0]
+
+        # child of data looks like this
+        # <label value="@py_deps//pypi__requests:requests-2.23.0.dist-info/LICENSE"/>
+        for data_label in rule.lists.get("data", []):
+            if data_label.startswith(bazel_dep_prefix):
+                match = self.site_packages_re.search(
+                    data_label
+                ) or self.pypi_repo_re.search(data_label)
+                if not match:
+                    return data_label
+                snyk_dep = match.group(1)
+                k = snyk_dep.rfind("-")
+                return snyk_dep[:k] + "@" + snyk_dep[k + 1 :]
+        return None
+
+
+@register_extractor
+class GoExtractor(CoordinateExtractor):
+    """
+    Go modules fetched with rules_go/gazelle go_repository. Their repo
+    names are derived from the import path, so the repos are discovered
+    from the go_repository rules in the query output, e.g. by querying
+    deps(//app:main) + kind(go_repository, //external:*)
+    """
+
+    package_source = "go"
+    pkg_manager_name = "gomodules"
+    default_repo_names = []
+    spoke_pattern = None
+
+    def __init__(self, repo_names: List[str] = None):
+        super().__init__(repo_names)
+        self.modules = {}
+
+    def prepare(self, rules_index: Dict[str, BazelRule]):
+        for rule in rules_index.values():
+            if rule.rule_class != "go_repository":
+                continue
+            repo_name = "@" + rule.name.split(":")[-1]
+            version = (
+                rule.strings.get("version")
+                or rule.strings.get("tag")
+                or rule.strings.get("commit")
+            )
+            self.modules[repo_name] = (rule.strings.get("importpath"), version)
+            if repo_name not in self.repo_names:
+                self.repo_names.append(repo_name)
+        logger.debug(f"discovered {len(self.modules)} go repositories")
+
+    def label_pattern(self) -> str:
+        return rf"{trie_pattern(self.repo_names)}//"
+
+    def extract_rule(self, rule: BazelRule) -> Optional[str]:
+        importpath, version = self.modules.get(rule.name.split("//")[0], (None, None))
+        importpath = rule.strings.get("importpath", importpath)
+        if importpath and version:
+            return f"{importpath}@{version}"
+        return None
+
+
+@register_extractor
+class NpmExtractor(CoordinateExtractor):
+    """
+    npm packages linked by rules_js, e.g. //:node_modules/lodash
+    and its package store //:.aspect_rules_js/node_modules/lodash@4.17.21
+    """
+
+    package_source = "npm"
+    pkg_manager_name = "npm"
+    default_repo_names = []
+    matches_repo_names = False
+
+    # scoped packages are stored as @scope+name@version
+    store_re = re.compile(r"\.aspect_rules_js/node_modules/(@?[^@/]+)@([^/]+)")
+
+    def label_pattern(self) -> str:
+        return r"(?:@@?[\w.~+-]*)?//[^:]*:(?:\.aspect_rules_js/)?node_modules/"
+
+    def extract_rule(self, rule: BazelRule) -> Optional[str]:
+        if rule.strings.get("package") and rule.strings.get("version"):
+            return f"{rule.strings['package']}@{rule.strings['version']}"
+
+        # node_modules links point at their package store with src
+        for label in (rule.name, rule.strings.get("src") or ""):
+            match = self.store_re.search(label)
+            if match:
+                return f"{match.group(1).replace('+', '/')}@{match.group(2)}"
+        return None
+
+
+@register_extractor
+class CargoExtractor(CoordinateExtractor):
+    """
+    Rust crates vendored by rules_rust crate_universe,
+    e.g. @crates__serde-1.0.130//:serde
+    """
+
+    package_source = "cargo"
+    pkg_manager_name = "cargo"
+    default_repo_names = ["@crates", "@crate_index"]
+    spoke_pattern = r"__[\w.+-]+"
+
+    crate_repo_re = re.compile(r"__([\w-]+?)-(\d+\.\d+\.\d+[\w.+-]*)//")
+
+    def label_pattern(self) -> str:
+        return rf"{trie_pattern(self.repo_names)}(?:__[\w.+-]+)?//"
+
+    def extract_rule(self, rule: BazelRule) -> Optional[str]:
+        match = self.crate_repo_re.search(rule.name)
+        if match:
+            return f"{match.group(1)}@{match.group(2)}"
+
+        # hub aliases such as @crates//:serde point at the crate repo
+        match = self.crate_repo_re.search(rule.strings.get("actual") or "")
+        if match:
+            return f"{match.group(1)}@{match.group(2)}"
+
+        crate_name = rule.strings.get("crate_name")
+        if crate_name and rule.strings.get("version"):
+            return f"{crate_name}@{rule.strings['version']}"
+        return None
@@ -0,0 +1,512 @@
+import math
+import os
+import sqlite3
+import tempfile
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from bazel2snyk import logger
+from bazel2snyk.depgraph import DepGraph
+from bazel2snyk.depgraph import DepGraphData
+from bazel2snyk.depgraph import DepGraphRoot
+from bazel2snyk.depgraph import Dep
+from bazel2snyk.depgraph import Graph
+from bazel2snyk.depgraph import Info
+from bazel2snyk.depgraph import Node
+from bazel2snyk.depgraph import Pkg
+from bazel2snyk.depgraph import PkgManager
+
+SCHEMA = """
+CREATE TABLE pkgs (seq INTEGER PRIMARY KEY, id TEXT, name TEXT, version TEXT);
+CREATE INDEX pkgs_id ON pkgs (id);
+CREATE TABLE nodes (seq INTEGER PRIMARY KEY, node_id TEXT, pkg_id TEXT);
+CREATE INDEX nodes_node_id ON nodes (node_id);
+CREATE TABLE deps (seq INTEGER PRIMARY KEY, node_seq INTEGER, child_id TEXT);
+CREATE INDEX deps_node_seq ON deps (node_seq, child_id);
+CREATE INDEX deps_child_id ON deps (child_id);
+CREATE TABLE path_counts (
+    seq INTEGER PRIMARY KEY, kind INTEGER, id TEXT, count INTEGER
+);
+CREATE UNIQUE INDEX path_counts_id ON path_counts (kind, id);
+"""
+
+# path_counts kinds, mirroring DepGraph._dep_path_counts/_target_path_counts
+DEP_PATHS = 0
+TARGET_PATHS = 1
+
+# pages of the database SQLite may keep in memory, in KiB when negative
+CACHE_SIZE_KIB = 16 * 1024
+
+
+class SqliteDepGraph(DepGraph):
+    """
+    DepGraph whose pkgs, nodes and edges are kept in an SQLite database on
+    disk rather than in pydantic models, so graphs larger than memory can be
+    built, pruned and written out with iter_json(). The database is a
+    temporary file in directory, or in SQLite's temporary directory.
+    """
+
+    def __init__(self, pkg_manager_name: str, directory: str = None):
+        self.pkg_manager_name = pkg_manager_name
+        self.truncation: Optional[dict] = None
+        self.meta_pkg_id = "meta-common-packages@meta"
+
+        self._path = ""
+        if directory:
+            fd, self._path = tempfile.mkstemp(
+                prefix="depgraph-", suffix=".sqlite", dir=directory
+            )
+            os.close(fd)
+        # a graph is built by one thread at a time, but may be read by another
+        self._db = sqlite3.connect(self._path, check_same_thread=False)
+        self._db.executescript(
+            "PRAGMA journal_mode=OFF;"
+            "PRAGMA synchronous=OFF;"
+            "PRAGMA temp_store=FILE;"
+            f"PRAGMA cache_size=-{CACHE_SIZE_KIB};" + SCHEMA
+        )
+
+        self._root_node_id = "root-node"
+        self._db.execute(
+            "INSERT INTO pkgs (id, name, version) VALUES (?, ?, ?)",
+            ("app@1.0.0", "app", "1.0.0"),
+        )
+        self._db.execute(
+            "INSERT INTO nodes (node_id, pkg_id) VALUES (?, ?)",
+            ("root-node", "app@1.0.0"),
+        )
+
+    def close(self):
+        self._db.close()
+        if self._path and os.path.exists(self._path):
+            os.remove(self._path)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def graph(self) -> DepGraphRoot:
+        """
+        Load the whole depGraph into pydantic models
+        """
+        return DepGraphRoot(
+            depGraph=DepGraphData(
+                pkgManager=PkgManager(name=self.pkg_manager_name),
+                pkgs=[
+                    Pkg(id=x["id"], info=Info(**x["info"])) for x in self._iter_pkgs()
+                ],
+                graph=Graph(
+                    rootNodeId=self._root_node_id,
+                    nodes=[
+                        Node(
+                            nodeId=x["nodeId"],
+                            pkgId=x["pkgId"],
+                            deps=[Dep(nodeId=y["nodeId"]) for y in x["deps"]],
+                        )
+                        for x in self._iter_nodes()
+                    ],
+                ),
+            )
+        )
+
+    def serializable(self) -> dict:
+        return {
+            "depGraph": {
+                "schemaVersion": DepGraphData.model_fields["schemaVersion"].default,
+                "pkgManager": {"name": self.pkg_manager_name},
+                "pkgs": self._iter_pkgs(),
+                "graph": {
+                    "rootNodeId": self._root_node_id,
+                    "nodes": self._iter_nodes(),
+                },
+            }
+        }
+
+    def _iter_pkgs(self) -> Iterator[dict]:
+        for pkg_id, name, version in self._db.execute(
+            "SELECT id, name, version FROM pkgs ORDER BY seq"
+        ):
+            yield {"id": pkg_id, "info": {"name": name, "version": version}}
+
+    def _iter_nodes(self) -> Iterator[dict]:
+        deps = self._db.execute(
+            "SELECT node_seq, child_id FROM deps ORDER BY node_seq, seq"
+        )
+        dep = next(deps, None)
+        for seq, node_id, pkg_id in self._db.execute(
+            "SELECT seq, node_id, pkg_id FROM nodes ORDER BY seq"
+        ):
+            node_deps = []
+            while dep and dep[0] == seq:
+                node_deps.append({"nodeId": dep[1]})
+                dep = next(deps, None)
+            yield {"nodeId": node_id, "pkgId": pkg_id, "deps": node_deps}
+
+    def canonical(self) -> Tuple[Iterable[str], Iterable[List[str]]]:
+        """
+        canonical_members() of the depGraph, sorted by SQLite
+        """
+        root_pkg_id = self._db.execute(
+            "SELECT pkg_id FROM nodes WHERE node_id = ? ORDER BY seq DESC LIMIT 1",
+            (self._root_node_id,),
+        ).fetchone()
+        pkgs = self._db.execute(
+            "SELECT id FROM pkgs WHERE id IS NOT ? ORDER BY id",
+            (root_pkg_id[0] if root_pkg_id else None,),
+        )
+        # the pkg of each node id is that of its last node, as in a dict
+        edges = self._db.execute(
+            "WITH pkg_ids AS ("
+            "  SELECT node_id, CASE WHEN node_id = :root THEN '' ELSE pkg_id END"
+            "  AS pkg_id, MAX(seq) FROM nodes GROUP BY node_id"
+            ") "
+            "SELECT parent.pkg_id, CASE WHEN deps.child_id = :root THEN '' "
+            "ELSE COALESCE(child.pkg_id, deps.child_id) END "
+            "FROM deps JOIN nodes ON nodes.seq = deps.node_seq "
+            "JOIN pkg_ids parent ON parent.node_id = nodes.node_id "
+            "LEFT JOIN pkg_ids child ON child.node_id = deps.child_id "
+            "ORDER BY 1, 2",
+            {"root": self._root_node_id},
+        )
+        return (x for (x,) in pkgs), edges
+
+    def node_count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def set_dep_graph(self, dep_graph: DepGraphRoot):
+        self._db.executescript("DELETE FROM pkgs; DELETE FROM nodes; DELETE FROM deps;")
+        self._db.executemany(
+            "INSERT INTO pkgs (id, name, version) VALUES (?, ?, ?)",
+            [(x.id, x.info.name, x.info.version) for x in dep_graph.depGraph.pkgs],
+        )
+        for node in dep_graph.depGraph.graph.nodes:
+            seq = self._db.execute(
+                "INSERT INTO nodes (node_id, pkg_id) VALUES (?, ?)",
+                (node.nodeId, node.pkgId),
+            ).lastrowid
+            self._db.executemany(
+                "INSERT INTO deps (node_seq, child_id) VALUES (?, ?)",
+                [(seq, x.nodeId) for x in node.deps],
+            )
+        self._root_node_id = dep_graph.depGraph.graph.rootNodeId
+
+    def get_root_node(self):
+        return self._root_node_id
+
+    def _increment_path_count(self, kind: int, dep: str):
+        self._db.execute(
+            "INSERT INTO path_counts (kind, id, count) VALUES (?, ?, 1) "
+            "ON CONFLICT (kind, id) DO UPDATE SET count = count + 1",
+            (kind, dep),
+        )
+
+    def _increment_dep_path_count(self, dep: str):
+        self._increment_path_count(DEP_PATHS, dep)
+
+    def _increment_target_path_count(self, dep: str):
+        self._increment_path_count(TARGET_PATHS, dep)
+
+    def _path_counts(self, kind: int):
+        return self._db.execute(
+            "SELECT id, count FROM path_counts WHERE kind = ? ORDER BY seq", (kind,)
+        )
+
+    def has_pkg(self, pkg_id: str) -> bool:
+        k = pkg_id.rfind("@")
+        name = pkg_id[:k]
+        version = pkg_id[k + 1 :]
+
+        return (
+            self._db.execute(
+                "SELECT 1 FROM pkgs WHERE id = ? AND name = ? AND version = ? LIMIT 1",
+                (f"{name}@{version}", name, version),
+            ).fetchone()
+            is not None
+        )
+
+    def add_pkg(self, pkg_id: str) -> bool:
+        if self.has_pkg(pkg_id):
+            return False
+
+        k = pkg_id.rfind("@")
+        name = pkg_id[:k]
+        version = pkg_id[k + 1 :]
+        self._db.execute(
+            "INSERT INTO pkgs (id, name, version) VALUES (?, ?, ?)",
+            (f"{name}@{version}", name, version),
+        )
+        return True
+
+    def _find_node_seq(self, node_id: str):
+        row = self._db.execute(
+            "SELECT seq FROM nodes WHERE node_id = ? ORDER BY seq LIMIT 1", (node_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_dep(self, child_node_id: str, parent_node_id: str = None):
+        logger.debug(f"{parent_node_id=}")
+
+        if (
+            child_node_id
+            and parent_node_id != self.meta_pkg_id
+            and child_node_id != self.meta_pkg_id
+        ):
+            if not child_node_id.startswith("//"):
+                self._increment_dep_path_count(child_node_id)
+            else:
+                self._increment_target_path_count(child_node_id)
+
+        parent_seq = self._find_node_seq(parent_node_id or self.get_root_node())
+
+        if parent_seq is None:
+            logger.debug(f"parent_node not found for {parent_node_id=}")
+            parent_seq = self._db.execute(
+                "INSERT INTO nodes (node_id, pkg_id) VALUES (?, ?)",
+                (parent_node_id, parent_node_id),
+            ).lastrowid
+        elif (
+            child_node_id
+            and self._db.execute(
+                "SELECT 1 FROM deps WHERE node_seq = ? AND child_id = ? LIMIT 1",
+                (parent_seq, child_node_id),
+            ).fetchone()
+        ):
+            return
+
+        if child_node_id:
+            self._db.execute(
+                "INSERT INTO deps (node_seq, child_id) VALUES (?, ?)",
+                (parent_seq, child_node_id),
+            )
+
+    def remove_dep(self, child_node_id: str, parent_node_id: str = None):
+        logger.debug(f"removing dep {child_node_id}")
+        self._db.execute("DELETE FROM deps WHERE child_id = ?", (child_node_id,))
+
+    def set_root_node_package(self, root_node: str):
+        logger.debug(f"{root_node=}")
+
+        root_node_split = root_node.split("@")
+        self._db.execute(
+            "UPDATE pkgs SET id = ?, name = ?, version = ? "
+            "WHERE seq = (SELECT MIN(seq) FROM pkgs)",
+            (root_node, root_node_split[0], root_node_split[1]),
+        )
+        self._db.execute(
+            "UPDATE nodes SET node_id = ?, pkg_id = ? "
+            "WHERE seq = (SELECT MIN(seq) FROM nodes)",
+            (root_node, root_node),
+        )
+        self._root_node_id = root_node
+
+    def prune_graph(
+        self, instance_count_threshold: int, instance_percentage_threshold: int
+    ):
+        """
+        Prune graph according to threshold of duplicated transitive dependencies
+        """
+        # fold target path counts into the dep path counts, as DepGraph does
+        self._db.execute(
+            "INSERT INTO path_counts (kind, id, count) "
+            "SELECT ?, id, count FROM path_counts WHERE kind = ? ORDER BY seq "
+            "ON CONFLICT (kind, id) DO UPDATE SET count = excluded.count",
+            (DEP_PATHS, TARGET_PATHS),
+        )
+
+        total_item_count = self._db.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM path_counts WHERE kind = ?",
+            (DEP_PATHS,),
+        ).fetchone()[0]
+        logger.debug(f"{total_item_count=}")
+
+        for dep, instances in self._path_counts(DEP_PATHS):
+            if instances > 1:
+                instance_percentage = math.ceil((instances / total_item_count) * 100)
+                if (
+                    instances > instance_count_threshold
+                    or instance_percentage > instance_percentage_threshold
+                ):
+                    logger.info(
+                        f"pruning {dep} ({instances=}/{instance_count_threshold},"
+                        f"{instance_percentage=}/{instance_percentage_threshold})"
+                    )
+                    self.prune_dep(dep)
+
+    def prune_graph_all(self):
+        """
+        Prune graph whenever OSS dependencies are repeated more than 2x
+        or when bazel target dependencies are repeated more than 10x
+        """
+        for kind, threshold in ((DEP_PATHS, 2), (TARGET_PATHS, 10)):
+            for dep, instances in self._path_counts(kind):
+                if instances > threshold:
+                    logger.info(f"pruning {dep} ({instances=})")
+                    self.prune_dep(dep)
+
+    def collapse_graph(self, collapsed_version: str, keep_depth: int = 0) -> int:
+        """
+        DepGraph.collapse_graph() over the database. The nodes near the
+        root, the kept deps of each node and the kept nodes are temporary
+        tables, and the graph is rewritten in place, so it is never loaded
+        into memory.
+        """
+        db = self._db
+        root_node_id = self._root_node_id
+        suffix = f"@{collapsed_version}"
+        node_count = self.node_count()
+        db.executescript(
+            "CREATE TEMP TABLE shallow (node_id TEXT PRIMARY KEY);"
+            "CREATE TEMP TABLE computed (node_id TEXT PRIMARY KEY);"
+            "CREATE TEMP TABLE frontiers (seq INTEGER PRIMARY KEY, node_id TEXT,"
+            " dep_id TEXT);"
+            "CREATE INDEX temp.frontiers_node_id ON frontiers (node_id);"
+            "CREATE TEMP TABLE kept (node_id TEXT PRIMARY KEY);"
+            "CREATE TEMP TABLE stack (seq INTEGER PRIMARY KEY, node_id TEXT);"
+        )
+
+        # only whether a target is within keep_depth of the root matters
+        db.execute("INSERT INTO shallow VALUES (?)", (root_node_id,))
+        for _ in range(keep_depth):
+            db.execute(
+                "INSERT OR IGNORE INTO shallow SELECT deps.child_id FROM shallow "
+                "JOIN nodes ON nodes.node_id = shallow.node_id "
+                "JOIN deps ON deps.node_seq = nodes.seq"
+            )
+
+        def children(node_id: str) -> List[Tuple[str, bool]]:
+            """
+            Children of node_id, and whether each is kept
+            """
+            # targets of other package sources are referenced without a node
+            rows = db.execute(
+                "SELECT deps.child_id, COALESCE(child.pkg_id, deps.child_id), "
+                "shallow.node_id IS NOT NULL FROM deps "
+                "LEFT JOIN nodes child ON child.seq = ("
+                "  SELECT seq FROM nodes WHERE node_id = deps.child_id"
+                "  ORDER BY seq DESC LIMIT 1"
+                ") "
+                "LEFT JOIN shallow ON shallow.node_id = deps.child_id "
+                "WHERE deps.node_seq = ("
+                "  SELECT seq FROM nodes WHERE node_id = ? ORDER BY seq DESC LIMIT 1"
+                ") ORDER BY deps.seq",
+                (node_id,),
+            ).fetchall()
+            return [
+                (
+                    child,
+                    child == root_node_id
+                    or not pkg_id.endswith(suffix)
+                    or bool(is_shallow),
+                )
+                for child, pkg_id, is_shallow in rows
+            ]
+
+        def kept_deps(node_id: str) -> List[str]:
+            """
+            Kept nodes reachable from node_id through elided nodes alone
+            """
+            # marked computed first, which guards against cycles
+            if db.execute(
+                "INSERT OR IGNORE INTO computed VALUES (?)", (node_id,)
+            ).rowcount:
+                deps = {}
+                for child, is_kept in children(node_id):
+                    for dep in [child] if is_kept else kept_deps(child):
+                        if dep != node_id:
+                            deps[dep] = None
+                db.executemany(
+                    "INSERT INTO frontiers (node_id, dep_id) VALUES (?, ?)",
+                    [(node_id, x) for x in deps],
+                )
+            return [
+                x
+                for (x,) in db.execute(
+                    "SELECT dep_id FROM frontiers WHERE node_id = ? ORDER BY seq",
+                    (node_id,),
+                )
+            ]
+
+        db.execute("INSERT INTO kept VALUES (?)", (root_node_id,))
+        db.execute("INSERT INTO stack (node_id) VALUES (?)", (root_node_id,))
+        while True:
+            row = db.execute(
+                "SELECT seq, node_id FROM stack ORDER BY seq DESC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            db.execute("DELETE FROM stack WHERE seq = ?", (row[0],))
+            for dep in kept_deps(row[1]):
+                if db.execute("INSERT OR IGNORE INTO kept VALUES (?)", (dep,)).rowcount:
+                    db.execute("INSERT INTO stack (node_id) VALUES (?)", (dep,))
+
+        # every kept node's deps are its frontier, in the order computed
+        db.execute("DELETE FROM nodes WHERE node_id NOT IN (SELECT node_id FROM kept)")
+        db.execute("DELETE FROM deps")
+        db.execute(
+            "INSERT INTO deps (node_seq, child_id) "
+            "SELECT nodes.seq, frontiers.dep_id FROM nodes "
+            "JOIN frontiers ON frontiers.node_id = nodes.node_id "
+            "ORDER BY nodes.seq, frontiers.seq"
+        )
+        db.execute("DELETE FROM pkgs WHERE id NOT IN (SELECT pkg_id FROM nodes)")
+        db.executescript(
+            "DROP TABLE temp.shallow; DROP TABLE temp.computed;"
+            "DROP TABLE temp.frontiers; DROP TABLE temp.kept; DROP TABLE temp.stack;"
+        )
+
+        elided = node_count - self.node_count()
+        logger.info(f"collapsed {elided} bazel target nodes")
+        return elided
+
+    def rename_depgraph(self, new_name):
+        root_seq, root_pkg_id = self._db.execute(
+            "SELECT seq, pkg_id FROM nodes WHERE node_id = ? ORDER BY seq LIMIT 1",
+            (self._root_node_id,),
+        ).fetchone()
+        old_package_name, package_version = root_pkg_id.split("@")
+
+        # Rename the root note
+        self._db.execute(
+            "UPDATE nodes SET node_id = ?, pkg_id = ? WHERE seq = ?",
+            (new_name, f"{new_name}@{package_version}", root_seq),
+        )
+
+        # Rename the package, or the last package if it is not found
+        row = self._db.execute(
+            "SELECT seq FROM pkgs WHERE id = ? ORDER BY seq LIMIT 1",
+            (f"{old_package_name}@{package_version}",),
+        ).fetchone()
+        pkg_seq = (
+            row[0]
+            if row
+            else self._db.execute("SELECT MAX(seq) FROM pkgs").fetchone()[0]
+        )
+        self._db.execute(
+            "UPDATE pkgs SET id = ?, name = ? WHERE seq = ?",
+            (f"{new_name}@{package_version}", new_name, pkg_seq),
+        )
+
+        # Finally, rename the rootNodeId
+        self._root_node_id = new_name
+
+
+# storage engines selectable for DepGraphs
+GRAPH_STORES = {
+    "memory": DepGraph,
+    "sqlite": SqliteDepGraph,
+}
+
+
+def create_dep_graph(
+    pkg_manager_name: str, graph_store: str = "memory", directory: str = None
+) -> DepGraph:
+    """
+    Create an empty DepGraph backed by the given storage engine
+    """
+    if graph_store == "sqlite":
+        return SqliteDepGraph(pkg_manager_name, directory)
+    return GRAPH_STORES[graph_store](pkg_manager_name)
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Dict
+from typing import FrozenSet
+from typing import NamedTuple
+from typing import Optional
+from bazel2snyk import logger
+from bazel2snyk.rules import BazelRule
+from bazel2snyk.rules import read_header
+from bazel2snyk.rules import rule_deps
+from bazel2snyk.rules import rule_from_json
+
+# header of cache files written by load_maven_install(), followed by
+# the version of their format, e.g. bazel2snyk-maven-install-v2
+MAVEN_INSTALL_CACHE_MAGIC = b"bazel2snyk-maven-install-"
+MAVEN_INSTALL_CACHE_VERSION = 2
+
+# lockfiles already loaded by this process, keyed by digest and repo name
+_loaded = {}
+
+
+class MavenInstall(NamedTuple):
+    """
+    Artifact graph of a rules_jvm_external maven_install.json lockfile,
+    as jvm_import rules plus the precomputed closure of every artifact
+    """
+
+    digest: str
+    rules: Dict[str, BazelRule]
+    closures: Dict[str, FrozenSet[str]]
+
+
+def artifact_label(coordinates: str, repo_name: str = "@maven") -> str:
+    """
+    Label rules_jvm_external generates for an artifact given without its
+    version, e.g. com.google.guava:guava -> @maven//:com_google_guava_guava
+    """
+    parts = coordinates.split(":")
+    # the default jar packaging is left out of labels
+    if len(parts) > 2 and parts[2] == "jar":
+        del parts[2]
+    return f"{repo_name}//:" + re.sub(r"[.\-:/+]", "_", ":".join(parts))
+
+
+def _split_version(coordinates: str):
+    """
+    Split group:artifact[:packaging[:classifier]]:version coordinates
+    """
+    k = coordinates.rfind(":")
+    return coordinates[:k], coordinates[k + 1 :]
+
+
+def _artifacts_v1(lockfile: dict) -> Dict[str, tuple]:
+    """
+    Artifacts of a version 1 lockfile, which lists every
+    artifact with its versioned direct dependencies
+    """
+    artifacts = {}
+    for artifact in lockfile["dependency_tree"]["dependencies"]:
+        coordinates, version = _split_version(artifact["coord"])
+        artifacts[coordinates] = (
+            version,
+            [_split_version(x)[0] for x in artifact.get("directDependencies", [])],
+        )
+    return artifacts
+
+
+def _artifacts_v2(lockfile: dict) -> Dict[str, tuple]:
+    """
+    Artifacts of a version 2 lockfile, which keys versions and direct
+    dependencies by unversioned coordinates, with classified jars
+    listed as further shasums of their artifact
+    """
+    artifacts = {}
+    dependencies = lockfile.get("dependencies", {})
+    for unclassified, artifact in lockfile["artifacts"].items():
+        for classifier in artifact.get("shasums") or {"jar": None}:
+            coordinates = unclassified
+            if classifier != "jar":
+                coordinates = f"{unclassified}:jar:{classifier}"
+            artifacts[coordinates] = (
+                artifact["version"],
+                dependencies.get(coordinates, []),
+            )
+    return artifacts
+
+
+def parse_maven_install(
+    lockfile: dict, repo_name: str = "@maven", location: str = "maven_install.json"
+) -> Dict[str, BazelRule]:
+    """
+    Build the jvm_import rules rules_jvm_external generates
+    from the artifacts pinned in a lockfile
+    """
+    if "dependency_tree" in lockfile:
+        artifacts = _artifacts_v1(lockfile)
+    else:
+        artifacts = _artifacts_v2(lockfile)
+
+    rules_index = {}
+    for coordinates, (version, dependencies) in artifacts.items():
+        name = artifact_label(coordinates, repo_name)
+        rules_index[name] = BazelRule(
+            name=name,
+            rule_class="jvm_import",
+            location=location,
+            lists={
+                "tags": [f"maven_coordinates={coordinates}:{version}"],
+                "deps": [artifact_label(x, repo_name) for x in dependencies],
+            },
+            strings={"name": name.split(":")[-1]},
+        )
+    return rules_index
+
+
+def artifact_closures(rules_index: Dict[str, BazelRule]) -> Dict[str, FrozenSet[str]]:
+    """
+    Transitive closure of every rule, each artifact included in its own
+    """
+    closures = {}
+    for name in rules_index:
+        if name in closures:
+            continue
+        reachable = set()
+        stack = [name]
+        while stack:
+            dep = stack.pop()
+            if dep in reachable or dep not in rules_index:
+                continue
+            if dep in closures:
+                reachable |= closures[dep]
+                continue
+            reachable.add(dep)
+            stack.extend(rule_deps(rules_index[dep]))
+        closures[name] = frozenset(reachable)
+    return closures
+
+
+def _read_cache(cache_path: str, digest: str) -> Optional[MavenInstall]:
+    """
+    MavenInstall cached by _write_cache(), or None if the file is of
+    another format version, of another lockfile, or malformed
+    """
+    try:
+        with open(cache_path, "rb") as f:
+            version = read_header(f, MAVEN_INSTALL_CACHE_MAGIC)
+            if version != MAVEN_INSTALL_CACHE_VERSION:
+                logger.debug(f"ignoring {cache_path} of format version {version}")
+                return None
+            cached = json.load(f)
+        if cached["digest"] != digest:
+            logger.debug(f"ignoring {cache_path} of another lockfile")
+            return None
+        rules = {}
+        for value in cached["rules"]:
+            rule = rule_from_json(value)
+            rules[rule.name] = rule
+        closures = {
+            name: frozenset(closure) for name, closure in cached["closures"].items()
+        }
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.debug(f"ignoring {cache_path}: {e}")
+        return None
+    return MavenInstall(digest=digest, rules=rules, closures=closures)
+
+
+def _write_cache(cache_path: str, maven_install: MavenInstall):
+    """
+    Write maven_install to cache_path as JSON, atomically, so the cache
+    directory may be shared. A cache that cannot be written is logged
+    rather than raised, as the closures are already computed.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAVEN_INSTALL_CACHE_MAGIC)
+            f.write(f"v{MAVEN_INSTALL_CACHE_VERSION}\n".encode())
+            cached = {
+                "digest": maven_install.digest,
+                "rules": [list(x) for x in maven_install.rules.values()],
+                "closures": {
+                    name: sorted(closure)
+                    for name, closure in maven_install.closures.items()
+                },
+            }
+            f.write(json.dumps(cached).encode())
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Not caching maven_install closures in {cache_dir}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_maven_install(
+    path: str, repo_name: str = "@maven", cache_dir: str = None
+) -> MavenInstall:
+    """
+    Load the artifact graph of a maven_install.json lockfile. Closures are
+    computed once per lockfile digest, and kept for the life of the process
+    and, if cache_dir is given, written there as JSON for later runs.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    key = (digest, repo_name)
+    if key in _loaded:
+        return _loaded[key]
+
+    cache_path = None
+    if cache_dir:
+        cache_name = re.sub(r"\W", "_", repo_name.lstrip("@"))
+        cache_path = os.path.join(cache_dir, f"maven_install-{cache_name}-{digest}.idx")
+        if os.path.exists(cache_path):
+            logger.debug(f"loading maven_install closures from {cache_path}")
+            cached = _read_cache(cache_path, digest)
+            if cached is not None:
+                _loaded[key] = cached
+                return cached
+
+    rules_index = parse_maven_install(json.loads(content), repo_name, path)
+    maven_install = MavenInstall(
+        digest=digest, rules=rules_index, closures=artifact_closures(rules_index)
+    )
+    logger.debug(f"{len(rules_index)} artifacts loaded from {path}")
+
+    if cache_path:
+        _write_cache(cache_path, maven_install)
+
+    _loaded[key] = maven_install
+    return maven_install
+
+
+def merge_maven_install(
+    rules_index: Dict[str, BazelRule], maven_install: MavenInstall
+) -> Dict[str, BazelRule]:
+    """
+    Add the lockfile's artifacts to a rules index of first-party targets.
+    The lockfile is authoritative for the artifacts it pins, rules of the
+    maven repo it does not pin, such as aliases, are kept.
+    """
+    merged = {
+        name: rule
+        for name, rule in rules_index.items()
+        if name not in maven_install.rules
+    }
+    merged.update(maven_install.rules)
+    return merged
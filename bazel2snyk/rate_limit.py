@@ -0,0 +1,147 @@
+import email.utils
+import fcntl
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Callable
+from typing import Dict
+from typing import Tuple
+import requests
+from bazel2snyk import logger
+
+# shared state of the bucket: tokens left as of a time, which may be in the
+# future while requests are deferred by a Retry-After
+_STATE = struct.Struct("=dd")
+
+# per user, as the file is created readable and writable by its owner alone
+DEFAULT_RATE_LIMIT_FILE = os.path.join(
+    tempfile.gettempdir(), f"bazel2snyk-rate-limit-{os.getuid()}"
+)
+
+
+class RateLimiter(object):
+    """
+    Token bucket of rate requests per second, bursting up to burst, shared
+    by every process on the host through a state file locked with flock.
+    The file is created readable and writable by its owner alone, so
+    processes of other users share it only if it is made writable by them.
+    Each process keeps its own wait metrics.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        path: str = DEFAULT_RATE_LIMIT_FILE,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Invalid rate limit of {rate}/s with a burst of {burst}")
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "rate_limited": 0,
+        }
+
+    def _update(self, func: Callable[[float, float, float], Tuple]):
+        """
+        Call func(tokens, updated, now) with the file locked, and store the
+        tokens and updated time it returns unless it returns None
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = self.clock()
+            data = os.pread(fd, _STATE.size, 0)
+            tokens, updated = (
+                _STATE.unpack(data) if len(data) == _STATE.size else (self.burst, now)
+            )
+            state = func(tokens, updated, now)
+            if state is not None:
+                os.pwrite(fd, _STATE.pack(*state), 0)
+        finally:
+            os.close(fd)
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available, and return the
+        seconds waited
+        """
+        waited = 0.0
+        while True:
+            wait = None
+
+            def take(tokens: float, updated: float, now: float):
+                nonlocal wait
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    return tokens - 1, now
+                wait = (1 - tokens) / self.rate
+                return None
+
+            self._update(take)
+            if wait is None:
+                break
+            self.sleep(wait)
+            waited += wait
+
+        with self._lock:
+            self._metrics["requests"] += 1
+            if waited:
+                self._metrics["waits"] += 1
+                self._metrics["wait_seconds"] += waited
+                self._metrics["max_wait_seconds"] = max(
+                    self._metrics["max_wait_seconds"], waited
+                )
+        return waited
+
+    def defer(self, seconds: float):
+        """
+        Hold back every process sharing the bucket for seconds, e.g. the
+        Retry-After of a 429 response
+        """
+        logger.warning(f"Rate limited, deferring requests for {seconds}s")
+        self._update(lambda tokens, updated, now: (0, max(now + seconds, updated)))
+        with self._lock:
+            self._metrics["rate_limited"] += 1
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Requests made, how many and how long of them waited, and how many
+        were rate limited by the API in this process
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["wait_seconds"] = round(metrics["wait_seconds"], 3)
+        metrics["max_wait_seconds"] = round(metrics["max_wait_seconds"], 3)
+        return metrics
+
+
+def retry_after(resp: requests.Response, default: float = 1.0) -> float:
+    """
+    Seconds to wait according to the Retry-After header of a response,
+    given in seconds or as an HTTP date
+    """
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(date.timestamp() - time.time(), 0.0)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any
+from typing import Optional
+from typing import Union
+from bazel2snyk import logger
+from bazel2snyk.depgraph import DepGraph
+from bazel2snyk.depgraph import canonical_members
+
+
+def depgraph_digest(body: Union[dict, DepGraph], *scope: str) -> str:
+    """
+    Content hash of a depGraph request body, or of a DepGraph, from its
+    package manager, pkgs and edges. The root node is left out, so targets
+    with identical dependencies share a digest. scope, e.g. the org, is
+    hashed as well. The canonical JSON is hashed as it is encoded, so the
+    sorted pkgs and edges of a disk-backed DepGraph are never held in memory.
+    """
+    if isinstance(body, DepGraph):
+        pkg_manager = body.pkg_manager_name
+        pkgs, edges = body.canonical()
+    else:
+        pkg_manager = body["depGraph"]["pkgManager"]["name"]
+        pkgs, edges = canonical_members(body)
+
+    def encode(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    # the same text as json.dumps of the canonical dict
+    digest = hashlib.sha256()
+    digest.update(b'{"scope":' + encode(list(scope)))
+    digest.update(b',"pkgManager":' + encode(pkg_manager) + b',"pkgs":[')
+    for i, pkg in enumerate(pkgs):
+        digest.update((b"," if i else b"") + encode(pkg))
+    digest.update(b'],"edges":[')
+    for i, edge in enumerate(edges):
+        digest.update((b"," if i else b"") + encode(list(edge)))
+    digest.update(b"]}")
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Directory of JSON responses keyed by content hash, e.g. by
+    depgraph_digest(). Entries expire after ttl seconds, and the least
+    recently used are evicted once the directory exceeds max_bytes.
+    Entries are written atomically, so the directory may be shared.
+    Raises OSError if the directory cannot be created.
+    """
+
+    def __init__(self, directory: str, ttl: int = 3600, max_bytes: int = 256 << 20):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Response stored under key, or None on a miss. Entries that are
+        not JSON objects with a created time and a response, e.g. written
+        by another version, are removed and count as misses.
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except OSError:
+            self.misses += 1
+            return None
+        except ValueError:
+            stored = None
+
+        if not (
+            isinstance(stored, dict)
+            and isinstance(stored.get("created"), (int, float))
+            and "response" in stored
+        ):
+            logger.debug(f"cache entry {key} is malformed")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        if time.time() - stored["created"] > self.ttl:
+            logger.debug(f"cache entry {key} expired")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # touch the entry so eviction removes the least recently used first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return stored["response"]
+
+    def put(self, key: str, response: Any):
+        """
+        Store response under key, logging rather than raising if the
+        directory cannot be written, as the response is not lost
+        """
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError as e:
+            logger.warning(f"Not caching test result {key}: {e}")
+            return
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"created": time.time(), "response": response}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Not caching test result {key}: {e}")
+            self._remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Remove expired entries, then the least recently used
+        until the cache fits within max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        now = time.time()
+        total_bytes = 0
+        kept = []
+        for mtime, size, path in entries:
+            if now - mtime > self.ttl:
+                self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+                total_bytes += size
+
+        for mtime, size, path in sorted(kept):
+            if total_bytes <= self.max_bytes:
+                break
+            logger.debug(f"evicting {path}")
+            self._remove(path)
+            total_bytes -= size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def summary(self) -> str:
+        return f"result cache: {self.hits} hit(s), {self.misses} miss(es)"
@@ -0,0 +1,156 @@
+import os
+import sqlite3
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from bazel2snyk import logger
+from bazel2snyk.bazel import BazelNodeType
+from bazel2snyk.bazel import BazelXmlParser
+from bazel2snyk.converter import Converter
+from bazel2snyk.rules import is_repository_rule
+
+SCHEMA = """
+CREATE TABLE reverse_deps (
+    package TEXT, name TEXT, package_source TEXT, label TEXT, target TEXT, paths INTEGER
+);
+CREATE INDEX reverse_deps_package ON reverse_deps (package);
+CREATE INDEX reverse_deps_name ON reverse_deps (name);
+"""
+
+
+class ReverseDependency(NamedTuple):
+    """
+    A Snyk package reached from a top-level target through a bazel label,
+    with the number of distinct paths from the target to the label
+    """
+
+    package: str
+    package_source: str
+    label: str
+    target: str
+    paths: int
+
+
+def top_level_targets(converter: Converter) -> List[str]:
+    """
+    First-party targets that no other first-party target depends on.
+    Repository rules, e.g. //external:com_github_pkg_errors, are not targets.
+    """
+    parser = converter.bazel_xml_parser
+    # the root package, e.g. //:app, is first-party too
+    internal = [
+        name
+        for name, rule in converter.rules_index.items()
+        if name.startswith("//")
+        and parser.get_node_type(name) != BazelNodeType.DEPENDENCY
+        and not is_repository_rule(rule)
+    ]
+    depended_on = set()
+    for name in internal:
+        depended_on.update(parser.get_children_from_rule(name))
+    return [name for name in internal if name not in depended_on]
+
+
+def _topological_order(parser: BazelXmlParser, target: str) -> List[str]:
+    """
+    Labels reachable from target with every label before its deps
+    """
+    order = []
+    visited = {target}
+    stack = [(target, iter(parser.get_children_from_rule(target)))]
+    while stack:
+        label, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            order.append(label)
+        elif child not in visited:
+            visited.add(child)
+            stack.append((child, iter(parser.get_children_from_rule(child))))
+    order.reverse()
+    return order
+
+
+def reverse_dependencies(
+    converter: Converter, targets: Iterable[str] = None
+) -> Iterator[ReverseDependency]:
+    """
+    Walk every target, by default every top-level target, and yield the
+    packages of the converted package sources each one reaches
+    """
+    parser = converter.bazel_xml_parser
+    # labels resolve to the same package whichever target reaches them
+    packages: Dict[str, Optional[tuple]] = {}
+
+    def package_of(label: str) -> Optional[tuple]:
+        if label not in packages:
+            packages[label] = None
+            package_source = parser.get_package_source(label)
+            if package_source in converter.package_sources:
+                package = parser.get_coordinates_from_bazel_dep(label, package_source)
+                if package != label:
+                    packages[label] = (package, package_source)
+        return packages[label]
+
+    for target in top_level_targets(converter) if targets is None else targets:
+        if target not in converter.rules_index:
+            logger.error(f"{target} not found in the source data, skipping")
+            continue
+
+        path_counts = {target: 1}
+        # paths to a label are the sum of the paths to the labels depending on it
+        for label in _topological_order(parser, target):
+            for child in parser.get_children_from_rule(label):
+                path_counts[child] = path_counts.get(child, 0) + path_counts[label]
+
+        for label, paths in path_counts.items():
+            package = package_of(label)
+            if package:
+                yield ReverseDependency(package[0], package[1], label, target, paths)
+
+
+def write_reverse_index(reverse_deps: Iterable[ReverseDependency], path: str) -> int:
+    """
+    Write reverse dependencies to an SQLite index, replacing any existing
+    one, and return the number written
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    count = 0
+    for reverse_dep in reverse_deps:
+        db.execute(
+            "INSERT INTO reverse_deps VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                reverse_dep.package,
+                reverse_dep.package[: reverse_dep.package.rfind("@")],
+                reverse_dep.package_source,
+                reverse_dep.label,
+                reverse_dep.target,
+                reverse_dep.paths,
+            ),
+        )
+        count += 1
+    db.commit()
+    db.close()
+    return count
+
+
+def who_depends(path: str, package: str) -> List[ReverseDependency]:
+    """
+    Look up the targets depending on a package, given as name@version
+    or as a name to match every version
+    """
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    column = "package" if "@" in package.lstrip("@") else "name"
+    rows = db.execute(
+        "SELECT package, package_source, label, target, paths FROM reverse_deps "
+        f"WHERE {column} = ? ORDER BY package, target, label",
+        (package,),
+    ).fetchall()
+    db.close()
+    return [ReverseDependency(*row) for row in rows]
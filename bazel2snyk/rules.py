@@ -0,0 +1,428 @@
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from typing import BinaryIO
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from xml.etree import ElementTree
+
+BUILD_FILE_LOCATION_RE = re.compile(r".*/BUILD(\.bzl|\.bazel)?\:\d+\:\d+$")
+
+# elements that appear directly under <query> in bazel query XML output
+TOP_LEVEL_TAGS = ("rule", "source-file", "generated-file", "package-group")
+
+# classes of repository rules not following the *_repository naming
+REPOSITORY_RULE_CLASSES = frozenset(
+    [
+        "http_archive",
+        "http_file",
+        "http_jar",
+        "maven_install",
+        "coursier_fetch",
+        "pinned_coursier_fetch",
+        "pip_parse",
+        "crates_repository",
+    ]
+)
+
+# header of rules indexes written by write_rules_index(), followed by
+# the version of their format, e.g. bazel2snyk-rules-index-v2
+RULES_INDEX_MAGIC = b"bazel2snyk-rules-index-"
+RULES_INDEX_VERSION = 2
+
+
+class BazelRule(NamedTuple):
+    """
+    Lightweight record of a <rule> element from bazel query XML output,
+    keeping only the attributes needed for conversion
+    """
+
+    name: str
+    rule_class: str
+    location: str
+    lists: Dict[str, List[str]]
+    strings: Dict[str, str]
+
+
+def rule_deps(rule: BazelRule) -> List[str]:
+    """
+    Labels a rule depends on, taken from deps or, if
+    the rule has no deps attribute, from runtime_deps
+    """
+    deps = rule.lists.get("deps")
+    if deps is None:
+        deps = rule.lists.get("runtime_deps", [])
+    return deps
+
+
+class ScopeFilter(NamedTuple):
+    """
+    Which rules of the query output are in scope for conversion. Rules out
+    of scope are left out of the rules index and dropped from the deps of
+    the rules depending on them, so their subtrees are never walked.
+    Tag and label patterns are shell-style globs, e.g. //tools/*.
+    include_labels only restricts first-party labels, those starting //.
+    dep_attrs lists the attributes followed to dependencies, by default
+    deps or, if a rule has none, runtime_deps.
+    """
+
+    exclude_testonly: bool = False
+    exclude_rule_classes: Tuple[str, ...] = ()
+    exclude_tags: Tuple[str, ...] = ()
+    include_labels: Tuple[str, ...] = ()
+    exclude_labels: Tuple[str, ...] = ()
+    dep_attrs: Tuple[str, ...] = ()
+
+    def admits_label(self, label: str) -> bool:
+        if any(fnmatchcase(label, x) for x in self.exclude_labels):
+            return False
+        if self.include_labels and label.startswith("//"):
+            return any(fnmatchcase(label, x) for x in self.include_labels)
+        return True
+
+    def admits(self, rule: BazelRule) -> bool:
+        if self.exclude_testonly and rule.strings.get("testonly") in ("1", "true"):
+            return False
+        if rule.rule_class in self.exclude_rule_classes:
+            return False
+        for tag in rule.lists.get("tags", []):
+            if any(fnmatchcase(tag, x) for x in self.exclude_tags):
+                return False
+        return self.admits_label(rule.name)
+
+    def scoped_deps(self, rule: BazelRule, excluded: Set[str]) -> List[str]:
+        """
+        Labels the rule depends on through dep_attrs, less those out of scope
+        """
+        if self.dep_attrs:
+            deps = dict.fromkeys(
+                dep for attr in self.dep_attrs for dep in rule.lists.get(attr, [])
+            )
+        else:
+            deps = rule_deps(rule)
+        return [x for x in deps if x not in excluded and self.admits_label(x)]
+
+
+def apply_scope(
+    rules_index: Dict[str, BazelRule],
+    scope: ScopeFilter,
+    excluded: Iterable[str] = (),
+) -> Dict[str, BazelRule]:
+    """
+    Reduce the rules index to the rules in scope, with their deps limited
+    to rules in scope. excluded names rules already left out of the index.
+    """
+    excluded = set(excluded)
+    excluded.update(
+        name for name, rule in rules_index.items() if not scope.admits(rule)
+    )
+
+    scoped_index = {}
+    for name, rule in rules_index.items():
+        if name in excluded:
+            continue
+        deps = scope.scoped_deps(rule, excluded)
+        if deps != rule_deps(rule):
+            rule = rule._replace(lists={**rule.lists, "deps": deps})
+        scoped_index[name] = rule
+    return scoped_index
+
+
+def rule_from_element(rule: ElementTree.Element) -> BazelRule:
+    """
+    Build a BazelRule record from a <rule> element
+    """
+    lists = {}
+    strings = {}
+    for attr in rule:
+        attr_name = attr.get("name")
+        if attr_name is None:
+            continue
+        if attr.tag == "list":
+            # the first list of a given name wins, as with findall()
+            if attr_name not in lists:
+                lists[attr_name] = [x.get("value") for x in attr]
+        elif attr.tag not in ("rule-input", "rule-output"):
+            strings[attr_name] = attr.get("value")
+
+    return BazelRule(
+        name=rule.get("name"),
+        rule_class=rule.get("class"),
+        location=rule.get("location"),
+        lists=lists,
+        strings=strings,
+    )
+
+
+def is_indexed_rule(rule: ElementTree.Element) -> bool:
+    """
+    Only rules declared in BUILD files are indexed. Repository rules under
+    //external: are kept as well, since some package sources read their
+    coordinates from them.
+    """
+    return bool(BUILD_FILE_LOCATION_RE.match(rule.get("location", ""))) or rule.get(
+        "name", ""
+    ).startswith("//external:")
+
+
+def is_repository_rule(rule: BazelRule) -> bool:
+    """
+    Whether a rule defines an external repository, e.g. a go_repository
+    declared in the WORKSPACE, rather than a buildable target
+    """
+    return (
+        rule.name.startswith("//external:")
+        or rule.rule_class.endswith("_repository")
+        or rule.rule_class in REPOSITORY_RULE_CLASSES
+    )
+
+
+def build_rules_index(
+    rules: ElementTree.Element, scope: ScopeFilter = None
+) -> Dict[str, BazelRule]:
+    """
+    Index the <rule> elements of a parsed query output by rule name,
+    limited to the rules in scope if given
+    """
+    rules_index = {}
+    for rule in rules.findall("rule"):
+        if is_indexed_rule(rule):
+            rules_index[rule.get("name")] = rule_from_element(rule)
+
+    if scope:
+        rules_index = apply_scope(rules_index, scope)
+    return rules_index
+
+
+def build_rules_index_from_stream(
+    stream: BinaryIO, scope: ScopeFilter = None
+) -> Dict[str, BazelRule]:
+    """
+    Index the <rule> elements of query output read incrementally from a
+    file object, e.g. the stdout of a running bazel query. Elements are
+    discarded once indexed so the document is never held in memory, and
+    rules out of scope, if given, are discarded as they are read.
+    """
+    rules_index = {}
+    excluded = set()
+    context = ElementTree.iterparse(stream, events=("start", "end"))
+    _, root = next(context)
+    for event, element in context:
+        if event != "end" or element.tag not in TOP_LEVEL_TAGS:
+            continue
+        if element.tag == "rule" and is_indexed_rule(element):
+            rule = rule_from_element(element)
+            if scope is None or scope.admits(rule):
+                rules_index[rule.name] = rule
+            else:
+                excluded.add(rule.name)
+        root.clear()
+
+    if scope:
+        rules_index = apply_scope(rules_index, scope, excluded)
+    return rules_index
+
+
+def _find_chunk_boundaries(
+    query_output: mmap.mmap, chunk_count: int
+) -> List[Tuple[int, int]]:
+    """
+    Split the query output into byte ranges that each start at a top-level
+    <rule> element. Attribute values are escaped, so "<rule " can only
+    appear as the start of a rule element.
+    """
+    end = query_output.rfind(b"</query>")
+    if end == -1:
+        end = len(query_output)
+
+    boundaries = []
+    for i in range(chunk_count):
+        start = query_output.find(b"<rule ", end * i // chunk_count, end)
+        if start == -1:
+            break
+        if not boundaries or start > boundaries[-1]:
+            boundaries.append(start)
+    boundaries.append(end)
+
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def _index_chunk(path: str, start: int, end: int) -> Dict[str, BazelRule]:
+    """
+    Index the rules within a byte range of a query output file. The file is
+    memory-mapped in the worker so the chunk is not sent between processes.
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as query_output:
+            chunk = query_output[start:end]
+
+    return build_rules_index(ElementTree.fromstring(b"<query>" + chunk + b"</query>"))
+
+
+def build_rules_index_parallel(
+    path: str,
+    workers: int = None,
+    chunks_per_worker: int = 4,
+    scope: ScopeFilter = None,
+) -> Dict[str, BazelRule]:
+    """
+    Index a query output file by parsing chunks of it across a process pool
+    and merging the partial indexes. Rules may depend on rules of other
+    chunks, so scope is applied to the merged index. A rules index written
+    by write_rules_index() needs no parsing, and is loaded directly.
+    """
+    workers = workers or os.cpu_count()
+
+    with open(path, "rb") as f:
+        if read_header(f, RULES_INDEX_MAGIC) is not None:
+            return load_rules_index(path, scope)
+        f.seek(0)
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as query_output:
+            chunks = _find_chunk_boundaries(query_output, workers * chunks_per_worker)
+
+    rules_index = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_index_chunk, path, *chunk) for chunk in chunks]
+        # merge in document order so later duplicates win, as when parsing serially
+        for future in futures:
+            rules_index.update(future.result())
+
+    if scope:
+        rules_index = apply_scope(rules_index, scope)
+    return rules_index
+
+
+def subset_rules_index(
+    rules_index: Dict[str, BazelRule],
+    targets: Iterable[str],
+    closures: Dict[str, FrozenSet[str]] = None,
+) -> Dict[str, BazelRule]:
+    """
+    Reduce the rules index to the transitive closure of the given targets,
+    plus the //external: repository rules of external repos in the closure.
+    closures optionally holds precomputed closures, e.g. of the artifacts
+    of a maven_install.json lockfile, which are added without walking them.
+    """
+    closures = closures or {}
+    reachable = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name in reachable or name not in rules_index:
+            continue
+        if name in closures:
+            reachable |= closures[name]
+            continue
+        reachable.add(name)
+        stack.extend(rule_deps(rules_index[name]))
+
+    for name in list(reachable):
+        if name.startswith("@"):
+            repo_rule_name = "//external:" + name.split("//")[0].lstrip("@")
+            if repo_rule_name in rules_index:
+                reachable.add(repo_rule_name)
+
+    return {name: rule for name, rule in rules_index.items() if name in reachable}
+
+
+def read_header(f: BinaryIO, magic: bytes) -> Optional[int]:
+    """
+    Format version in the header line of a file written with magic, e.g.
+    RULES_INDEX_MAGIC, or None if the file does not start with magic.
+    Raises ValueError if the version is not a number.
+    """
+    line = f.readline(len(magic) + 16)
+    if not line.startswith(magic):
+        return None
+    version = line[len(magic) :].rstrip(b"\n")
+    if not (version.startswith(b"v") and version[1:].isdigit()):
+        raise ValueError(f"malformed header {line!r}")
+    return int(version[1:])
+
+
+def rule_from_json(value: list) -> BazelRule:
+    """
+    BazelRule from the list of its fields, as written by write_rules_index(),
+    checking their types so a malformed file fails to load
+    """
+    try:
+        name, rule_class, location, lists, strings = value
+    except (TypeError, ValueError):
+        raise ValueError(f"malformed rule {str(value)[:80]}")
+    if not (
+        isinstance(name, str)
+        and isinstance(rule_class, str)
+        and isinstance(location, str)
+        and isinstance(lists, dict)
+        and all(isinstance(x, list) for x in lists.values())
+        and isinstance(strings, dict)
+    ):
+        raise ValueError(f"malformed rule {str(value)[:80]}")
+    return BazelRule(name, rule_class, location, lists, strings)
+
+
+def write_rules_index(rules_index: Dict[str, BazelRule], path: str):
+    """
+    Write a rules index for reuse by later runs, as query XML output if
+    the path ends with .xml and otherwise as an index of one JSON rule per
+    line that loads without parsing XML
+    """
+    if not path.endswith(".xml"):
+        with open(path, "wb") as f:
+            f.write(RULES_INDEX_MAGIC + f"v{RULES_INDEX_VERSION}\n".encode())
+            for rule in rules_index.values():
+                f.write(json.dumps(list(rule)).encode() + b"\n")
+        return
+
+    query = ElementTree.Element("query", version="2")
+    for rule in rules_index.values():
+        rule_element = ElementTree.SubElement(
+            query,
+            "rule",
+            {"class": rule.rule_class, "location": rule.location, "name": rule.name},
+        )
+        for attr_name, value in rule.strings.items():
+            ElementTree.SubElement(
+                rule_element, "string", name=attr_name, value=value or ""
+            )
+        for attr_name, values in rule.lists.items():
+            list_element = ElementTree.SubElement(rule_element, "list", name=attr_name)
+            for value in values:
+                ElementTree.SubElement(list_element, "label", value=value or "")
+
+    ElementTree.indent(query)
+    ElementTree.ElementTree(query).write(path, encoding="UTF-8", xml_declaration=True)
+
+
+def load_rules_index(path: str, scope: ScopeFilter = None) -> Dict[str, BazelRule]:
+    """
+    Load a rules index from query XML output or from an index written by
+    write_rules_index(), limited to the rules in scope if given. Raises
+    ValueError for an index of another format version, or a malformed one.
+    """
+    with open(path, "rb") as f:
+        version = read_header(f, RULES_INDEX_MAGIC)
+        if version is None:
+            f.seek(0)
+            return build_rules_index_from_stream(f, scope)
+        if version != RULES_INDEX_VERSION:
+            raise ValueError(
+                f"{path} is a version {version} rules index, "
+                f"expected version {RULES_INDEX_VERSION}, write it again"
+            )
+        rules_index = {}
+        for line in f:
+            rule = rule_from_json(json.loads(line))
+            rules_index[rule.name] = rule
+        return apply_scope(rules_index, scope) if scope else rules_index
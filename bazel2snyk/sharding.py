@@ -0,0 +1,94 @@
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Set
+from bazel2snyk import logger
+
+
+def _reachable(nodes: Dict[str, dict], node_id: str) -> Set[str]:
+    """
+    Node ids reachable from node_id, node_id included
+    """
+    reachable = {node_id}
+    stack = [node_id]
+    while stack:
+        for dep in nodes[stack.pop()]["deps"]:
+            if dep["nodeId"] not in reachable:
+                reachable.add(dep["nodeId"])
+                stack.append(dep["nodeId"])
+    return reachable
+
+
+def shard_dep_graph(body: dict, shard_count: int) -> List[dict]:
+    """
+    Split a depGraph request body into at most shard_count bodies, each
+    keeping the root node and a share of its direct dependency subtrees.
+    Subtrees are assigned largest first to the smallest shard, so shards
+    are of similar size, and nodes shared between subtrees are repeated
+    in each shard that reaches them.
+    """
+    dep_graph = body["depGraph"]
+    graph = dep_graph["graph"]
+    nodes = {node["nodeId"]: node for node in graph["nodes"]}
+    root_node = nodes[graph["rootNodeId"]]
+    direct_deps = [dep["nodeId"] for dep in root_node["deps"]]
+    if shard_count <= 1 or len(direct_deps) <= 1:
+        return [body]
+
+    subtrees = {node_id: _reachable(nodes, node_id) for node_id in direct_deps}
+    shards = [(set(), []) for _ in range(min(shard_count, len(direct_deps)))]
+    for node_id in sorted(direct_deps, key=lambda x: -len(subtrees[x])):
+        reachable, roots = min(shards, key=lambda x: len(x[0]))
+        reachable.update(subtrees[node_id])
+        roots.append(node_id)
+
+    pkgs = {pkg["id"]: pkg for pkg in dep_graph["pkgs"]}
+    bodies = []
+    for reachable, roots in shards:
+        roots = set(roots)
+        shard_nodes = [
+            {
+                "nodeId": root_node["nodeId"],
+                "pkgId": root_node["pkgId"],
+                "deps": [x for x in root_node["deps"] if x["nodeId"] in roots],
+            }
+        ]
+        # keep the original node order, so shards serialize deterministically
+        shard_nodes.extend(
+            node for node in graph["nodes"] if node["nodeId"] in reachable
+        )
+        pkg_ids = dict.fromkeys(node["pkgId"] for node in shard_nodes)
+        bodies.append(
+            {
+                "depGraph": {
+                    **dep_graph,
+                    "pkgs": [pkgs[pkg_id] for pkg_id in pkg_ids],
+                    "graph": {**graph, "nodes": shard_nodes},
+                }
+            }
+        )
+        logger.debug(f"shard of {len(shard_nodes)} nodes from {len(roots)} subtrees")
+    return bodies
+
+
+def merge_test_responses(responses: List[dict]) -> dict:
+    """
+    Merge the test responses of several shards into one response,
+    with each issue reported once per vulnerable package
+    """
+    if len(responses) == 1:
+        return responses[0]
+
+    merged: Dict[str, Any] = dict(responses[0])
+    merged["ok"] = all(str(x["ok"]) != "False" for x in responses)
+    merged["issuesData"] = {}
+    merged["issues"] = []
+    seen = set()
+    for response in responses:
+        merged["issuesData"].update(response.get("issuesData") or {})
+        for issue in response.get("issues") or []:
+            key = (issue.get("issueId"), issue.get("pkgName"), issue.get("pkgVersion"))
+            if key not in seen:
+                seen.add(key)
+                merged["issues"].append(issue)
+    return merged
@@ -0,0 +1,242 @@
+import codecs
+import json
+import re
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+# characters that change the nesting of JSON text outside of strings
+_STRUCTURE = re.compile(r'["{}\[\],:]')
+_STRING_END = re.compile(r'["\\]')
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+# the text of an empty array, or of a missing value
+_EMPTY = object()
+
+Member = Tuple[str, Any, Any]
+
+
+class ResponseScanner(object):
+    """
+    Incremental parser of a JSON object, fed text in arbitrary chunks.
+    Members of the object are produced as (key, None, value) once complete,
+    except objects and arrays, which are produced one item at a time as
+    (key, item key or index, item). Only the item being parsed is held in
+    memory, e.g. one issue of a test response.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.string_start = None
+        self.expect_key = False
+        self.key = None
+        self.item_key = None
+        self.value_start = None
+
+    def _value(self, end: int) -> Any:
+        text = self.buffer[self.value_start : end]
+        self.value_start = None
+        return json.loads(text) if text.strip() else _EMPTY
+
+    def _decode_item(self, buffer: str, members: List[Member]) -> int:
+        """
+        Decode the item starting at value_start in one call when the buffer
+        holds all of it, and return the position after it, or that of
+        value_start to scan the item character by character
+        """
+        start = _WHITESPACE.match(buffer, self.value_start).end()
+        try:
+            value, end = _DECODER.raw_decode(buffer, start)
+        except ValueError:
+            return self.value_start
+        # a number is only complete once followed by the next delimiter
+        end = _WHITESPACE.match(buffer, end).end()
+        if end >= len(buffer) or buffer[end] not in ",]}":
+            return self.value_start
+        members.append((self.key, self.item_key, value))
+        self.value_start = None
+        return end
+
+    def feed(self, text: str) -> List[Member]:
+        members = []
+        self.buffer += text
+        buffer = self.buffer
+        pos = self.pos
+        while True:
+            if self.in_string:
+                match = _STRING_END.search(buffer, pos)
+                if not match:
+                    pos = len(buffer)
+                    break
+                pos = match.start()
+                if buffer[pos] == "\\":
+                    if pos + 1 >= len(buffer):
+                        break
+                    pos += 2
+                    continue
+                self.in_string = False
+                pos += 1
+                if self.expect_key and len(self.stack) in (1, 2):
+                    key = json.loads(buffer[self.string_start : pos])
+                    if len(self.stack) == 1:
+                        self.key = key
+                    else:
+                        self.item_key = key
+                continue
+
+            match = _STRUCTURE.search(buffer, pos)
+            if not match:
+                pos = len(buffer)
+                break
+            pos = match.start()
+            char = buffer[pos]
+            depth = len(self.stack)
+            if char == '"':
+                self.in_string = True
+                self.string_start = pos
+            elif char == ":":
+                self.expect_key = False
+                if depth in (1, 2):
+                    self.value_start = pos + 1
+                if depth == 2:
+                    pos = self._decode_item(buffer, members)
+                    continue
+            elif char == ",":
+                if depth == 1:
+                    if self.value_start is not None:
+                        members.append((self.key, None, self._value(pos)))
+                    self.expect_key = True
+                elif depth == 2:
+                    if self.value_start is not None:
+                        members.append((self.key, self.item_key, self._value(pos)))
+                    if self.stack[-1] == "[":
+                        self.item_key += 1
+                        self.value_start = pos + 1
+                        pos = self._decode_item(buffer, members)
+                        continue
+                    else:
+                        self.expect_key = True
+            elif char in "{[":
+                self.stack.append(char)
+                if depth == 0:
+                    self.expect_key = True
+                elif depth == 1:
+                    # the member is produced item by item instead of whole
+                    self.value_start = None
+                    if char == "[":
+                        self.item_key = 0
+                        self.value_start = pos + 1
+                        pos = self._decode_item(buffer, members)
+                        continue
+                    else:
+                        self.expect_key = True
+            else:
+                self.stack.pop()
+                if depth == 1 and self.value_start is not None:
+                    members.append((self.key, None, self._value(pos)))
+                elif depth == 2 and self.value_start is not None:
+                    members.append((self.key, self.item_key, self._value(pos)))
+                if depth == 2:
+                    self.expect_key = False
+            pos += 1
+
+        # drop text no longer needed, keeping the value or string in progress
+        keep = min(
+            x
+            for x in (
+                pos,
+                self.value_start,
+                self.string_start if self.in_string else None,
+            )
+            if x is not None
+        )
+        self.buffer = buffer[keep:]
+        self.pos = pos - keep
+        if self.value_start is not None:
+            self.value_start -= keep
+        if self.string_start is not None:
+            self.string_start -= keep
+        return [x for x in members if x[2] is not _EMPTY]
+
+
+def iter_response_members(chunks: Iterable[bytes]) -> Iterator[Member]:
+    """
+    Members of a JSON object read from chunks of UTF-8 bytes, as produced
+    by ResponseScanner
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    scanner = ResponseScanner()
+    for chunk in chunks:
+        yield from scanner.feed(decoder.decode(chunk))
+    yield from scanner.feed(decoder.decode(b"", final=True))
+
+
+def iter_dict_members(response: dict) -> Iterator[Member]:
+    """
+    Members of an already parsed JSON object, as produced by ResponseScanner
+    """
+    for key, value in response.items():
+        if isinstance(value, dict):
+            yield from ((key, k, v) for k, v in value.items())
+        elif isinstance(value, list):
+            yield from ((key, i, v) for i, v in enumerate(value))
+        else:
+            yield key, None, value
+
+
+def _new_issue() -> Dict[str, Any]:
+    return {"severity": None, "title": None, "pkgs": []}
+
+
+def response_ok(members: Iterable[Member]) -> bool:
+    """
+    ok status of a test response, reading its members until ok is found
+    wherever it is in the response
+    """
+    for key, _, value in members:
+        if key == "ok":
+            return str(value) != "False"
+    return False
+
+
+def summarize_test_response(members: Iterable[Member]) -> Dict[str, Any]:
+    """
+    Compact summary of a test response: its ok status and, for each issue,
+    its severity, title and the vulnerable packages
+    """
+    summary = {"ok": True, "issues": {}}
+    for key, item_key, value in members:
+        if key == "ok":
+            summary["ok"] = str(value) != "False"
+        elif key == "issuesData" and isinstance(value, dict):
+            issue = summary["issues"].setdefault(item_key, _new_issue())
+            issue["severity"] = value.get("severity")
+            issue["title"] = value.get("title")
+        elif key == "issues" and isinstance(value, dict):
+            issue = summary["issues"].setdefault(value["issueId"], _new_issue())
+            pkg = f"{value.get('pkgName')}@{value.get('pkgVersion')}"
+            if pkg not in issue["pkgs"]:
+                issue["pkgs"].append(pkg)
+    return summary
+
+
+def merge_test_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge the summaries of several shards, with the packages of each issue
+    listed once
+    """
+    merged = {"ok": all(x["ok"] for x in summaries), "issues": {}}
+    for summary in summaries:
+        for issue_id, issue in summary["issues"].items():
+            merged_issue = merged["issues"].setdefault(issue_id, {**issue, "pkgs": []})
+            merged_issue["pkgs"].extend(
+                x for x in issue["pkgs"] if x not in merged_issue["pkgs"]
+            )
+    merged["issueCount"] = len(merged["issues"])
+    return merged
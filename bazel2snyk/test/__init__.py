@@ -13,8 +13,15 @@ PIP_BAZEL_ALT_XML_FILE = f"{PIP_FIXTURES_PATH}/pip_alt_repo_name.xml"
 MAVEN_FIXTURES_PATH = f"{FIXTURES_PATH}/maven"
 MAVEN_BAZEL_XML_FILE = f"{MAVEN_FIXTURES_PATH}/maven.xml"
 MAVEN_BAZEL_ALT_XML_FILE = f"{MAVEN_FIXTURES_PATH}/maven_alt_repo_name.xml"
+MAVEN_BAZEL_FIRST_PARTY_XML_FILE = f"{MAVEN_FIXTURES_PATH}/maven_first_party.xml"
+MAVEN_INSTALL_JSON_FILE = f"{MAVEN_FIXTURES_PATH}/maven_install.json"
 MAVEN_BAZEL_MULTIPLE_XML_FILE = f"{MAVEN_FIXTURES_PATH}/maven_multiple_targets.xml"
 
+POLYGLOT_FIXTURES_PATH = f"{FIXTURES_PATH}/polyglot"
+POLYGLOT_BAZEL_XML_FILE = f"{POLYGLOT_FIXTURES_PATH}/polyglot.xml"
+
+FAKE_BAZEL_BINARY = f"{FIXTURES_PATH}/bazel/fake_bazel"
+
 MAVEN_DEPGRAPH = f"{MAVEN_FIXTURES_PATH}/maven_depgraph.json"
 MAVEN_DEPGRAPH_PRUNED = f"{MAVEN_FIXTURES_PATH}/maven_depgraph_pruned.json"
 MAVEN_DEPGRAPH_PRUNED_ALL = f"{MAVEN_FIXTURES_PATH}/maven_depgraph_pruned_all.json"
@@ -0,0 +1,390 @@
+"""
+Differential equivalence harness between the frozen reference engine in
+bazel2snyk.test.reference and the engine behind Converter.
+
+Both engines convert the same bazel query output, fixture or randomly
+generated, and their depGraphs are compared after canonicalization, which
+only discards the order of pkgs, nodes and deps. The time each engine
+takes for a case is reported alongside, see benchmarks/equivalence.py.
+
+compare() reports every difference. Where the engine diverges from the
+reference on purpose, test_equivalence.py asserts exactly that divergence.
+"""
+
+import random
+import time
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from xml.sax.saxutils import quoteattr
+from bazel2snyk.converter import Converter
+from bazel2snyk.test import MAVEN_BAZEL_ALT_XML_FILE
+from bazel2snyk.test import MAVEN_BAZEL_XML_FILE
+from bazel2snyk.test import PIP_BAZEL_ALT_XML_FILE
+from bazel2snyk.test import PIP_BAZEL_XML_FILE
+from bazel2snyk.test.reference import reference_convert
+
+# convert() options of each pruning variant compared
+PRUNE_MODES: Dict[str, dict] = {
+    "none": {},
+    "prune": {"prune": True},
+    "prune_all": {"prune_all": True},
+}
+
+# alternative repo names the random query outputs use for some packages
+RANDOM_ALT_REPO_NAMES = {"maven": "@maven_alt", "pip": "@snyk_py_deps"}
+
+# labels of packages without a rule in the random query outputs
+MISSING_PACKAGE_LABELS = {
+    "maven": "@maven//:com_example_missing_{}",
+    "pip": "@pypi_missing_{}//:pkg",
+}
+
+# labels of packages of another package source in the random query
+# outputs, which the reference converts to pkgs with an empty name
+OTHER_SOURCE_LABELS = {
+    "maven": "@pypi_other{}//:pkg",
+    "pip": "@maven//:com_example_other_{}",
+}
+
+ROOT_TARGET = "//:app"
+
+
+class QueryCase(NamedTuple):
+    name: str
+    rules_xml: str
+    bazel_target: str
+    package_source: str
+    alt_repo_names: str = None
+
+
+class EquivalenceResult(NamedTuple):
+    case: str
+    differences: List[str]
+    reference_seconds: float
+    engine_seconds: float
+
+    @property
+    def equivalent(self) -> bool:
+        return not self.differences
+
+    @property
+    def speedup(self) -> float:
+        return self.reference_seconds / max(self.engine_seconds, 1e-9)
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def fixture_cases() -> List[QueryCase]:
+    """
+    The query output fixtures, with and without their alt_repo_names
+    """
+    maven, maven_alt = _read(MAVEN_BAZEL_XML_FILE), _read(MAVEN_BAZEL_ALT_XML_FILE)
+    pip, pip_alt = _read(PIP_BAZEL_XML_FILE), _read(PIP_BAZEL_ALT_XML_FILE)
+    return [
+        QueryCase("maven", maven, "//:java-maven-lib", "maven"),
+        QueryCase("maven-alt", maven_alt, "//:java-maven-lib", "maven", "@maven_alt"),
+        QueryCase("maven-alt-unnamed", maven_alt, "//:java-maven-lib", "maven"),
+        QueryCase("pip", pip, "//snyk/scripts/cli:main", "pip"),
+        QueryCase(
+            "pip-alt", pip_alt, "//snyk/scripts/cli:main", "pip", "@snyk_py_deps"
+        ),
+        QueryCase("pip-alt-unnamed", pip_alt, "//snyk/scripts/cli:main", "pip"),
+    ]
+
+
+def _rule(rule_class: str, location: str, name: str, lists: Dict[str, list]) -> str:
+    lines = [
+        f"    <rule class={quoteattr(rule_class)} location={quoteattr(location)} "
+        f"name={quoteattr(name)}>"
+    ]
+    for list_name, (element, values) in lists.items():
+        lines.append(f"        <list name={quoteattr(list_name)}>")
+        lines.extend(
+            f"            <{element} value={quoteattr(value)}/>" for value in values
+        )
+        lines.append("        </list>")
+    lines.append("    </rule>")
+    return "\n".join(lines)
+
+
+def _package_rule(rng: random.Random, package_source: str, i: int, deps: List[str]):
+    """
+    Name and rule of the i-th package of a random query output, in one of
+    the repo layouts of package_source
+    """
+    version = f"1.{i}.{rng.randint(0, 9)}"
+    if package_source == "maven":
+        repo = rng.choice(
+            ["@maven", "@maven", "@maven", RANDOM_ALT_REPO_NAMES["maven"]]
+        )
+        name = f"{repo}//:com_example_artifact_{i}"
+        tags = [f"maven_coordinates=com.example:artifact-{i}:{version}"]
+        lists = {"tags": ("string", tags if rng.random() > 0.1 else [])}
+        rule_class = "jvm_import"
+    else:
+        layout = rng.choice(["pypi_spoke", "py_deps", "alt_spoke"])
+        if layout == "py_deps":
+            name = f"@py_deps//pypi__pkg{i}:pkg"
+            dist_info = f"@py_deps//pypi__pkg{i}:pkg{i}-{version}.dist-info"
+        else:
+            repo = "@pypi" if layout == "pypi_spoke" else RANDOM_ALT_REPO_NAMES["pip"]
+            name = f"{repo}_pkg{i}//:pkg"
+            dist_info = f"{repo}_pkg{i}//:site-packages/pkg{i}-{version}.dist-info"
+        data = [f"{dist_info}/METADATA", f"{dist_info}/RECORD"]
+        lists = {"data": ("label", data if rng.random() > 0.1 else [])}
+        rule_class = "py_library"
+    lists["deps"] = ("label", deps)
+    location = f"/external/{name.split('//')[0][1:]}/BUILD.bazel:{i + 1}:11"
+    return name, _rule(rule_class, location, name, lists)
+
+
+def random_query_xml(
+    seed: int,
+    package_source: str = "maven",
+    target_count: int = 30,
+    package_count: int = 25,
+    other_source_labels: bool = True,
+) -> str:
+    """
+    A random acyclic bazel query output of internal targets, external
+    targets and packages depending on each other, converted from
+    ROOT_TARGET. It covers runtime_deps, labels without a rule, rules not
+    defined in a BUILD file, maven packages without coordinates, pip
+    packages without dist-info, packages in the repos named in
+    RANDOM_ALT_REPO_NAMES and, with other_source_labels, packages of the
+    other package source, see OTHER_SOURCE_LABELS.
+    """
+    rng = random.Random(seed)
+    rules = []
+
+    others = []
+    if other_source_labels:
+        other_source = "pip" if package_source == "maven" else "maven"
+        for i in range(max(package_count // 10, 1)):
+            name = OTHER_SOURCE_LABELS[package_source].format(i)
+            location = f"/external/{name.split('//')[0][1:]}/BUILD.bazel:1:1"
+            if other_source == "maven":
+                tags = [f"maven_coordinates=com.example:other-{i}:1.0"]
+                rule_class, lists = "jvm_import", {"tags": ("string", tags)}
+            else:
+                data = [f"{name[:-4]}site-packages/other{i}-1.0.dist-info/RECORD"]
+                rule_class, lists = "py_library", {"data": ("label", data)}
+            rules.append(_rule(rule_class, location, name, lists))
+            others.append(name)
+
+    packages = []
+    for i in reversed(range(package_count)):
+        deps = rng.sample(packages, min(len(packages), rng.randint(0, 3)))
+        name, rule = _package_rule(rng, package_source, i, deps)
+        packages.append(name)
+        rules.append(rule)
+
+    externals = []
+    for i in range(max(target_count // 5, 1)):
+        name = f"@ext//lib{i}:lib"
+        deps = rng.sample(packages, min(len(packages), rng.randint(1, 3)))
+        location = f"/external/ext/lib{i}/BUILD:1:1"
+        rules.append(_rule("java_library", location, name, {"deps": ("label", deps)}))
+        externals.append(name)
+
+    targets = []
+    for i in reversed(range(target_count)):
+        name = f"//pkg{i}:lib"
+        deps = rng.sample(targets, min(len(targets), rng.randint(0, 3)))
+        deps += rng.sample(packages, rng.randint(0, 4))
+        if rng.random() < 0.3:
+            deps.append(rng.choice(externals))
+        if rng.random() < 0.2:
+            deps.append(f"//pkg{i}:Lib.java")
+        if rng.random() < 0.1:
+            deps.append(MISSING_PACKAGE_LABELS[package_source].format(i))
+        if others and rng.random() < 0.1:
+            deps.append(rng.choice(others))
+        rng.shuffle(deps)
+        lists = {"deps": ("label", deps)}
+        if rng.random() < 0.2:
+            lists = {"runtime_deps": ("label", deps)}
+        elif rng.random() < 0.1:
+            lists["runtime_deps"] = ("label", rng.sample(packages, 2))
+        location = f"/workspace/pkg{i}/{rng.choice(['BUILD', 'BUILD.bazel'])}:3:1"
+        if rng.random() < 0.05:
+            location = f"/workspace/pkg{i}/defs.bzl:3:1"
+        rules.append(_rule("java_library", location, name, lists))
+        targets.append(name)
+
+    deps = targets[-4:]
+    rules.append(
+        _rule(
+            "java_binary",
+            "/workspace/BUILD:1:1",
+            ROOT_TARGET,
+            {"deps": ("label", deps)},
+        )
+    )
+    rng.shuffle(rules)
+    return "\n".join(
+        [
+            '<?xml version="1.1" encoding="UTF-8" standalone="no"?>',
+            '<query version="2">',
+            *rules,
+            "</query>",
+        ]
+    )
+
+
+def random_cases(
+    seeds: Iterator[int], package_sources=("maven", "pip"), **kwargs
+) -> Iterator[QueryCase]:
+    """
+    A random query output per seed and package source, converted with and
+    without its alt_repo_names
+    """
+    for seed in seeds:
+        for package_source in package_sources:
+            rules_xml = random_query_xml(seed, package_source, **kwargs)
+            name = f"random-{package_source}-{seed}"
+            alt_repo_names = RANDOM_ALT_REPO_NAMES[package_source]
+            yield QueryCase(name, rules_xml, ROOT_TARGET, package_source)
+            yield QueryCase(
+                f"{name}-alt", rules_xml, ROOT_TARGET, package_source, alt_repo_names
+            )
+
+
+def engine_convert(
+    rules_xml: str,
+    bazel_target: str,
+    package_source: str = "maven",
+    alt_repo_names: str = None,
+    graph_store: str = "memory",
+    **kwargs,
+) -> dict:
+    """
+    depGraph of bazel_target as the Converter engine converts it
+    """
+    converter = Converter.from_xml(
+        rules_xml,
+        package_sources=[package_source],
+        alt_repo_names=alt_repo_names,
+        graph_store=graph_store,
+    )
+    return converter.convert(bazel_target, **kwargs)[package_source].serializable()
+
+
+def canonical_dep_graph(dep_graph: dict) -> dict:
+    """
+    dep_graph with its pkgs, nodes and deps sorted, which Snyk ignores the
+    order of
+    """
+    data = dep_graph["depGraph"]
+    graph = data["graph"]
+    return {
+        "depGraph": {
+            "schemaVersion": data["schemaVersion"],
+            "pkgManager": data["pkgManager"],
+            "pkgs": sorted(data["pkgs"], key=lambda x: x["id"]),
+            "graph": {
+                "rootNodeId": graph["rootNodeId"],
+                "nodes": sorted(
+                    (
+                        {
+                            "nodeId": x["nodeId"],
+                            "pkgId": x["pkgId"],
+                            "deps": sorted(x["deps"], key=lambda y: y["nodeId"]),
+                        }
+                        for x in graph["nodes"]
+                    ),
+                    key=lambda x: x["nodeId"],
+                ),
+            },
+        }
+    }
+
+
+def diff_dep_graphs(expected: dict, actual: dict) -> List[str]:
+    """
+    Differences of actual from expected, none if they are equivalent
+    """
+    expected = canonical_dep_graph(expected)["depGraph"]
+    actual = canonical_dep_graph(actual)["depGraph"]
+    differences = []
+    for key in ("schemaVersion", "pkgManager"):
+        if expected[key] != actual[key]:
+            differences.append(f"{key}: {expected[key]} != {actual[key]}")
+    if expected["graph"]["rootNodeId"] != actual["graph"]["rootNodeId"]:
+        differences.append(
+            f"rootNodeId: {expected['graph']['rootNodeId']} "
+            f"!= {actual['graph']['rootNodeId']}"
+        )
+
+    expected_pkgs = {x["id"]: x for x in expected["pkgs"]}
+    actual_pkgs = {x["id"]: x for x in actual["pkgs"]}
+    for pkg_id in sorted(expected_pkgs.keys() - actual_pkgs.keys()):
+        differences.append(f"missing pkg {pkg_id}")
+    for pkg_id in sorted(actual_pkgs.keys() - expected_pkgs.keys()):
+        differences.append(f"extra pkg {pkg_id}")
+    for pkg_id in sorted(expected_pkgs.keys() & actual_pkgs.keys()):
+        if expected_pkgs[pkg_id] != actual_pkgs[pkg_id]:
+            differences.append(
+                f"pkg {pkg_id}: {expected_pkgs[pkg_id]} != {actual_pkgs[pkg_id]}"
+            )
+
+    expected_nodes = {x["nodeId"]: x for x in expected["graph"]["nodes"]}
+    actual_nodes = {x["nodeId"]: x for x in actual["graph"]["nodes"]}
+    for node_id in sorted(expected_nodes.keys() - actual_nodes.keys()):
+        differences.append(f"missing node {node_id}")
+    for node_id in sorted(actual_nodes.keys() - expected_nodes.keys()):
+        differences.append(f"extra node {node_id}")
+    for node_id in sorted(expected_nodes.keys() & actual_nodes.keys()):
+        expected_node, actual_node = expected_nodes[node_id], actual_nodes[node_id]
+        if expected_node["pkgId"] != actual_node["pkgId"]:
+            differences.append(
+                f"node {node_id} pkgId: {expected_node['pkgId']} "
+                f"!= {actual_node['pkgId']}"
+            )
+        expected_deps = {x["nodeId"] for x in expected_node["deps"]}
+        actual_deps = {x["nodeId"] for x in actual_node["deps"]}
+        for dep in sorted(expected_deps - actual_deps):
+            differences.append(f"node {node_id} missing dep {dep}")
+        for dep in sorted(actual_deps - expected_deps):
+            differences.append(f"node {node_id} extra dep {dep}")
+        if len(actual_node["deps"]) != len(actual_deps):
+            differences.append(f"node {node_id} has duplicate deps")
+    if len(actual_nodes) != len(actual["graph"]["nodes"]):
+        differences.append("duplicate nodes")
+    return differences
+
+
+def compare(
+    case: QueryCase, prune_mode: str = "none", graph_store: str = "memory"
+) -> EquivalenceResult:
+    """
+    Convert case with both engines, each parsing the query output itself,
+    and compare their depGraphs
+    """
+    kwargs = PRUNE_MODES[prune_mode]
+    args = (
+        case.rules_xml,
+        case.bazel_target,
+        case.package_source,
+        case.alt_repo_names,
+    )
+
+    start = time.perf_counter()
+    expected = reference_convert(*args, **kwargs)
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = engine_convert(*args, graph_store=graph_store, **kwargs)
+    engine_seconds = time.perf_counter() - start
+
+    return EquivalenceResult(
+        f"{case.name}/{prune_mode}/{graph_store}",
+        diff_dep_graphs(expected, actual),
+        reference_seconds,
+        engine_seconds,
+    )
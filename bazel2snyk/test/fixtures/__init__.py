@@ -1,5 +1,7 @@
 from bazel2snyk.test import PIP_FIXTURES_PATH
+from bazel2snyk.test import FAKE_BAZEL_BINARY
 from bazel2snyk.test import MAVEN_FIXTURES_PATH
+from bazel2snyk.test import POLYGLOT_FIXTURES_PATH
 
 pip_fixtures = {
     "pip": f"{PIP_FIXTURES_PATH}/pip.xml",
@@ -9,6 +11,12 @@ pip_fixtures = {
 maven_fixtures = {
     "maven": f"{MAVEN_FIXTURES_PATH}/maven.xml",
     "maven_alt_repo_name": f"{MAVEN_FIXTURES_PATH}/maven_alt_repo_name.xml",
+    "maven_first_party": f"{MAVEN_FIXTURES_PATH}/maven_first_party.xml",
+    "maven_install": f"{MAVEN_FIXTURES_PATH}/maven_install.json",
+}
+
+polyglot_fixtures = {
+    "polyglot": f"{POLYGLOT_FIXTURES_PATH}/polyglot.xml",
 }
 
 pip_args = {}
@@ -53,6 +61,19 @@ pip_args["print_graph"] = [
     "print-graph",
 ]
 
+pip_args["print_graph_parse_workers"] = [
+    # "--debug",
+    "--package-source",
+    "pip",
+    "--bazel-deps-xml",
+    f"{pip_fixtures['pip']}",
+    "--parse-workers",
+    "2",
+    "--bazel-target",
+    "//snyk/scripts/cli:main",
+    "print-graph",
+]
+
 pip_args["test"] = [
     # "--debug",
     "--package-source=pip",
@@ -92,6 +113,58 @@ maven_args["print_graph"] = [
     "print-graph",
 ]
 
+maven_args["print_graph_maven_install"] = [
+    # "--debug",
+    "--package-source",
+    "maven",
+    "--bazel-deps-xml",
+    f"{maven_fixtures['maven_first_party']}",
+    "--maven-install",
+    f"{maven_fixtures['maven_install']}",
+    "--bazel-target",
+    "//:java-maven-lib",
+    "print-graph",
+]
+
+maven_args["print_graph_sqlite"] = [
+    # "--debug",
+    "--package-source",
+    "maven",
+    "--bazel-deps-xml",
+    f"{maven_fixtures['maven']}",
+    "--graph-store",
+    "sqlite",
+    "--bazel-target",
+    "//:java-maven-lib",
+    "print-graph",
+]
+
+maven_args["bazel_query"] = [
+    # "--debug",
+    "--package-source",
+    "maven",
+    "--bazel-query",
+    "deps(//:java-maven-lib)",
+    "--bazel-binary",
+    FAKE_BAZEL_BINARY,
+    "--bazel-target",
+    "//:java-maven-lib",
+    "print-graph",
+]
+
+maven_args["bad_bazel_query"] = [
+    # "--debug",
+    "--package-source",
+    "maven",
+    "--bazel-query",
+    "deps(//does/not:exist)",
+    "--bazel-binary",
+    FAKE_BAZEL_BINARY,
+    "--bazel-target",
+    "//does/not:exist",
+    "print-graph",
+]
+
 maven_args["test"] = [
     # "--debug",
     "--package-source=maven",
@@ -116,3 +189,78 @@ maven_args["monitor"] = [
     "--snyk-org-id",
     "fa37c43d-b33f-489a-8708-9b84b6e6211b",
 ]
+
+polyglot_args = {}
+
+polyglot_args["print_graph"] = [
+    # "--debug",
+    "--package-source",
+    "maven,pip",
+    "--bazel-deps-xml",
+    f"{polyglot_fixtures['polyglot']}",
+    "--bazel-target",
+    "//:polyglot",
+    "print-graph",
+]
+
+polyglot_args["index"] = [
+    # "--debug",
+    "--package-source",
+    "maven,pip",
+    "--bazel-deps-xml",
+    f"{polyglot_fixtures['polyglot']}",
+    "index",
+]
+
+polyglot_args["batch"] = [
+    # "--debug",
+    "--package-source",
+    "maven,pip",
+    "--bazel-deps-xml",
+    f"{polyglot_fixtures['polyglot']}",
+    "batch",
+    "--targets",
+    "//:java-maven-lib,//snyk/scripts/cli:main",
+    "--shard-count",
+    "2",
+]
+
+pip_args["print_graph_scoped"] = [
+    # "--debug",
+    "--package-source",
+    "pip",
+    "--bazel-deps-xml",
+    f"{pip_fixtures['pip']}",
+    "--bazel-target",
+    "//snyk/scripts/cli:main",
+    "--exclude-labels",
+    "@pypi_pysnyk//*",
+    "print-graph",
+]
+
+polyglot_args["print_graph_collapsed"] = [
+    # "--debug",
+    "--package-source",
+    "maven,pip",
+    "--bazel-deps-xml",
+    f"{polyglot_fixtures['polyglot']}",
+    "--bazel-target",
+    "//:polyglot",
+    "--collapse",
+    "print-graph",
+]
+
+polyglot_args["upload"] = [
+    # "--debug",
+    "--package-source",
+    "maven,pip",
+    "--bazel-deps-xml",
+    f"{polyglot_fixtures['polyglot']}",
+    "upload",
+    "--targets",
+    "//:java-maven-lib,//snyk/scripts/cli:main",
+    "--snyk-token",
+    "stub-token",
+    "--snyk-org-id",
+    "stub-org",
+]
@@ -0,0 +1,151 @@
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+
+class StubSnykApi(object):
+    """
+    Local stand-in for the Snyk depGraph test and monitor endpoints.
+    Records every request, and reports issues for depGraphs containing
+    any of vulnerable_pkgs. Test requests fail with test_status if set,
+    or are answered with test_payload, e.g. text that is not JSON. With
+    ok_last, ok is the last member of test responses rather than the first.
+    With quota, a (rate, burst) token bucket, requests beyond it are
+    answered 429 with a Retry-After and not recorded.
+    """
+
+    def __init__(
+        self,
+        vulnerable_pkgs=("click@8.1.3",),
+        test_status=None,
+        quota=None,
+        test_payload=None,
+        ok_last=False,
+    ):
+        self.vulnerable_pkgs = set(vulnerable_pkgs)
+        self.test_status = test_status
+        self.test_payload = test_payload
+        self.ok_last = ok_last
+        self.quota = quota
+        self.tokens = quota[1] if quota else None
+        self.updated = time.monotonic()
+        self.rate_limited = 0
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def paths(self):
+        # SnykClient joins its base URL and paths with an extra /
+        return [x["path"].split("?")[0].replace("//", "/") for x in self.requests]
+
+    def test_response(self, body: dict) -> dict:
+        pkgs = [x["id"] for x in body["depGraph"]["pkgs"]]
+        issues = [
+            {
+                "pkgName": pkg.split("@")[0],
+                "pkgVersion": pkg.split("@")[1],
+                "issueId": f"SNYK-STUB-{pkg}",
+            }
+            for pkg in pkgs
+            if pkg in self.vulnerable_pkgs
+        ]
+        response = {
+            "ok": not issues,
+            "packageManager": body["depGraph"]["pkgManager"]["name"],
+            "issuesData": {
+                x["issueId"]: {"id": x["issueId"], "severity": "high"} for x in issues
+            },
+            "issues": issues,
+        }
+        if self.ok_last:
+            response["ok"] = response.pop("ok")
+        return response
+
+    def monitor_response(self, body: dict) -> dict:
+        return {
+            "ok": True,
+            "id": "stub-project-id",
+            "uri": "https://app.snyk.io/org/stub/project/stub-project-id",
+        }
+
+    def retry_after(self):
+        """
+        Seconds to wait if the quota is used up, taking a token otherwise
+        """
+        if not self.quota:
+            return None
+        rate, burst = self.quota
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            self.rate_limited += 1
+            return math.ceil((1 - self.tokens) / rate)
+
+    def respond(self, path: str, body: dict):
+        """
+        Return the status and JSON response for a request
+        """
+        if path.startswith("/v1/test/dep-graph") and self.test_status:
+            return self.test_status, {"code": self.test_status, "message": "stub error"}
+        if path.startswith("/v1/test/dep-graph"):
+            return 200, self.test_response(body)
+        if path.startswith("/v1/monitor/dep-graph"):
+            return 200, self.monitor_response(body)
+        return 404, {"message": "not found"}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                retry_after = stub.retry_after()
+                if retry_after is not None:
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with stub.lock:
+                    stub.requests.append(
+                        {
+                            "path": self.path,
+                            "headers": dict(self.headers),
+                            "body": body,
+                        }
+                    )
+                status, response = stub.respond(self.path.replace("//", "/"), body)
+                payload = json.dumps(response).encode()
+                if stub.test_payload is not None and "/test/" in self.path:
+                    payload = stub.test_payload
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,661 @@
+"""
+Frozen reference engine: BazelXmlParser, Bazel2Snyk and DepGraph as they
+were before any optimization, copied verbatim apart from their names so
+that timings compare against their actual cost, debug logging included.
+
+Do not change this module to follow the engine. The equivalence harness
+compares the engine against it, see bazel2snyk.test.equivalence.
+"""
+
+import math
+import re
+from enum import Enum
+from typing import List
+from xml.etree import ElementTree
+from pydantic import BaseModel
+from bazel2snyk import logger
+
+BAZEL_TARGET_VERSION_STRING = "bazel"
+
+
+class BazelNodeType(Enum):
+    INTERNAL_TARGET = 1
+    EXTERNAL_TARGET = 2
+    DEPENDENCY = 3
+    OTHER = 4
+
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and other.value == self.value
+
+
+class ReferenceXmlParser(object):
+    def __init__(
+        self,
+        rules_xml: str,
+        pkg_manager_name: str = "maven",
+        alt_repo_names: str = None,
+    ):
+        self.pkg_manager_name = pkg_manager_name
+        self.alt_repo_names = alt_repo_names
+        self.package_sources = {"maven": ["@maven"], "pip": ["@py_deps", "@pypi"]}
+        if self.alt_repo_names:
+            logger.debug(f"{alt_repo_names=}")
+            self.package_sources[pkg_manager_name].extend(
+                alt_repo_names.replace(" ", "").split(",")
+            )
+
+        logger.debug(f"{self.package_sources=}")
+
+        self.rules_xml = rules_xml
+        self.rules = ElementTree.fromstring(rules_xml)
+        self.dep_cache = []
+
+    def get_coordinates_from_bazel_dep(self, bazel_dep, package_source):
+        dep_coordinates = bazel_dep
+        logger.debug(f"{dep_coordinates=}")
+        logger.debug(f"{self.package_sources[package_source]=}")
+        bazel_rules = self.rules
+
+        starts_with_strings = tuple(
+            [x + "//" for x in self.package_sources[package_source]]
+        )
+
+        logger.debug(f"{starts_with_strings=}")
+
+        package_source_match_re_string = ""
+        for index, x in enumerate(self.package_sources[package_source]):
+            if index == 0:
+                package_source_match_re_string = "(" + x + ")"
+            else:
+                package_source_match_re_string += "|(" + x + ")"
+
+            logger.debug(f"{package_source_match_re_string=}")
+
+        re_match_string = rf"^({package_source_match_re_string})_\w+//"
+        logger.debug(f"{re_match_string=}")
+
+        for rule in bazel_rules.findall("rule"):
+            # logger.debug(f"processing {rule.attrib['name']=}")
+            if (
+                re.match(
+                    r".*/BUILD(\.bzl|\.bazel)?\:\d+\:\d+$", rule.attrib["location"]
+                )
+                and rule.attrib["name"] == bazel_dep
+                and (
+                    rule.attrib["name"].startswith(starts_with_strings)
+                    or re.match(rf"{re_match_string}", rule.attrib["name"])
+                )
+            ):
+                # logger.debug(f"found the rule with name: {rule.attrib['name']}")
+                # dynamically call the correct conversion function by name
+                func = getattr(self, f"_get_coordinates_{package_source}")
+                dep_coordinates = func(bazel_dep, rule)
+                dep_coordinates = self.get_snyk_dep_from_coordinates(
+                    dep_coordinates, package_source
+                )
+                logger.debug(f"{dep_coordinates=}")
+        return dep_coordinates
+
+    def _get_coordinates_pip(self, bazel_dep, rule):
+        # if we dont find a match, return itself
+        dep_coordinates = bazel_dep
+
+        bazel_dep_prefix = bazel_dep.split(":")[0]
+        logger.debug(f"{bazel_dep_prefix=}")
+
+        children = rule.findall("./list[@name='data']/label")
+        # child of data looks like this
+        # <label value="@py_deps//pypi__requests:requests-2.23.0.dist-info/LICENSE"/>
+        for child in children:
+            logger.debug(f"{ElementTree.tostring(child)=}")
+            if child.attrib["value"].startswith(bazel_dep_prefix):
+                child_value = str(child.attrib["value"])
+                dep_coordinates = child_value
+                logger.debug(f"{dep_coordinates=}")
+                return dep_coordinates
+
+        return dep_coordinates
+
+    def _get_coordinates_maven(self, bazel_dep, rule: ElementTree):
+        # if we dont find a match, return itself
+        dep_coordinates = bazel_dep
+
+        children = rule.findall("./list[@name='tags']/string")
+        # child of data looks like this
+        # <string value="maven_coordinates=
+        #     org.eclipse.jetty.websocket:websocket-servlet:9.4.40.v20210413"/>
+        for child in children:
+            if child.attrib["value"].startswith("maven_coordinates="):
+                logger.debug(f"processing {child.attrib['value']=}")
+                child_value = str(child.attrib["value"]).split("=").pop()
+                dep_coordinates = child_value
+                return dep_coordinates
+
+        return dep_coordinates
+
+    def get_snyk_dep_from_coordinates(self, dep_coordinates: str, package_source):
+        logger.debug(f"{package_source=}")
+        if package_source in self.package_sources:
+            func = getattr(self, f"{package_source}_bazel_dep_to_snyk_dep")
+            return func(dep_coordinates)
+
+    def maven_bazel_dep_to_snyk_dep(self, dep_coordinates: str):
+        k = dep_coordinates.rfind(":")
+        snyk_dep = dep_coordinates[:k] + "@" + dep_coordinates[k + 1 :]
+        return snyk_dep
+
+    def pip_bazel_dep_to_snyk_dep(self, dep_coordinates: str):
+        snyk_dep = dep_coordinates
+        logger.debug(f"PYTHON TEST: {snyk_dep=}")
+        match = re.search(
+            r"\@.*_.*\:site-packages\/(.*).dist\-info.*\/.*", dep_coordinates
+        )
+        if not match:
+            match = re.search(r"\@.*\/\/pypi__.*\:(.*).dist\-info.*\/", dep_coordinates)
+        if match:
+            snyk_dep = match.group(1)
+            k = snyk_dep.rfind("-")
+            snyk_dep = snyk_dep[:k] + "@" + snyk_dep[k + 1 :]
+            logger.debug(f"{snyk_dep=}")
+
+        return snyk_dep
+
+    def get_node_type(self, node_id: str) -> BazelNodeType:
+        if node_id.startswith(tuple(sum(self.package_sources.values(), []))):
+            node_type = BazelNodeType.DEPENDENCY
+        elif re.match(r"^\/\/.+\:.+$", node_id):
+            node_type = BazelNodeType.INTERNAL_TARGET
+        elif re.match(r"^(@.+){0,1}\/\/.*\:.*$", node_id):
+            node_type = BazelNodeType.EXTERNAL_TARGET
+        else:
+            node_type = BazelNodeType.OTHER
+        return node_type
+
+    def get_children_from_rule(self, parent_node_id: str) -> List[str]:
+        logger.debug(f"{parent_node_id}")
+
+        filtered_list = [
+            x for x in self.dep_cache if x["parent_node_id"] == parent_node_id
+        ]
+        if filtered_list:
+            # print("cache hit")
+            return filtered_list[0]["children"]
+
+        bazel_rules = self.rules
+        child_deps = []
+
+        node_type = BazelNodeType.OTHER
+
+        for rule in bazel_rules.findall("rule"):
+            match = re.match(
+                r".*/BUILD(\.bzl|\.bazel)?\:\d+\:\d+$", rule.attrib["location"]
+            )
+            if not match:
+                continue
+
+            if rule.attrib["name"] == parent_node_id:
+                # print(f"found {parent_node_id=}")
+                node_type = self.get_node_type(rule.attrib["name"])
+
+                logger.debug(f"{node_type}")
+
+                if node_type == BazelNodeType.OTHER:
+                    continue
+
+                for dep_list in rule.findall(".//list[@name='deps']") or rule.findall(
+                    ".//list[@name='runtime_deps']"
+                ):
+                    for dep in dep_list:
+                        child_deps.append(dep.attrib["value"])
+
+        self.dep_cache.append(
+            {"parent_node_id": parent_node_id, "children": child_deps}
+        )
+
+        return child_deps
+
+
+class Info(BaseModel):
+    name: str
+    version: str
+
+
+class Pkg(BaseModel):
+    id: str
+    info: Info
+
+
+class Dep(BaseModel):
+    nodeId: str
+
+
+class Node(BaseModel):
+    nodeId: str
+    pkgId: str
+    deps: List[Dep]
+
+
+class Graph(BaseModel):
+    rootNodeId: str
+    nodes: List[Node]
+
+
+class PkgManager(BaseModel):
+    name: str
+
+
+class DepGraphData(BaseModel):
+    schemaVersion: str = "1.2.0"
+    pkgManager: PkgManager
+    pkgs: List[Pkg]
+    graph: Graph
+
+
+class DepGraphRoot(BaseModel):
+    depGraph: DepGraphData
+
+
+class ReferenceDepGraph(object):
+    def __init__(
+        self,
+        pkg_manager_name: str,
+    ):
+        self.pkg_manager_name = pkg_manager_name
+        self.meta_pkg_id = "meta-common-packages@meta"
+        self.dep_graph = DepGraphRoot(
+            depGraph=DepGraphData(
+                pkgManager=PkgManager(name=self.pkg_manager_name),
+                pkgs=[Pkg(id="app@1.0.0", info=Info(name="app", version="1.0.0"))],
+                graph=Graph(
+                    rootNodeId="root-node",
+                    nodes=[Node(nodeId="root-node", pkgId="app@1.0.0", deps=[])],
+                ),
+            )
+        )
+        self._dep_path_counts = {}
+        self._target_path_counts = {}
+
+    def graph(self):
+        return self.dep_graph
+
+    def set_dep_graph(self, dep_graph):
+        # self.dep_graph = dep_graph
+        self.dep_graph: DepGraphRoot = dep_graph
+
+    def get_root_node(self):
+        graph = self.dep_graph.depGraph.graph
+        return graph.rootNodeId
+
+    def _increment_dep_path_count(self, dep: str):
+        """
+        Increment dep path counts which is later
+        used if the dep graph needs to be pruned
+        """
+        self._dep_path_counts[dep] = self._dep_path_counts.get(dep, 0) + 1
+
+    def _increment_target_path_count(self, dep: str):
+        """
+        Increment target path counts which is later
+        used if the dep graph needs to be pruned
+        """
+        self._target_path_counts[dep] = self._target_path_counts.get(dep, 0) + 1
+
+    def has_pkg(self, pkg_id: str) -> bool:
+        # pkg_id should be in the form of name@version
+        # find the right most @ in case there are others
+        k = pkg_id.rfind("@")
+
+        # set name and version
+        name = pkg_id[:k]
+        version = pkg_id[k + 1 :]
+
+        pkg_entry = Pkg(id=f"{name}@{version}", info=Info(name=name, version=version))
+
+        if pkg_entry in self.dep_graph.depGraph.pkgs:
+            return True
+
+        return False
+
+    def add_pkg(self, pkg_id: str) -> bool:
+        k = pkg_id.rfind("@")
+
+        # set name and version
+        name = pkg_id[:k]
+        version = pkg_id[k + 1 :]
+
+        pkg_entry = Pkg(id=f"{name}@{version}", info=Info(name=name, version=version))
+
+        if not self.has_pkg(pkg_id):
+            self.dep_graph.depGraph.pkgs.append(pkg_entry)
+            return True
+
+        return False
+
+    def add_dep(self, child_node_id: str, parent_node_id: str = None):
+        logger.debug(f"{parent_node_id=}")
+        parent_node = None
+
+        if (
+            child_node_id
+            and parent_node_id != self.meta_pkg_id
+            and child_node_id != self.meta_pkg_id
+        ):
+            if not child_node_id.startswith("//"):
+                self._increment_dep_path_count(child_node_id)
+            else:
+                self._increment_target_path_count(child_node_id)
+
+        graph_subtree = self.dep_graph.depGraph.graph.nodes
+
+        # first check if element already exists at the specified parent_node_id
+        if not parent_node_id:
+            logger.debug(
+                f"root node, checking for {self.get_root_node()=} "
+                f"in {self.dep_graph.depGraph.graph.nodes}"
+            )
+            parent_node = [
+                x
+                for x in self.dep_graph.depGraph.graph.nodes
+                if self.get_root_node() == x.nodeId
+            ]
+        else:
+            logger.debug(
+                "not root-node, looking for subtree match for "
+                f"{parent_node_id=} in graph_subtree"
+            )
+            for subtree_node in graph_subtree:
+                logger.debug(f"{subtree_node=}")
+                logger.debug(
+                    f"checking if parent_node: {parent_node_id} "
+                    f"== {subtree_node.nodeId}"
+                )
+                if parent_node_id == subtree_node.nodeId:
+                    parent_node = [subtree_node]
+                    break
+
+        logger.debug(f"{parent_node=}")
+        logger.debug(f"{child_node_id=}")
+
+        if parent_node:
+            if child_node_id:
+                dep_entry = Dep(nodeId=child_node_id)
+
+                # append the dep, only if it doesn't already exist as a child
+                if dep_entry not in parent_node[0].deps:
+                    parent_node[0].deps.append(dep_entry)
+
+        else:  # parent node not found
+            logger.debug(f"parent_node not found for {parent_node_id=}")
+            if child_node_id:
+                graph_entry = Node(
+                    nodeId=parent_node_id,
+                    pkgId=parent_node_id,
+                    deps=[Dep(nodeId=child_node_id)],
+                )
+                logger.debug(f"setting graph entry with child to {graph_entry}")
+            else:
+                graph_entry = Node(
+                    nodeId=parent_node_id,
+                    pkgId=parent_node_id,
+                    deps=[],
+                )
+                logger.debug(f"setting graph entry with no children to {graph_entry}")
+
+            self.dep_graph.depGraph.graph.nodes.append(graph_entry)
+
+    def remove_dep(self, child_node_id: str, parent_node_id: str = None):
+        logger.debug(f"removing dep {child_node_id}")
+        logger.debug(f"parent_node_id={parent_node_id}")
+
+        # if parent_node_id:
+        #    raise Exception("Not implemented")
+
+        graph_subtree = self.dep_graph.depGraph.graph.nodes
+
+        # logger.debug(f"{graph_subtree=}")
+
+        for subtree_node in graph_subtree:
+            logger.debug(f"{subtree_node=}")
+            logger.debug(
+                f"checking if {subtree_node.nodeId} has child dep {child_node_id}"
+            )
+
+            child_node_entry = Dep(nodeId=child_node_id)
+
+            logger.debug(f"deps entry to remove: {child_node_entry}")
+
+            if child_node_entry in subtree_node.deps:
+                logger.debug(f"removing {child_node_entry} from subtree")
+                subtree_node.deps.remove(child_node_entry)
+
+    def set_root_node_package(self, root_node: str):
+        logger.debug(f"{root_node=}")
+
+        # root_pkg = self.dep_graph.depGraph.pkgs[0]
+        root_pkg = self.dep_graph.depGraph.pkgs[0]
+        root_pkg.id = root_node
+        root_node_split = root_node.split("@")
+        root_pkg.info.name = root_node_split[0]
+        root_pkg.info.version = root_node_split[1]
+
+        graph = self.dep_graph.depGraph.graph
+        graph.rootNodeId = root_node
+        graph.nodes[0].nodeId = root_node
+        graph.nodes[0].pkgId = root_node
+
+    def prune_dep(self, node_id: str):
+        # create meta-common-packages@meta pkg if does not already exist
+        if not self.has_pkg(self.meta_pkg_id):
+            self.add_pkg(self.meta_pkg_id)
+        # connect meta-common-packages@meta to the root node
+        self.add_dep(self.meta_pkg_id)
+        # remove instances where this dep is a child from the graph
+        self.remove_dep(node_id)
+        # add to meta-common-packages@meta
+        self.add_dep(node_id, self.meta_pkg_id)
+
+    def prune_graph(
+        self, instance_count_threshold: int, instance_percentage_threshold: int
+    ):
+        """
+        Prune graph according to threshold of duplicated transitive dependencies
+        """
+        self._dep_path_counts.update(self._target_path_counts)
+        combined_path_counts = self._dep_path_counts
+
+        total_item_count = 0
+
+        for dep, instances in combined_path_counts.items():
+            total_item_count += instances
+        logger.debug(f"{total_item_count=}")
+
+        for dep, instances in combined_path_counts.items():
+            if instances > 1:
+                instance_percentage = math.ceil((instances / total_item_count) * 100)
+                if (
+                    instances > instance_count_threshold
+                    or instance_percentage > instance_percentage_threshold
+                ):
+                    logger.info(
+                        f"pruning {dep} ({instances=}/{instance_count_threshold},"
+                        f"{instance_percentage=}/{instance_percentage_threshold})"
+                    )
+                    self.prune_dep(dep)
+
+    def prune_graph_all(self):
+        """
+        Prune graph whenever OSS dependencies are repeated more than 2x
+        or when bazel target dependencies are repeated more than 10x
+        """
+        for dep, instances in self._dep_path_counts.items():
+            if instances > 2:
+                logger.info(f"pruning {dep} ({instances=})")
+                self.prune_dep(dep)
+
+        for dep, instances in self._target_path_counts.items():
+            if instances > 10:
+                logger.info(f"pruning {dep} ({instances=})")
+                self.prune_dep(dep)
+
+    def rename_depgraph(self, new_name):
+        root_node_id = self.dep_graph.depGraph.graph.rootNodeId
+        root_node_index = self._find_node_index(
+            self.dep_graph.depGraph.graph, root_node_id
+        )
+        old_package_name, package_version = self.dep_graph.depGraph.graph.nodes[
+            root_node_index
+        ].pkgId.split("@")
+
+        # Rename the root note
+        self.dep_graph.depGraph.graph.nodes[root_node_index].nodeId = new_name
+        self.dep_graph.depGraph.graph.nodes[
+            root_node_index
+        ].pkgId = f"{new_name}@{package_version}"
+
+        # Rename the packages
+        target_package_index = self._find_pkg_index(
+            self.dep_graph.depGraph.pkgs, f"{old_package_name}@{package_version}"
+        )
+        self.dep_graph.depGraph.pkgs[
+            target_package_index
+        ].id = f"{new_name}@{package_version}"
+        self.dep_graph.depGraph.pkgs[target_package_index].info.name = new_name
+
+        # Finally, rename the rootNodeId
+        self.dep_graph.depGraph.graph.rootNodeId = new_name
+
+    def _find_node_index(self, graph: Graph, search_node_id):
+        # for node in graph.get("nodes", []):
+        for node in graph.nodes:
+            # if node.get("nodeId") == search_node_id:
+            if node.nodeId == search_node_id:
+                # return graph.get("nodes", []).index(node)
+                return graph.nodes.index(node)
+        return -1
+
+    def _find_pkg_index(self, pkgs: List[Pkg], search_id):
+        for pkg in pkgs:
+            if pkg.id == search_id:
+                return pkgs.index(pkg)
+        return -1
+
+
+class ReferenceBazel2Snyk(object):
+    def __init__(
+        self,
+        bazel_xml_parser: ReferenceXmlParser,
+        dep_graph: ReferenceDepGraph,
+    ):
+        self.bazel_xml_parser = bazel_xml_parser
+        self.dep_graph = dep_graph
+        self._visited = []
+        self._visited_temp = []
+        self._oss_deps_count = 0
+
+    def bazel_to_depgraph(self, parent_node_id: str, depth: int):
+        """
+        Recursive function that will walk the bazel dep tree.
+        """
+        logger.debug(f"{parent_node_id=},{depth=}")
+        logger.debug(f"{self._visited_temp=}")
+
+        children = self.bazel_xml_parser.get_children_from_rule(
+            parent_node_id=parent_node_id
+        )
+        logger.debug(f"{parent_node_id} child count: {len(children)}")
+
+        parent_dep_snyk = self.snyk_dep_from_bazel_dep(
+            parent_node_id, self.bazel_xml_parser.pkg_manager_name
+        )
+
+        if parent_dep_snyk != parent_node_id and not parent_dep_snyk.endswith(
+            f"{BAZEL_TARGET_VERSION_STRING}"
+        ):
+            self._oss_deps_count += 1
+            logger.debug(f"{self._oss_deps_count=}")
+
+        # special entry for the root node of the dep graph
+        if depth == 0:
+            self.dep_graph.set_root_node_package(parent_dep_snyk)
+
+        for child in children:
+            child_dep_for_snyk = self.snyk_dep_from_bazel_dep(
+                child, self.bazel_xml_parser.pkg_manager_name
+            )
+            output_padding = ""
+
+            # set output padding for --print-deps option
+            for i in range(0, depth):
+                output_padding += "- - "
+
+            if self.bazel_xml_parser.get_node_type(child) in [
+                BazelNodeType.INTERNAL_TARGET,
+                BazelNodeType.EXTERNAL_TARGET,
+                BazelNodeType.DEPENDENCY,
+            ]:
+                logger.info(f"{output_padding}{child_dep_for_snyk}")
+
+            logger.debug(f"adding pkg {child_dep_for_snyk=}")
+            self.dep_graph.add_pkg(child_dep_for_snyk)
+
+            logger.debug(f"adding dep {child_dep_for_snyk=} for {parent_dep_snyk=}")
+            self.dep_graph.add_dep(child_dep_for_snyk, parent_dep_snyk)
+
+            self._visited_temp.append(parent_node_id)
+
+            # if we've already processed this subtree, then just return
+            if child not in self._visited:
+                logger.debug(f"{child} not yet visited, traversing...")
+                self.bazel_to_depgraph(child, depth=depth + 1)
+        # else:
+        # future use for smarter pruning
+        # account for node in the subtree to count all paths
+
+        # we've reach a leaf node and just need to add an entry with empty deps array
+        if len(children) == 0:
+            self.dep_graph.add_dep(child_node_id=None, parent_node_id=parent_dep_snyk)
+            self._visited.extend(self._visited_temp)
+
+            self._visited_temp = []
+
+    def snyk_dep_from_bazel_dep(self, bazel_dep_id: str, package_source: str) -> str:
+        """
+        Produce dependency coordinates in format package@version for Snyk
+        from the bazel dependency identifier
+        """
+        logger.debug(f"{package_source=},{bazel_dep_id=}")
+
+        node_type: BazelNodeType = self.bazel_xml_parser.get_node_type(bazel_dep_id)
+        logger.debug(f"{node_type=}")
+
+        if node_type == BazelNodeType.DEPENDENCY:
+            snyk_dep = self.bazel_xml_parser.get_coordinates_from_bazel_dep(
+                bazel_dep_id, package_source
+            )
+            logger.debug(f"{snyk_dep=}")
+            return snyk_dep
+        else:
+            return f"{bazel_dep_id}@{BAZEL_TARGET_VERSION_STRING}"
+
+
+def reference_convert(
+    rules_xml: str,
+    bazel_target: str,
+    package_source: str = "maven",
+    alt_repo_names: str = None,
+    prune: bool = False,
+    prune_all: bool = False,
+) -> dict:
+    """
+    depGraph of bazel_target as the reference engine converts it
+    """
+    bazel2snyk = ReferenceBazel2Snyk(
+        ReferenceXmlParser(rules_xml, package_source, alt_repo_names),
+        ReferenceDepGraph(package_source),
+    )
+    bazel2snyk.bazel_to_depgraph(bazel_target, 0)
+    if prune_all:
+        bazel2snyk.dep_graph.prune_graph_all()
+    elif prune:
+        bazel2snyk.dep_graph.prune_graph(20, 5)
+    return bazel2snyk.dep_graph.graph().model_dump()
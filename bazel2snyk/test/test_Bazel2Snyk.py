@@ -9,6 +9,7 @@ from bazel2snyk.test import PIP_BAZEL_ALT_XML_FILE
 from bazel2snyk.test import MAVEN_PACKAGE_SOURCE
 from bazel2snyk.test import MAVEN_BAZEL_XML_FILE
 from bazel2snyk.test import MAVEN_BAZEL_ALT_XML_FILE
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
 
 PIP_BAZEL_DEP = "@pypi_click//:pkg"
 PIP_BAZEL_ALT_DEP = "@snyk_py_deps_click//:pkg"
@@ -65,6 +66,18 @@ def maven_bazel2snyk_alt_instance():
     )
 
 
+@pytest.fixture
+def polyglot_bazel2snyk_instance():
+    return Bazel2Snyk(
+        bazel_xml_parser=BazelXmlParser(
+            rules_xml=load_file(POLYGLOT_BAZEL_XML_FILE),
+            pkg_manager_name=MAVEN_PACKAGE_SOURCE,
+        ),
+        dep_graph=DepGraph(MAVEN_PACKAGE_SOURCE),
+        dep_graphs={PIP_PACKAGE_SOURCE: DepGraph(PIP_PACKAGE_SOURCE)},
+    )
+
+
 def test_pip_snyk_dep_from_bazel_dep(pip_bazel2snyk_instance):
     """
     Test for testing the dep graph
@@ -113,6 +126,23 @@ def test_maven_alt_snyk_dep_from_bazel_dep(maven_bazel2snyk_alt_instance):
     )
 
 
+def test_polyglot_bazel_to_depgraph(polyglot_bazel2snyk_instance):
+    """
+    Test that a single traversal produces one dep graph per package source
+    """
+    polyglot_bazel2snyk_instance.bazel_to_depgraph("//:polyglot", depth=0)
+    dep_graphs = polyglot_bazel2snyk_instance.dep_graphs
+
+    maven_pkgs = [x.id for x in dep_graphs[MAVEN_PACKAGE_SOURCE].graph().depGraph.pkgs]
+    pip_pkgs = [x.id for x in dep_graphs[PIP_PACKAGE_SOURCE].graph().depGraph.pkgs]
+
+    assert MAVEN_SNYK_DEP in maven_pkgs
+    assert PIP_SNYK_DEP not in maven_pkgs
+    assert PIP_SNYK_DEP in pip_pkgs
+    assert MAVEN_SNYK_DEP not in pip_pkgs
+    assert not [x for x in maven_pkgs + pip_pkgs if x.startswith("@")]
+
+
 # TODO: Tests for all functions
 # def test_bazel_to_depgraph():
 #     """
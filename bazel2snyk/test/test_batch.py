@@ -0,0 +1,99 @@
+import json
+import pytest
+from bazel2snyk.batch import assign_shards
+from bazel2snyk.batch import merge_manifests
+from bazel2snyk.batch import output_name
+from bazel2snyk.batch import run_shard
+from bazel2snyk.batch import target_costs
+from bazel2snyk.converter import Converter
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+
+
+def test_assign_shards():
+    """
+    Test that the costliest targets are spread over the shards
+    """
+    costs = {"//a:a": 10, "//b:b": 9, "//c:c": 2, "//d:d": 2, "//e:e": 1}
+
+    assert assign_shards(costs, 2) == [["//a:a", "//d:d"], ["//b:b", "//c:c", "//e:e"]]
+    assert assign_shards(costs, 4) == [
+        ["//a:a"],
+        ["//b:b"],
+        ["//c:c", "//e:e"],
+        ["//d:d"],
+    ]
+    assert assign_shards({}, 2) == [[], []]
+
+
+def test_run_shard_and_merge(tmp_path):
+    """
+    Test that each shard writes its targets' depGraphs and the manifests merge
+    """
+    converter = Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"]
+    )
+    targets = ["//:java-maven-lib", "//snyk/scripts/cli:main", "//missing:target"]
+    costs = target_costs(converter.rules_index, targets)
+    assert costs == {
+        "//:java-maven-lib": 25,
+        "//snyk/scripts/cli:main": 19,
+        "//missing:target": 1,
+    }
+
+    manifests = [
+        run_shard(converter, shard, costs, str(tmp_path), i, 2)
+        for i, shard in enumerate(assign_shards(costs, 2))
+    ]
+    assert [x["target"] for x in manifests[1]["targets"]] == [
+        "//snyk/scripts/cli:main",
+        "//missing:target",
+    ]
+    pip_output = manifests[1]["targets"][0]["outputs"]
+    assert pip_output == {"pip": str(tmp_path / "snyk_scripts_cli_main.pip.json")}
+    with open(pip_output["pip"]) as f:
+        assert json.load(f)["depGraph"]["pkgManager"]["name"] == "pip"
+
+    report = merge_manifests(manifests[::-1])
+    assert report["missing_shards"] == []
+    assert [x["shard_index"] for x in report["shards"]] == [0, 1]
+    assert report["failed"] == ["//missing:target"]
+    assert [x["target"] for x in report["targets"]] == sorted(targets)
+
+    assert merge_manifests(manifests[:1])["missing_shards"] == [1]
+    with pytest.raises(ValueError):
+        merge_manifests(manifests[:1] * 2)
+
+
+def test_run_shard_records_failures(tmp_path, monkeypatch):
+    """
+    Test that a target failing unexpectedly is recorded as an error and the
+    other targets of the shard are still converted
+    """
+    converter = Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"]
+    )
+    convert = converter.convert
+
+    def failing_convert(target, **kwargs):
+        if target == "//:java-maven-lib":
+            raise RuntimeError("store is full")
+        return convert(target, **kwargs)
+
+    monkeypatch.setattr(converter, "convert", failing_convert)
+    targets = ["//:java-maven-lib", "//snyk/scripts/cli:main"]
+    manifest = run_shard(
+        converter, targets, target_costs(converter.rules_index, targets), tmp_path, 0, 1
+    )
+
+    failed, converted = manifest["targets"]
+    assert failed["error"] == "RuntimeError: store is full"
+    assert failed["outputs"] == {}
+    assert "error" not in converted
+    assert converted["outputs"]["pip"] == str(
+        tmp_path / "snyk_scripts_cli_main.pip.json"
+    )
+
+
+def test_output_name():
+    assert output_name("//app/package:main") == "app_package_main"
+    assert output_name("@repo//:lib") == "repo_lib"
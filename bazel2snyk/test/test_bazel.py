@@ -1 +1,179 @@
-# TODO: Bazel module unit tests
+import pytest
+from xml.etree import ElementTree
+from bazel2snyk.bazel import BazelXmlParser
+from bazel2snyk.bazel import run_bazel_query
+from bazel2snyk.cli import load_file
+from bazel2snyk.rules import BazelRule
+from bazel2snyk.rules import RULES_INDEX_MAGIC
+from bazel2snyk.rules import RULES_INDEX_VERSION
+from bazel2snyk.rules import ScopeFilter
+from bazel2snyk.rules import apply_scope
+from bazel2snyk.rules import build_rules_index
+from bazel2snyk.rules import build_rules_index_from_stream
+from bazel2snyk.rules import build_rules_index_parallel
+from bazel2snyk.rules import load_rules_index
+from bazel2snyk.rules import subset_rules_index
+from bazel2snyk.rules import write_rules_index
+from bazel2snyk.test import FAKE_BAZEL_BINARY
+from bazel2snyk.test import MAVEN_BAZEL_XML_FILE
+from bazel2snyk.test import PIP_BAZEL_XML_FILE
+
+
+def test_build_rules_index_from_stream():
+    """
+    Test that indexing streamed query output matches indexing the parsed document
+    """
+    with open(MAVEN_BAZEL_XML_FILE, "rb") as f:
+        streamed_index = build_rules_index_from_stream(f)
+
+    assert streamed_index == build_rules_index(
+        ElementTree.fromstring(load_file(MAVEN_BAZEL_XML_FILE))
+    )
+    assert "@maven//:com_google_guava_guava" in streamed_index
+
+
+def test_run_bazel_query():
+    """
+    Test indexing the output of a bazel query subprocess
+    """
+    with open(MAVEN_BAZEL_XML_FILE, "rb") as f:
+        assert run_bazel_query(
+            "deps(//:java-maven-lib)", FAKE_BAZEL_BINARY
+        ) == build_rules_index_from_stream(f)
+
+
+def test_build_rules_index_parallel():
+    """
+    Test that indexing chunks in parallel matches indexing serially
+    """
+    with open(PIP_BAZEL_XML_FILE, "rb") as f:
+        streamed_index = build_rules_index_from_stream(f)
+
+    parallel_index = build_rules_index_parallel(
+        PIP_BAZEL_XML_FILE, workers=2, chunks_per_worker=8
+    )
+    assert parallel_index == streamed_index
+    assert list(parallel_index) == list(streamed_index)
+
+
+def test_build_rules_index_parallel_loads_index(tmp_path):
+    """
+    Test that a written rules index is loaded rather than parsed as XML
+    """
+    with open(PIP_BAZEL_XML_FILE, "rb") as f:
+        rules_index = build_rules_index_from_stream(f)
+
+    path = str(tmp_path / "all.idx")
+    write_rules_index(rules_index, path)
+    assert build_rules_index_parallel(path, workers=2) == rules_index
+
+
+def test_apply_scope():
+    """
+    Test that rules out of scope are left out along with the edges to them
+    """
+
+    def rule(name, rule_class="java_library", testonly=False, tags=(), **lists):
+        return BazelRule(
+            name=name,
+            rule_class=rule_class,
+            location="/workspace/BUILD:1:1",
+            lists={"tags": list(tags), **lists},
+            strings={"testonly": "true" if testonly else "false"},
+        )
+
+    rules_index = {
+        x.name: x
+        for x in (
+            rule(
+                "//app:main",
+                deps=["//app:lib", "//app:test_lib", "//tools:gen"],
+                runtime_deps=["@maven//:runtime"],
+            ),
+            rule("//app:lib", deps=["@maven//:guava", "@maven//:junit"]),
+            rule("//app:test_lib", testonly=True, deps=["@maven//:junit"]),
+            rule("//app:manual", tags=["manual"]),
+            rule("//app:bin", rule_class="sh_binary"),
+            rule("//tools:gen"),
+        )
+    }
+
+    scope = ScopeFilter(
+        exclude_testonly=True,
+        exclude_rule_classes=("sh_binary",),
+        exclude_tags=("man*",),
+        include_labels=("//app:*",),
+        exclude_labels=("@maven//:junit",),
+        dep_attrs=("deps", "runtime_deps"),
+    )
+    scoped_index = apply_scope(rules_index, scope)
+
+    assert list(scoped_index) == ["//app:main", "//app:lib"]
+    assert scoped_index["//app:main"].lists["deps"] == ["//app:lib", "@maven//:runtime"]
+    assert scoped_index["//app:lib"].lists["deps"] == ["@maven//:guava"]
+    assert apply_scope(scoped_index, scope) == scoped_index
+    assert apply_scope(rules_index, ScopeFilter()) == rules_index
+
+    with open(PIP_BAZEL_XML_FILE, "rb") as f:
+        streamed_index = build_rules_index_from_stream(
+            f, ScopeFilter(exclude_labels=("@pypi_pysnyk//*",))
+        )
+    assert "@pypi_pysnyk//:pkg" not in streamed_index
+    assert streamed_index["//snyk/scripts/cli:main"].lists["deps"] == [
+        "@pypi_typer//:pkg"
+    ]
+
+
+def test_subset_rules_index():
+    """
+    Test that subsetting keeps only the closure of the target
+    """
+    with open(MAVEN_BAZEL_XML_FILE, "rb") as f:
+        rules_index = build_rules_index_from_stream(f)
+    rules_index["//unrelated:target"] = rules_index["//:java-maven-lib"]._replace(
+        name="//unrelated:target"
+    )
+
+    subset = subset_rules_index(rules_index, ["//:java-maven-lib"])
+    assert "//unrelated:target" not in subset
+    assert "@maven//:com_google_guava_guava" in subset
+    assert subset == subset_rules_index(subset, ["//:java-maven-lib"])
+
+
+@pytest.mark.parametrize("file_name", ["subset.xml", "subset.idx"])
+def test_write_rules_index(tmp_path, file_name):
+    """
+    Test that written rules indexes load back unchanged
+    """
+    with open(PIP_BAZEL_XML_FILE, "rb") as f:
+        rules_index = subset_rules_index(
+            build_rules_index_from_stream(f), ["//snyk/scripts/cli:main"]
+        )
+
+    write_rules_index(rules_index, str(tmp_path / file_name))
+    assert load_rules_index(str(tmp_path / file_name)) == rules_index
+
+
+def test_load_rules_index_checks_header(tmp_path):
+    """
+    Test that indexes of another format version or with malformed rules
+    are rejected rather than misread
+    """
+    path = tmp_path / "subset.idx"
+    path.write_bytes(RULES_INDEX_MAGIC + b"v1\n" + b"\x80\x05}\x94.")
+    with pytest.raises(ValueError, match="version 1 rules index"):
+        load_rules_index(str(path))
+
+    header = RULES_INDEX_MAGIC + f"v{RULES_INDEX_VERSION}\n".encode()
+    path.write_bytes(header + b'["//:lib", "java_library", "BUILD:1:1", [], {}]\n')
+    with pytest.raises(ValueError, match="malformed rule"):
+        load_rules_index(str(path))
+
+    path.write_bytes(RULES_INDEX_MAGIC + b"vX\n")
+    with pytest.raises(ValueError, match="malformed header"):
+        load_rules_index(str(path))
+
+
+def test_alt_repo_names_unknown_package_source():
+    with pytest.raises(ValueError, match="Unknown package source foo"):
+        BazelXmlParser(rules_index={}, alt_repo_names="pip:@py,foo:@x")
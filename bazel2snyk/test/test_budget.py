@@ -0,0 +1,109 @@
+import itertools
+import pytest
+from bazel2snyk.budget import TraversalBudget
+from bazel2snyk.converter import Converter
+from bazel2snyk.converter import NoDependenciesFoundError
+from bazel2snyk.depgraph import TRUNCATED_PKG_ID
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+
+TARGET = "//:polyglot"
+
+
+@pytest.fixture(scope="module")
+def converter():
+    return Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"]
+    )
+
+
+def assert_valid(dep_graph):
+    """
+    Assert that every dep of the depGraph is a node, and every node a pkg
+    """
+    data = dep_graph.serializable()["depGraph"]
+    pkg_ids = {x["id"] for x in data["pkgs"]}
+    node_ids = {x["nodeId"] for x in data["graph"]["nodes"]}
+    assert data["graph"]["rootNodeId"] in node_ids
+    for node in data["graph"]["nodes"]:
+        assert node["pkgId"] in pkg_ids
+        assert {x["nodeId"] for x in node["deps"]} <= node_ids
+    return node_ids
+
+
+@pytest.mark.parametrize(
+    "limits,reason",
+    [
+        ({"max_depth": 1}, "max_depth"),
+        ({"max_nodes": 5}, "max_nodes"),
+    ],
+)
+def test_truncated_convert(converter, limits, reason):
+    """
+    Test that a limited conversion yields valid partial depGraphs, marked
+    as truncated, and reports where it cut
+    """
+    full = {k: assert_valid(v) for k, v in converter.convert(TARGET).items()}
+    dep_graphs = converter.convert(TARGET, **limits)
+
+    for source, dep_graph in dep_graphs.items():
+        node_ids = assert_valid(dep_graph)
+        assert TRUNCATED_PKG_ID in node_ids
+        assert node_ids - {TRUNCATED_PKG_ID} < full[source]
+
+    truncation = dep_graphs["maven"].truncation
+    assert truncation["truncated"]
+    assert truncation["reasons"] == [reason]
+    assert truncation["cuts"]
+    assert truncation["remaining_nodes"] > 0
+    if reason == "max_depth":
+        assert {x["depth"] for x in truncation["cuts"]} == {1}
+    else:
+        assert truncation["nodes"] == 5
+
+
+def test_time_budget(converter):
+    """
+    Test that the traversal stops expanding once the time budget is spent
+    """
+    clock = itertools.count().__next__
+    budget = TraversalBudget(time_budget=3, clock=clock)
+    bazel2snyk = converter.traverse(TARGET, budget)
+
+    assert bazel2snyk.truncation["reasons"] == ["time_budget"]
+    for dep_graph in bazel2snyk.dep_graphs.values():
+        assert_valid(dep_graph)
+
+
+@pytest.mark.parametrize("graph_store", ["memory", "sqlite"])
+def test_truncated_convert_empty(graph_store):
+    """
+    Test that depGraphs holding nothing but the truncation marker count as
+    empty, so the conversion fails rather than reporting an empty target
+    """
+    converter = Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE,
+        package_sources=["maven", "pip"],
+        graph_store=graph_store,
+    )
+    bazel2snyk = converter.traverse(TARGET, TraversalBudget(max_nodes=1))
+    assert bazel2snyk.empty_package_sources() == ["maven", "pip"]
+    with pytest.raises(NoDependenciesFoundError):
+        converter.convert(TARGET, max_nodes=1)
+
+
+def test_untruncated_convert(converter):
+    """
+    Test that limits the traversal stays within leave the depGraphs as
+    they are without any
+    """
+    expected = converter.convert(TARGET)
+    dep_graphs = converter.convert(TARGET, max_nodes=10000, max_depth=100)
+    for source, dep_graph in dep_graphs.items():
+        assert dep_graph.truncation is None
+        assert dep_graph.serializable() == expected[source].serializable()
+
+
+def test_invalid_budget():
+    with pytest.raises(ValueError):
+        TraversalBudget(max_nodes=0)
+    assert TraversalBudget.from_limits() is None
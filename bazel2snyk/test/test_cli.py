@@ -1,7 +1,10 @@
+import json
 from typer.testing import CliRunner
 from bazel2snyk.cli import cli
 from bazel2snyk.test.fixtures import pip_args
 from bazel2snyk.test.fixtures import maven_args
+from bazel2snyk.test.fixtures import polyglot_args
+from bazel2snyk.test.fixtures.snyk_api import StubSnykApi
 
 runner = CliRunner()
 
@@ -24,6 +27,18 @@ def test_bad_target():
     assert result.exit_code == 2
 
 
+def test_bad_alt_repo_names():
+    """
+    Test that alt repo names prefixed with an unknown package source are
+    rejected rather than crashing
+    """
+    result = runner.invoke(
+        cli, ["--alt-repo-names", "foo:@x"] + pip_args["print_graph"]
+    )
+    assert result.exit_code == 2
+    assert "Unknown package source foo in foo:@x" in result.output
+
+
 def test_pip_command_print_graph():
     """
     Test for printing the dep graph
@@ -32,6 +47,108 @@ def test_pip_command_print_graph():
     assert result.exit_code == 0
 
 
+def test_pip_command_print_graph_parse_workers():
+    """
+    Test for printing the dep graph after parsing the query output in parallel
+    """
+    result = runner.invoke(cli, pip_args["print_graph_parse_workers"])
+    assert result.exit_code == 0
+
+
+def test_bad_parse_workers():
+    """
+    Test that a negative number of parse workers is rejected
+    """
+    result = runner.invoke(cli, ["--parse-workers", "-1"] + pip_args["print_graph"])
+    assert result.exit_code == 2
+
+
+def test_pip_command_print_graph_scoped():
+    """
+    Test for printing the dep graph without the rules out of scope
+    """
+    result = runner.invoke(cli, pip_args["print_graph_scoped"])
+    assert result.exit_code == 0
+    dep_graph = json.loads(result.stdout[result.stdout.index("\n{") + 1 :])
+    assert [x["id"] for x in dep_graph["depGraph"]["pkgs"]] == [
+        "//snyk/scripts/cli:main@bazel",
+        "typer@0.4.1",
+        "click@8.1.3",
+    ]
+
+
+def test_polyglot_command_print_graph_collapsed():
+    """
+    Test for printing the dep graphs without bazel targets below the root
+    """
+    result = runner.invoke(cli, polyglot_args["print_graph_collapsed"])
+    assert result.exit_code == 0
+    dep_graphs = json.loads(result.stdout[result.stdout.index("\n{") + 1 :])
+    for dep_graph in dep_graphs.values():
+        pkg_ids = [x["id"] for x in dep_graph["depGraph"]["pkgs"]]
+        assert pkg_ids[0] == "//:polyglot@bazel"
+        assert len(pkg_ids) > 1
+        assert not any(x.endswith("@bazel") for x in pkg_ids[1:])
+
+
+def test_polyglot_command_print_graph_max_depth(tmp_path):
+    """
+    Test for printing dep graphs truncated below a depth, with a report
+    """
+    report_path = tmp_path / "truncation.json"
+    args = polyglot_args["print_graph"][:-1] + [
+        "--max-depth",
+        "1",
+        "--truncation-report",
+        str(report_path),
+        "print-graph",
+    ]
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 0
+    dep_graphs = json.loads(result.stdout[result.stdout.index("\n{") + 1 :])
+    for dep_graph in dep_graphs.values():
+        pkg_ids = [x["id"] for x in dep_graph["depGraph"]["pkgs"]]
+        assert "meta-truncated-dependencies@meta" in pkg_ids
+    report = json.loads(report_path.read_text())
+    assert report["reasons"] == ["max_depth"]
+
+
+def test_polyglot_command_print_deps(tmp_path):
+    """
+    Test for printing the bazel dependency tree to a file as JSON lines
+    """
+    deps_path = tmp_path / "deps.jsonl"
+    args = polyglot_args["print_graph"][:-1] + [
+        "--print-deps",
+        "--print-deps-file",
+        str(deps_path),
+        "--print-deps-format",
+        "jsonl",
+        "print-graph",
+    ]
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 0
+    rows = [json.loads(x) for x in deps_path.read_text().splitlines()]
+    assert rows[0]["name"] == "//:polyglot@bazel"
+    assert any(x["repeated"] for x in rows)
+    # every node with dependencies is expanded once
+    for parent in {x["parent"] for x in rows[1:]}:
+        assert [x["label"] for x in rows if not x["repeated"]].count(parent) == 1
+
+
+def test_pip_command_print_graph_write_subset(tmp_path):
+    """
+    Test for printing the dep graph from a previously written subset
+    """
+    subset_path = str(tmp_path / "subset.idx")
+    write_args = pip_args["print_graph"][:-1] + ["--write-subset", subset_path]
+    file_result = runner.invoke(cli, write_args + ["print-graph"])
+    subset_args = [subset_path if x.endswith(".xml") else x for x in write_args]
+    result = runner.invoke(cli, subset_args[:-2] + ["print-graph"])
+    assert result.exit_code == 0
+    assert result.stdout.split("\n{", 1)[1] == file_result.stdout.split("\n{", 1)[1]
+
+
 def test_pip_command_test():
     """
     Test for testing the dep graph
@@ -56,6 +173,51 @@ def test_maven_command_print_graph():
     assert result.exit_code == 0
 
 
+def test_maven_command_print_graph_bazel_query():
+    """
+    Test for printing the dep graph from streamed bazel query output
+    """
+    file_result = runner.invoke(cli, maven_args["print_graph"])
+    result = runner.invoke(cli, maven_args["bazel_query"])
+    assert result.exit_code == 0
+    assert result.stdout.split("\n{", 1)[1] == file_result.stdout.split("\n{", 1)[1]
+
+
+def test_maven_command_print_graph_maven_install():
+    """
+    Test for printing the dep graph from first-party query output and
+    the maven_install.json lockfile
+    """
+    file_result = runner.invoke(cli, maven_args["print_graph"])
+    result = runner.invoke(cli, maven_args["print_graph_maven_install"])
+    assert result.exit_code == 0
+    assert (
+        result.stdout[result.stdout.index("{") :]
+        == (file_result.stdout[file_result.stdout.index("\n{") + 1 :])
+    )
+
+
+def test_maven_command_print_graph_sqlite():
+    """
+    Test for printing the dep graph from the sqlite graph store
+    """
+    file_result = runner.invoke(cli, maven_args["print_graph"])
+    result = runner.invoke(cli, maven_args["print_graph_sqlite"])
+    assert result.exit_code == 0
+    assert (
+        result.stdout[result.stdout.index("{") :]
+        == (file_result.stdout[file_result.stdout.index("\n{") + 1 :])
+    )
+
+
+def test_maven_command_bad_bazel_query():
+    """
+    Test for a bazel query that fails
+    """
+    result = runner.invoke(cli, maven_args["bad_bazel_query"])
+    assert result.exit_code == 2
+
+
 def test_maven_command_test():
     """
     Test for testing the dep graph
@@ -70,3 +232,369 @@ def test_maven_command_monitor():
     """
     result = runner.invoke(cli, maven_args["monitor"])
     assert result.exit_code == 0
+
+
+def test_polyglot_command_print_graph():
+    """
+    Test for printing one dep graph per package source
+    """
+    result = runner.invoke(cli, polyglot_args["print_graph"])
+    assert result.exit_code == 0
+    dep_graphs = json.loads(result.stdout[result.stdout.index("{") :])
+    assert sorted(dep_graphs) == ["maven", "pip"]
+    assert dep_graphs["pip"]["depGraph"]["pkgManager"]["name"] == "pip"
+
+
+def test_polyglot_command_index_who_depends(tmp_path):
+    """
+    Test for indexing every top-level target and looking up a package
+    """
+    index_file = str(tmp_path / "index.sqlite")
+    result = runner.invoke(cli, polyglot_args["index"] + ["--index-file", index_file])
+    assert result.exit_code == 0
+
+    result = runner.invoke(
+        cli, ["who-depends", "--index-file", index_file, "--package", "click"]
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.stdout[result.stdout.index("{") :]) == {
+        "click@8.1.3": {"//:polyglot": [{"label": "@pypi_click//:pkg", "paths": 1}]}
+    }
+
+
+def test_command_missing_target():
+    """
+    Test that commands converting a target still require --bazel-target
+    """
+    args = polyglot_args["print_graph"]
+    target_index = args.index("--bazel-target")
+    result = runner.invoke(cli, args[:target_index] + args[target_index + 2 :])
+    assert result.exit_code == 2
+
+
+def test_pip_command_pipeline(tmp_path):
+    """
+    Test for writing, testing and monitoring the dep graph in one run
+    """
+    output_file = tmp_path / "depgraph.json"
+    with StubSnykApi() as snyk_api:
+        result = runner.invoke(
+            cli,
+            pip_args["print_graph"][:-1]
+            + [
+                "pipeline",
+                "--output-file",
+                str(output_file),
+                "--test",
+                "--monitor",
+                "--snyk-token",
+                "stub-token",
+                "--snyk-org-id",
+                "stub-org",
+                "--snyk-api-url",
+                snyk_api.url,
+            ],
+        )
+
+    assert result.exit_code == 1
+    assert sorted(snyk_api.paths()) == ["/v1/monitor/dep-graph", "/v1/test/dep-graph"]
+    assert json.loads(output_file.read_text()) == snyk_api.requests[0]["body"]
+    assert all(
+        x["headers"]["Authorization"] == "token stub-token" for x in snyk_api.requests
+    )
+
+
+def test_pip_command_pipeline_api_error():
+    """
+    Test that a failed pipeline request exits with code 2 and no traceback
+    """
+    with StubSnykApi(test_status=500) as snyk_api:
+        result = runner.invoke(
+            cli,
+            pip_args["print_graph"][:-1]
+            + ["pipeline", "--test", "--snyk-token", "stub-token"]
+            + ["--snyk-org-id", "stub-org", "--snyk-api-url", snyk_api.url],
+        )
+
+    assert result.exit_code == 2
+    assert "Traceback" not in result.output
+
+
+def test_pip_command_test_cached(tmp_path):
+    """
+    Test that an identical depGraph is only tested once within the cache TTL
+    """
+    with StubSnykApi() as snyk_api:
+        test_args = pip_args["test"] + [
+            "--snyk-token",
+            "stub-token",
+            "--snyk-api-url",
+            snyk_api.url,
+            "--cache-dir",
+            str(tmp_path),
+        ]
+        first = runner.invoke(cli, test_args)
+        second = runner.invoke(cli, test_args)
+        uncached = runner.invoke(cli, test_args + ["--no-cache"])
+
+    assert [x.exit_code for x in (first, second, uncached)] == [1, 1, 1]
+    assert snyk_api.paths() == ["/v1/test/dep-graph", "/v1/test/dep-graph"]
+    assert "0 hit(s), 1 miss(es)" in first.output
+    assert "1 hit(s), 0 miss(es)" in second.output
+    decoder = json.JSONDecoder()
+    assert (
+        decoder.raw_decode(second.stdout, second.stdout.index("\n{") + 1)[0]
+        == (decoder.raw_decode(first.stdout, first.stdout.index("\n{") + 1)[0])
+    )
+
+
+def test_pip_command_test_cache_dir_not_writable(tmp_path):
+    """
+    Test that a cache directory that cannot be created, e.g. under a
+    read-only home, leaves the results uncached rather than failing
+    """
+    (tmp_path / "home").write_text("not a directory")
+    with StubSnykApi() as snyk_api:
+        result = runner.invoke(
+            cli,
+            pip_args["test"]
+            + [
+                "--snyk-token",
+                "stub-token",
+                "--snyk-api-url",
+                snyk_api.url,
+                "--cache-dir",
+                str(tmp_path / "home" / "cache"),
+            ],
+        )
+
+    assert result.exit_code == 1
+    assert snyk_api.paths() == ["/v1/test/dep-graph"]
+    assert "hit(s)" not in result.output
+
+
+def test_pip_command_test_sharded(tmp_path):
+    """
+    Test that a sharded test submits one depGraph per shard and merges the results
+    """
+    with StubSnykApi(vulnerable_pkgs=("click@8.1.3", "idna@3.4")) as snyk_api:
+        result = runner.invoke(
+            cli,
+            pip_args["test"]
+            + [
+                "--snyk-token",
+                "stub-token",
+                "--snyk-api-url",
+                snyk_api.url,
+                "--no-cache",
+                "--shards",
+                "2",
+            ],
+        )
+
+    assert result.exit_code == 1
+    assert snyk_api.paths() == ["/v1/test/dep-graph", "/v1/test/dep-graph"]
+    roots = sorted(
+        [x["nodeId"] for x in request["body"]["depGraph"]["graph"]["nodes"][0]["deps"]]
+        for request in snyk_api.requests
+    )
+    assert roots == [["pysnyk@0.9.3"], ["typer@0.4.1"]]
+    response = json.JSONDecoder().raw_decode(
+        result.stdout, result.stdout.index("\n{") + 1
+    )[0]
+    assert response["ok"] is False
+    assert sorted(response["issuesData"]) == [
+        "SNYK-STUB-click@8.1.3",
+        "SNYK-STUB-idna@3.4",
+    ]
+    assert len(response["issues"]) == 2
+
+
+def test_pip_command_test_api_error():
+    """
+    Test that a failed test request exits with code 2 and no traceback
+    """
+    with StubSnykApi(test_status=500) as snyk_api:
+        result = runner.invoke(
+            cli,
+            pip_args["test"]
+            + ["--snyk-token", "stub-token", "--snyk-api-url", snyk_api.url]
+            + ["--no-cache"],
+        )
+
+    assert result.exit_code == 2
+    assert "Traceback" not in result.output
+
+
+def test_pip_command_test_api_error_output_file(tmp_path, monkeypatch):
+    """
+    Test that the output file is closed when a failed test request exits
+    """
+    opened = []
+
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr("bazel2snyk.cli.open", tracking_open, raising=False)
+    with StubSnykApi(test_status=500) as snyk_api:
+        result = runner.invoke(
+            cli,
+            pip_args["test"]
+            + ["--snyk-token", "stub-token", "--snyk-api-url", snyk_api.url]
+            + ["--no-cache", "--output-file", tmp_path / "result.json"],
+        )
+
+    assert result.exit_code == 2
+    output = [x for x in opened if x.name == str(tmp_path / "result.json")]
+    assert len(output) == 1 and output[0].closed
+
+
+def test_pip_command_test_api_error_not_json():
+    """
+    Test that a test response that is not JSON exits with code 2, not
+    with the code of found vulnerabilities
+    """
+    with StubSnykApi(test_payload=b"<html>Bad Gateway</html>") as snyk_api:
+        result = runner.invoke(
+            cli,
+            pip_args["test"]
+            + ["--snyk-token", "stub-token", "--snyk-api-url", snyk_api.url]
+            + ["--no-cache"],
+        )
+
+    assert result.exit_code == 2
+
+
+def test_pip_command_test_output_formats_ok_last():
+    """
+    Test that the exit code is read from ok wherever it is in the response
+    """
+    for vulnerable_pkgs, exit_code in ((("click@8.1.3",), 1), ((), 0)):
+        with StubSnykApi(vulnerable_pkgs, ok_last=True) as snyk_api:
+            result = runner.invoke(
+                cli,
+                pip_args["test"]
+                + ["--snyk-token", "stub-token", "--snyk-api-url", snyk_api.url]
+                + ["--no-cache", "--output-format", "none"],
+            )
+        assert result.exit_code == exit_code
+
+
+def test_pip_command_test_output_formats(tmp_path):
+    """
+    Test writing a summary, the raw response, or nothing but the exit code
+    """
+    with StubSnykApi() as snyk_api:
+        test_args = pip_args["test"] + [
+            "--snyk-token",
+            "stub-token",
+            "--snyk-api-url",
+            snyk_api.url,
+        ]
+        summary = runner.invoke(
+            cli,
+            test_args
+            + ["--output-format", "summary", "--output-file", tmp_path / "summary"],
+        )
+        raw = runner.invoke(
+            cli,
+            test_args + ["--output-format", "raw", "--output-file", tmp_path / "raw"],
+        )
+        none = runner.invoke(cli, test_args + ["--output-format", "none"])
+
+    assert [x.exit_code for x in (summary, raw, none)] == [1, 1, 1]
+    assert json.loads((tmp_path / "summary").read_text()) == {
+        "ok": False,
+        "issues": {
+            "SNYK-STUB-click@8.1.3": {
+                "severity": "high",
+                "title": None,
+                "pkgs": ["click@8.1.3"],
+            }
+        },
+        "issueCount": 1,
+    }
+    assert (tmp_path / "raw").read_text() == json.dumps(
+        snyk_api.test_response(snyk_api.requests[1]["body"])
+    ) + "\n"
+    assert "{" not in none.stdout
+
+
+def test_polyglot_command_batch_merge(tmp_path):
+    """
+    Test for converting each shard of several targets and merging the manifests
+    """
+    for shard_index in ("0", "1"):
+        result = runner.invoke(
+            cli,
+            polyglot_args["batch"]
+            + ["--shard-index", shard_index, "--output-dir", str(tmp_path)]
+            + ["--export-dir", str(tmp_path / "export")],
+        )
+        assert result.exit_code == 0
+
+    with open(tmp_path / "export" / "targets.ndjson") as f:
+        assert [json.loads(x)["name"] for x in f] == [
+            "//:java-maven-lib",
+            "//snyk/scripts/cli:main",
+        ]
+
+    assert sorted(x.name for x in tmp_path.iterdir()) == [
+        "export",
+        "java-maven-lib.maven.json",
+        "manifest-0-of-2.json",
+        "manifest-1-of-2.json",
+        "snyk_scripts_cli_main.pip.json",
+    ]
+
+    result = runner.invoke(
+        cli, ["merge"] + [str(x) for x in sorted(tmp_path.glob("manifest-*"))]
+    )
+    assert result.exit_code == 0
+    report = json.loads(result.stdout[result.stdout.index("{") :])
+    assert [(x["target"], x["shard_index"]) for x in report["targets"]] == [
+        ("//:java-maven-lib", 0),
+        ("//snyk/scripts/cli:main", 1),
+    ]
+
+    result = runner.invoke(cli, ["merge", str(tmp_path / "manifest-0-of-2.json")])
+    assert result.exit_code == 2
+
+
+def test_polyglot_command_upload(tmp_path):
+    """
+    Test for converting and monitoring several targets, with a status per target
+    """
+    status_file = tmp_path / "status.json"
+    with StubSnykApi() as snyk_api:
+        result = runner.invoke(
+            cli,
+            polyglot_args["upload"]
+            + ["--snyk-api-url", snyk_api.url, "--status-file", str(status_file)],
+        )
+
+    assert result.exit_code == 0
+    assert snyk_api.paths() == ["/v1/monitor/dep-graph"] * 2
+    assert "//snyk/scripts/cli:main  pip" in result.stdout
+    statuses = json.loads(status_file.read_text())
+    assert [list(x["uploads"]) for x in statuses] == [["maven"], ["pip"]]
+
+
+def test_polyglot_command_upload_rate_limited(tmp_path):
+    """
+    Test for uploading through a rate limiter, with its metrics on exit
+    """
+    rate_limit_args = ["--rate-limit", "50", "--rate-limit-file"]
+    with StubSnykApi() as snyk_api:
+        result = runner.invoke(
+            cli,
+            rate_limit_args
+            + [str(tmp_path / "rate-limit")]
+            + polyglot_args["upload"]
+            + ["--snyk-api-url", snyk_api.url],
+        )
+
+    assert result.exit_code == 0
+    assert len(snyk_api.requests) == 2
+    assert 'Rate limiter: {"requests": 2' in result.output
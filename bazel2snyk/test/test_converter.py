@@ -0,0 +1,135 @@
+import pytest
+from bazel2snyk.cli import load_file
+from bazel2snyk.converter import Converter
+from bazel2snyk.converter import NoDependenciesFoundError
+from bazel2snyk.test import MAVEN_BAZEL_XML_FILE
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+
+POLYGLOT_TARGETS = ["//:polyglot", "//:java-maven-lib", "//snyk/scripts/cli:main"]
+
+
+@pytest.fixture
+def polyglot_converter():
+    return Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"]
+    )
+
+
+def graph_dumps(dep_graphs):
+    return {
+        source: dep_graph.graph().model_dump()
+        for source, dep_graph in dep_graphs.items()
+    }
+
+
+def test_convert():
+    converter = Converter.from_xml(load_file(MAVEN_BAZEL_XML_FILE))
+    dep_graphs = converter.convert("//:java-maven-lib")
+    assert list(dep_graphs) == ["maven"]
+    assert dep_graphs["maven"].has_pkg("com.google.guava:guava@28.0-jre")
+
+
+def test_convert_no_dependencies_raises():
+    converter = Converter.from_file(MAVEN_BAZEL_XML_FILE)
+    with pytest.raises(NoDependenciesFoundError):
+        converter.convert("//:does-not-exist")
+
+
+def test_converter_bad_package_source():
+    with pytest.raises(ValueError):
+        Converter.from_file(MAVEN_BAZEL_XML_FILE, package_sources=["nuget"])
+
+
+def test_convert_many_matches_sequential(polyglot_converter):
+    """
+    a shared Converter gives the same depGraphs whether targets
+    are converted one after another or from several threads
+    """
+    sequential = {
+        target: graph_dumps(polyglot_converter.convert(target))
+        for target in POLYGLOT_TARGETS
+    }
+    for _ in range(3):
+        concurrent = polyglot_converter.convert_many(POLYGLOT_TARGETS, workers=3)
+        assert {
+            target: graph_dumps(dep_graphs) for target, dep_graphs in concurrent.items()
+        } == sequential
+    assert (
+        sequential["//:java-maven-lib"]["maven"]
+        != (sequential["//snyk/scripts/cli:main"]["maven"])
+    )
+
+
+def test_convert_bzlmod_canonical_labels():
+    """
+    Test that dependencies in bzlmod module extension repos are converted
+    """
+    converter = Converter.from_xml(
+        """<?xml version="1.1" encoding="UTF-8" standalone="no"?>
+<query version="2">
+    <rule class="java_library" location="/workspace/BUILD:1:1" name="//app:main">
+        <list name="deps">
+            <label value="@@rules_jvm_external~~maven~maven//:com_google_guava_guava"/>
+        </list>
+    </rule>
+    <rule class="jvm_import"
+          location="/external/rules_jvm_external~~maven~maven/BUILD:1:1"
+          name="@@rules_jvm_external~~maven~maven//:com_google_guava_guava">
+        <list name="tags">
+            <string value="maven_coordinates=com.google.guava:guava:31.1-jre"/>
+        </list>
+    </rule>
+</query>"""
+    )
+    dep_graphs = converter.convert("//app:main")
+    assert dep_graphs["maven"].has_pkg("com.google.guava:guava@31.1-jre")
+
+
+def reachable_pkgs(dep_graph, node_id, bazel=False):
+    """
+    Pkgs below node_id, excluding bazel targets unless bazel is set
+    """
+    nodes = {x.nodeId: x for x in dep_graph.graph().depGraph.graph.nodes}
+    seen = set()
+    stack = [node_id]
+    while stack:
+        node = nodes.get(stack.pop())
+        for dep in node.deps if node else []:
+            if dep.nodeId not in seen:
+                seen.add(dep.nodeId)
+                stack.append(dep.nodeId)
+    return {x for x in seen if bazel or not x.endswith("@bazel")}
+
+
+@pytest.mark.parametrize("collapse_depth", [0, 1])
+def test_convert_collapse(polyglot_converter, collapse_depth):
+    """
+    Test that collapsing leaves out bazel targets below collapse_depth and
+    keeps every dependency, below the same dependencies as before
+    """
+    full = polyglot_converter.convert("//:polyglot")
+    collapsed = polyglot_converter.convert(
+        "//:polyglot", collapse=True, collapse_depth=collapse_depth
+    )
+    for source, dep_graph in collapsed.items():
+        root = dep_graph.get_root_node()
+        assert root == full[source].get_root_node()
+        if not collapse_depth:
+            assert dep_graph.node_count() < full[source].node_count()
+        assert reachable_pkgs(dep_graph, root) == reachable_pkgs(full[source], root)
+        for node in dep_graph.graph().depGraph.graph.nodes:
+            assert dep_graph.has_pkg(node.pkgId)
+            if not node.nodeId.endswith("@bazel"):
+                assert reachable_pkgs(dep_graph, node.nodeId) == reachable_pkgs(
+                    full[source], node.nodeId
+                )
+
+        targets = reachable_pkgs(dep_graph, root, bazel=True) - reachable_pkgs(
+            dep_graph, root
+        )
+        direct_targets = {
+            x.nodeId
+            for x in full[source].graph().depGraph.graph.nodes[0].deps
+            if x.nodeId.endswith("@bazel")
+        }
+        assert targets == (direct_targets if collapse_depth else set())
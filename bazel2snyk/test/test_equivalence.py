@@ -0,0 +1,123 @@
+import copy
+from typing import List
+import pytest
+from bazel2snyk.converter import BAZEL_TARGET_VERSION_STRING
+from bazel2snyk.test.equivalence import OTHER_SOURCE_LABELS
+from bazel2snyk.test.equivalence import PRUNE_MODES
+from bazel2snyk.test.equivalence import ROOT_TARGET
+from bazel2snyk.test.equivalence import canonical_dep_graph
+from bazel2snyk.test.equivalence import compare
+from bazel2snyk.test.equivalence import diff_dep_graphs
+from bazel2snyk.test.equivalence import engine_convert
+from bazel2snyk.test.equivalence import fixture_cases
+from bazel2snyk.test.equivalence import random_cases
+from bazel2snyk.test.equivalence import QueryCase
+from bazel2snyk.test.equivalence import random_query_xml
+from bazel2snyk.test.reference import reference_convert
+
+FIXTURE_CASES = fixture_cases()
+RANDOM_CASES = list(random_cases(range(2)))
+
+OTHER_SOURCE_PREFIXES = tuple(x.split("{")[0] for x in OTHER_SOURCE_LABELS.values())
+
+
+def other_source_labels_as_targets(dep_graph: dict) -> dict:
+    """
+    The one intended divergence from the reference: labels in the repos of
+    a package source not being converted, e.g. @maven// when converting
+    pip, are bazel targets name@bazel rather than pkgs with an empty name
+    """
+
+    def relabel(node_id: str) -> str:
+        if node_id.startswith(OTHER_SOURCE_PREFIXES):
+            return f"{node_id}@{BAZEL_TARGET_VERSION_STRING}"
+        return node_id
+
+    dep_graph = copy.deepcopy(dep_graph)
+    data = dep_graph["depGraph"]
+    for pkg in data["pkgs"]:
+        if pkg["id"] != relabel(pkg["id"]):
+            pkg["info"] = {"name": pkg["id"], "version": BAZEL_TARGET_VERSION_STRING}
+            pkg["id"] = relabel(pkg["id"])
+    for node in data["graph"]["nodes"]:
+        node["nodeId"] = relabel(node["nodeId"])
+        node["pkgId"] = relabel(node["pkgId"])
+        for dep in node["deps"]:
+            dep["nodeId"] = relabel(dep["nodeId"])
+    return dep_graph
+
+
+def intended_differences(case: QueryCase, prune_mode: str) -> List[str]:
+    """
+    Differences compare() reports for case if the engine diverges from the
+    reference only as intended
+    """
+    expected = reference_convert(
+        case.rules_xml,
+        case.bazel_target,
+        case.package_source,
+        case.alt_repo_names,
+        **PRUNE_MODES[prune_mode],
+    )
+    return diff_dep_graphs(expected, other_source_labels_as_targets(expected))
+
+
+@pytest.mark.parametrize("prune_mode", PRUNE_MODES)
+@pytest.mark.parametrize("case", FIXTURE_CASES, ids=[x.name for x in FIXTURE_CASES])
+def test_fixture_equivalence(case, prune_mode):
+    result = compare(case, prune_mode)
+    assert result.differences == []
+
+
+@pytest.mark.parametrize("prune_mode", PRUNE_MODES)
+@pytest.mark.parametrize("case", RANDOM_CASES, ids=[x.name for x in RANDOM_CASES])
+def test_random_equivalence(case, prune_mode):
+    result = compare(case, prune_mode)
+    assert result.differences == intended_differences(case, prune_mode)
+
+
+@pytest.mark.parametrize("prune_mode", PRUNE_MODES)
+def test_random_equivalence_sqlite(prune_mode):
+    for case in RANDOM_CASES[:4]:
+        result = compare(case, prune_mode, "sqlite")
+        assert result.differences == intended_differences(case, prune_mode)
+
+
+def test_other_source_labels_diverge():
+    """
+    Test that the random query outputs contain labels of other package
+    sources, and that compare() reports the divergence they cause
+    """
+    case = RANDOM_CASES[0]
+    differences = compare(case, "none").differences
+    assert differences
+    assert all(OTHER_SOURCE_PREFIXES[0] in x for x in differences)
+
+    case = case._replace(rules_xml=random_query_xml(0, other_source_labels=False))
+    assert compare(case, "none").differences == []
+
+
+def test_diff_dep_graphs():
+    """
+    Test that the order of pkgs, nodes and deps is ignored, and any other
+    difference is reported
+    """
+    dep_graph = engine_convert(random_query_xml(0), ROOT_TARGET)
+    reordered = copy.deepcopy(dep_graph)
+    data = reordered["depGraph"]
+    data["pkgs"].reverse()
+    data["graph"]["nodes"].reverse()
+    for node in data["graph"]["nodes"]:
+        node["deps"].reverse()
+    assert canonical_dep_graph(reordered) == canonical_dep_graph(dep_graph)
+    assert diff_dep_graphs(dep_graph, reordered) == []
+
+    node = next(x for x in data["graph"]["nodes"] if x["deps"])
+    removed = node["deps"].pop()
+    data["pkgs"].append(
+        {"id": "extra@1.0", "info": {"name": "extra", "version": "1.0"}}
+    )
+    assert diff_dep_graphs(dep_graph, reordered) == [
+        "extra pkg extra@1.0",
+        f"node {node['nodeId']} missing dep {removed['nodeId']}",
+    ]
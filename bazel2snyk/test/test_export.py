@@ -0,0 +1,58 @@
+import json
+from bazel2snyk.converter import Converter
+from bazel2snyk.export import GraphExporter
+from bazel2snyk.export import intern_id
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+
+TARGETS = ["//:java-maven-lib", "//snyk/scripts/cli:main"]
+
+
+def read_table(directory, table):
+    with open(directory / f"{table}.ndjson") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_export_round_trip(tmp_path):
+    """
+    Test that each exported depGraph can be rebuilt from the tables, and
+    that pkgs are written once however many runs append to them
+    """
+    converter = Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"]
+    )
+    dep_graphs = {x: converter.convert(x) for x in TARGETS}
+    for run in ("first", "second"):
+        with GraphExporter(str(tmp_path), run) as exporter:
+            for target in TARGETS:
+                for source, dep_graph in dep_graphs[target].items():
+                    exporter.export(target, source, dep_graph)
+
+    targets = read_table(tmp_path, "targets")
+    pkgs = {x["pkg"]: x for x in read_table(tmp_path, "pkgs")}
+    nodes = read_table(tmp_path, "nodes")
+    edges = read_table(tmp_path, "edges")
+
+    assert [(x["run"], x["name"], x["package_source"]) for x in targets] == [
+        (run, target, source)
+        for run in ("first", "second")
+        for target in TARGETS
+        for source in ("maven", "pip")
+    ]
+    assert len(pkgs) == len(read_table(tmp_path, "pkgs"))
+
+    for row in targets:
+        dep_graph = dep_graphs[row["name"]][row["package_source"]].serializable()
+        graph = dep_graph["depGraph"]["graph"]
+        assert row["root"] == intern_id(graph["rootNodeId"])
+        assert [
+            (x["node"], x["pkg"]) for x in nodes if x["target"] == row["target"]
+        ] == [(intern_id(x["nodeId"]), intern_id(x["pkgId"])) for x in graph["nodes"]]
+        assert [
+            (x["parent"], x["child"]) for x in edges if x["target"] == row["target"]
+        ] == [
+            (intern_id(x["nodeId"]), intern_id(y["nodeId"]))
+            for x in graph["nodes"]
+            for y in x["deps"]
+        ]
+        for pkg in dep_graph["depGraph"]["pkgs"]:
+            assert pkgs[intern_id(pkg["id"])]["name"] == pkg["info"]["name"]
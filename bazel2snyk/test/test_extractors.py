@@ -0,0 +1,153 @@
+import re
+import pytest
+from bazel2snyk.extractors import EXTRACTORS
+from bazel2snyk.extractors import RepoMatch
+from bazel2snyk.extractors import RepoMatcher
+from bazel2snyk.extractors import trie_pattern
+from bazel2snyk.rules import BazelRule
+from benchmarks.extractors import SYNTHETIC_RULES
+from benchmarks.extractors import benchmark_extractor
+
+GO_REPOSITORY_RULE = BazelRule(
+    name="//external:com_github_pkg_errors",
+    rule_class="go_repository",
+    location="/WORKSPACE:10:14",
+    lists={},
+    strings={"importpath": "github.com/pkg/errors", "version": "v0.9.1"},
+)
+GO_LIBRARY_RULE = BazelRule(
+    name="@com_github_pkg_errors//:errors",
+    rule_class="go_library",
+    location="/external/com_github_pkg_errors/BUILD.bazel:3:11",
+    lists={},
+    strings={"importpath": "github.com/pkg/errors"},
+)
+NPM_LINK_RULE = BazelRule(
+    name="//:node_modules/@types/node",
+    rule_class="npm_link_package_store",
+    location="/BUILD.bazel:4:22",
+    lists={},
+    strings={"src": "//:.aspect_rules_js/node_modules/@types+node@18.11.9"},
+)
+CARGO_RULE = BazelRule(
+    name="@crates__serde_json-1.0.89//:serde_json",
+    rule_class="rust_library",
+    location="/external/crates__serde_json-1.0.89/BUILD.bazel:12:13",
+    lists={},
+    strings={"version": "1.0.89"},
+)
+
+
+@pytest.fixture
+def extractors():
+    return {name: extractor() for name, extractor in EXTRACTORS.items()}
+
+
+def test_trie_pattern():
+    """
+    Test that the trie pattern matches exactly the given words
+    """
+    pattern = trie_pattern(["@maven", "@maven_alt", "@py_deps", "@pypi"])
+    for word in ["@maven", "@maven_alt", "@py_deps", "@pypi"]:
+        assert re.fullmatch(pattern, word)
+    assert not re.fullmatch(pattern, "@py")
+
+
+def test_maven_extractor(extractors):
+    """
+    Test that maven rules without coordinates, such as aliases,
+    keep their label with its last : replaced by @
+    """
+    tagged = BazelRule(
+        name="@maven//:junit_junit_4_13",
+        rule_class="jvm_import",
+        location="/external/maven/BUILD:10:11",
+        lists={"tags": ["maven_coordinates=junit:junit:4.13"]},
+        strings={},
+    )
+    alias = tagged._replace(name="@maven//:junit_junit", rule_class="alias", lists={})
+    assert extractors["maven"].extract([tagged, alias]) == {
+        tagged.name: "junit:junit@4.13",
+        alias.name: "@maven//@junit_junit",
+    }
+
+
+def test_go_extractor(extractors):
+    """
+    Test that go coordinates are resolved from the go_repository rule
+    """
+    extractor = extractors["go"]
+    extractor.prepare({x.name: x for x in [GO_REPOSITORY_RULE, GO_LIBRARY_RULE]})
+    repo_matcher = RepoMatcher(extractors)
+
+    assert repo_matcher.package_source(GO_LIBRARY_RULE.name) == "go"
+    assert extractor.extract([GO_LIBRARY_RULE]) == {
+        GO_LIBRARY_RULE.name: "github.com/pkg/errors@v0.9.1"
+    }
+
+
+def test_npm_extractor(extractors):
+    """
+    Test that rules_js node_modules links resolve to their package store
+    """
+    repo_matcher = RepoMatcher(extractors)
+
+    assert repo_matcher.package_source(NPM_LINK_RULE.name) == "npm"
+    assert extractors["npm"].extract([NPM_LINK_RULE]) == {
+        NPM_LINK_RULE.name: "@types/node@18.11.9"
+    }
+
+
+def test_cargo_extractor(extractors):
+    """
+    Test that crate_universe crates resolve from their repo name
+    """
+    repo_matcher = RepoMatcher(extractors)
+
+    assert repo_matcher.package_source(CARGO_RULE.name) == "cargo"
+    assert extractors["cargo"].extract([CARGO_RULE]) == {
+        CARGO_RULE.name: "serde_json@1.0.89"
+    }
+
+
+def test_repo_matcher(extractors):
+    """
+    Test that labels map to their package source and hub, by apparent or
+    canonical repo name
+    """
+    extractors["maven"].repo_names.append("@maven_pinned")
+    repo_matcher = RepoMatcher(extractors)
+
+    assert repo_matcher.match("@maven//:com_google_guava_guava") == RepoMatch(
+        "maven", "@maven", "@maven"
+    )
+    assert repo_matcher.match("@maven_pinned//:junit_junit") == RepoMatch(
+        "maven", "@maven_pinned", "@maven_pinned"
+    )
+    for canonical in (
+        "@@rules_jvm_external~~maven~maven_pinned",
+        "@@rules_jvm_external~5.3~maven~maven_pinned",
+        "@@rules_jvm_external++maven+maven_pinned",
+    ):
+        assert repo_matcher.match(f"{canonical}//:junit_junit") == RepoMatch(
+            "maven", "@maven_pinned", canonical
+        )
+    assert repo_matcher.match("@@rules_python~~pip~pypi_311_click//:pkg") == (
+        RepoMatch("pip", "@pypi", "@@rules_python~~pip~pypi_311_click")
+    )
+    assert repo_matcher.match("@crates__serde-1.0.130//:serde").hub == "@crates"
+    assert repo_matcher.match(NPM_LINK_RULE.name).package_source == "npm"
+
+    assert repo_matcher.match("@mavenized//:lib") is None
+    assert repo_matcher.match("@@rules_jvm_external~//:lib") is None
+    assert repo_matcher.match("//app:main") is None
+    assert repo_matcher.match("@mavenized//:lib", prefix=True).hub == "@maven"
+
+
+@pytest.mark.parametrize("package_source", list(EXTRACTORS))
+def test_extractor_benchmark(package_source):
+    """
+    Test that every registered extractor ships with a throughput benchmark
+    """
+    assert package_source in SYNTHETIC_RULES
+    assert benchmark_extractor(package_source, 100) > 0
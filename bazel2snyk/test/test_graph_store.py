@@ -0,0 +1,133 @@
+import json
+import pytest
+from bazel2snyk.cli import Bazel2Snyk
+from bazel2snyk.cli import load_file
+from bazel2snyk.bazel import BazelXmlParser
+from bazel2snyk.depgraph import DepGraph
+from bazel2snyk.depgraph import iter_json
+from bazel2snyk.graph_store import SqliteDepGraph
+from bazel2snyk.result_cache import depgraph_digest
+from bazel2snyk.test import MAVEN_BAZEL_XML_FILE
+from bazel2snyk.test import MAVEN_PACKAGE_SOURCE
+from bazel2snyk.test import PIP_BAZEL_XML_FILE
+from bazel2snyk.test import PIP_PACKAGE_SOURCE
+
+CONVERSIONS = [
+    (MAVEN_BAZEL_XML_FILE, MAVEN_PACKAGE_SOURCE, "//:java-maven-lib"),
+    (PIP_BAZEL_XML_FILE, PIP_PACKAGE_SOURCE, "//snyk/scripts/cli:main"),
+]
+
+
+def convert(dep_graph, xml_file, package_source, target, prune):
+    bazel2snyk = Bazel2Snyk(
+        bazel_xml_parser=BazelXmlParser(
+            rules_xml=load_file(xml_file), pkg_manager_name=package_source
+        ),
+        dep_graph=dep_graph,
+    )
+    bazel2snyk.bazel_to_depgraph(parent_node_id=target, depth=0)
+    if prune == "prune_all":
+        dep_graph.prune_graph_all()
+    elif prune == "prune":
+        dep_graph.prune_graph(2, 5)
+    elif prune == "collapse":
+        dep_graph.collapse_graph("bazel", 1)
+    return dep_graph
+
+
+@pytest.mark.parametrize("prune", [None, "prune", "prune_all", "collapse"])
+@pytest.mark.parametrize("xml_file,package_source,target", CONVERSIONS)
+def test_sqlite_matches_memory(xml_file, package_source, target, prune, tmp_path):
+    """
+    Test that the sqlite graph store builds and prunes the same depGraph
+    """
+    memory = convert(DepGraph(package_source), xml_file, package_source, target, prune)
+    sqlite = convert(
+        SqliteDepGraph(package_source, str(tmp_path)),
+        xml_file,
+        package_source,
+        target,
+        prune,
+    )
+    assert sqlite.graph() == memory.graph()
+    assert sqlite.node_count() == memory.node_count()
+
+    memory.rename_depgraph("renamed")
+    sqlite.rename_depgraph("renamed")
+    assert sqlite.graph() == memory.graph()
+
+    sqlite.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("indent", [None, 4])
+def test_sqlite_streams_json(indent):
+    """
+    Test that the streamed serialization matches json.dumps of the model
+    """
+    dep_graph = convert(SqliteDepGraph(MAVEN_PACKAGE_SOURCE), *CONVERSIONS[0], None)
+    assert "".join(iter_json(dep_graph.serializable(), indent)) == json.dumps(
+        dep_graph.graph().model_dump(), indent=indent
+    )
+
+
+def test_sqlite_set_dep_graph():
+    memory = convert(DepGraph(MAVEN_PACKAGE_SOURCE), *CONVERSIONS[0], None)
+    sqlite = SqliteDepGraph(MAVEN_PACKAGE_SOURCE)
+    sqlite.set_dep_graph(memory.graph())
+    assert sqlite.graph() == memory.graph()
+
+
+def cyclic_dep_graph(dep_graph):
+    """
+    Targets in a cycle below the root, with packages below and between them
+    """
+    edges = [
+        (None, "//a@bazel"),
+        ("//a@bazel", "//b@bazel"),
+        ("//a@bazel", "x@1.0"),
+        ("//b@bazel", "//c@bazel"),
+        ("//b@bazel", "y@1.0"),
+        ("//c@bazel", "//a@bazel"),
+        ("//c@bazel", "//d@bazel"),
+        ("//d@bazel", "x@1.0"),
+        ("x@1.0", "//e@bazel"),
+        ("//e@bazel", "z@1.0"),
+    ]
+    for parent, child in edges:
+        dep_graph.add_pkg(child)
+        dep_graph.add_dep(child, parent)
+        dep_graph.add_dep(None, child)
+    return dep_graph
+
+
+@pytest.mark.parametrize("keep_depth", [0, 1, 2])
+def test_sqlite_collapse_matches_memory(keep_depth):
+    """
+    Test that collapsing over SQL elides the same targets, in the same
+    order, as the in-memory engine, cycles included
+    """
+    memory = cyclic_dep_graph(DepGraph(MAVEN_PACKAGE_SOURCE))
+    sqlite = cyclic_dep_graph(SqliteDepGraph(MAVEN_PACKAGE_SOURCE))
+    assert sqlite.collapse_graph("bazel", keep_depth) == memory.collapse_graph(
+        "bazel", keep_depth
+    )
+    assert sqlite.graph() == memory.graph()
+    # the temporary tables are dropped
+    assert sqlite.collapse_graph("bazel", keep_depth) == 0
+
+
+@pytest.mark.parametrize("prune", [None, "prune_all", "collapse"])
+def test_sqlite_digest_matches_memory(prune):
+    """
+    Test that the digest hashed from SQLite's sorted pkgs and edges is
+    that of the request body
+    """
+    memory = convert(DepGraph(MAVEN_PACKAGE_SOURCE), *CONVERSIONS[0], prune)
+    sqlite = convert(SqliteDepGraph(MAVEN_PACKAGE_SOURCE), *CONVERSIONS[0], prune)
+    digest = depgraph_digest(memory.graph().model_dump(), "org")
+    assert depgraph_digest(memory, "org") == digest
+    assert depgraph_digest(sqlite, "org") == digest
+
+    with sqlite.request_body() as f:
+        assert json.load(f) == memory.graph().model_dump()
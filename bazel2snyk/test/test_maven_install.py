@@ -0,0 +1,125 @@
+import os
+import pytest
+from bazel2snyk import maven_install
+from bazel2snyk.maven_install import artifact_label
+from bazel2snyk.maven_install import load_maven_install
+from bazel2snyk.maven_install import merge_maven_install
+from bazel2snyk.maven_install import parse_maven_install
+from bazel2snyk.rules import load_rules_index
+from bazel2snyk.rules import subset_rules_index
+from bazel2snyk.test import MAVEN_BAZEL_FIRST_PARTY_XML_FILE
+from bazel2snyk.test import MAVEN_BAZEL_XML_FILE
+from bazel2snyk.test import MAVEN_INSTALL_JSON_FILE
+
+GUAVA = "@maven//:com_google_guava_guava"
+
+
+def rule_deps_and_tags(rule):
+    return rule.lists.get("deps"), rule.lists.get("tags")
+
+
+def test_artifact_label():
+    assert artifact_label("com.google.guava:guava") == GUAVA
+    assert (
+        artifact_label("io.netty:netty-transport-native-epoll:jar:linux-x86_64")
+        == "@maven//:io_netty_netty_transport_native_epoll_linux_x86_64"
+    )
+    assert artifact_label("org.foo:bar", "@maven_alt") == "@maven_alt//:org_foo_bar"
+
+
+def test_parse_maven_install_v1():
+    rules = parse_maven_install(
+        {
+            "dependency_tree": {
+                "dependencies": [
+                    {
+                        "coord": "com.google.guava:guava:28.0-jre",
+                        "directDependencies": ["com.google.guava:failureaccess:1.0.1"],
+                    },
+                    {"coord": "com.google.guava:failureaccess:1.0.1"},
+                ],
+                "version": "0.1.0",
+            }
+        }
+    )
+    assert rules[GUAVA].lists == {
+        "tags": ["maven_coordinates=com.google.guava:guava:28.0-jre"],
+        "deps": ["@maven//:com_google_guava_failureaccess"],
+    }
+    assert rules["@maven//:com_google_guava_failureaccess"].lists["deps"] == []
+
+
+def test_merged_lockfile_matches_query_output():
+    """
+    Test that first-party query output plus the lockfile gives the
+    same closure and rules as the full query output
+    """
+    full_index = load_rules_index(MAVEN_BAZEL_XML_FILE)
+    lockfile = load_maven_install(MAVEN_INSTALL_JSON_FILE)
+    merged = merge_maven_install(
+        load_rules_index(MAVEN_BAZEL_FIRST_PARTY_XML_FILE), lockfile
+    )
+    subset = subset_rules_index(merged, ["//:java-maven-lib"], lockfile.closures)
+
+    assert set(subset) == set(subset_rules_index(full_index, ["//:java-maven-lib"]))
+    for name, rule in subset.items():
+        assert rule_deps_and_tags(rule) == rule_deps_and_tags(full_index[name])
+
+
+def test_closures_computed_once_per_lockfile(tmp_path, monkeypatch):
+    monkeypatch.setattr(maven_install, "_loaded", {})
+    lockfile = load_maven_install(MAVEN_INSTALL_JSON_FILE, cache_dir=str(tmp_path))
+    assert GUAVA in lockfile.closures[GUAVA]
+    assert load_maven_install(MAVEN_INSTALL_JSON_FILE) is lockfile
+    assert len(os.listdir(tmp_path)) == 1
+
+    # a later process loads the closures from the cache directory
+    monkeypatch.setattr(maven_install, "_loaded", {})
+    monkeypatch.setattr(
+        maven_install,
+        "artifact_closures",
+        lambda rules_index: pytest.fail("closures recomputed"),
+    )
+    cached = load_maven_install(MAVEN_INSTALL_JSON_FILE, cache_dir=str(tmp_path))
+    assert cached == lockfile
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        maven_install.MAVEN_INSTALL_CACHE_MAGIC + b"v1\n\x80\x05}\x94.",
+        maven_install.MAVEN_INSTALL_CACHE_MAGIC + b'v2\n{"digest": "other"}',
+        maven_install.MAVEN_INSTALL_CACHE_MAGIC + b'v2\n{"rules": [[]]}',
+        b"not a cache file",
+    ],
+)
+def test_cache_of_another_format_is_ignored(tmp_path, monkeypatch, content):
+    """
+    Test that a cache file of another format version, of another lockfile
+    or malformed is never trusted, and is replaced
+    """
+    monkeypatch.setattr(maven_install, "_loaded", {})
+    lockfile = load_maven_install(MAVEN_INSTALL_JSON_FILE, cache_dir=str(tmp_path))
+    (cache_path,) = tmp_path.iterdir()
+    cache_path.write_bytes(content)
+
+    monkeypatch.setattr(maven_install, "_loaded", {})
+    assert load_maven_install(MAVEN_INSTALL_JSON_FILE, cache_dir=str(tmp_path)) == (
+        lockfile
+    )
+    assert cache_path.read_bytes().startswith(
+        maven_install.MAVEN_INSTALL_CACHE_MAGIC + b"v2\n"
+    )
+
+
+def test_cache_dir_not_writable(tmp_path, monkeypatch):
+    """
+    Test that a cache directory that cannot be written leaves the closures
+    uncached rather than failing the conversion
+    """
+    monkeypatch.setattr(maven_install, "_loaded", {})
+    (tmp_path / "home").write_text("not a directory")
+    lockfile = load_maven_install(
+        MAVEN_INSTALL_JSON_FILE, cache_dir=str(tmp_path / "home" / "cache")
+    )
+    assert GUAVA in lockfile.closures[GUAVA]
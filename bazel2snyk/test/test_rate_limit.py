@@ -0,0 +1,137 @@
+import os
+import time
+import pytest
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from snyk.errors import SnykHTTPError
+from bazel2snyk.client import DEPGRAPH_BASE_MONITOR_URL
+from bazel2snyk.client import SessionSnykClient
+from bazel2snyk.rate_limit import DEFAULT_RATE_LIMIT_FILE
+from bazel2snyk.rate_limit import RateLimiter
+from bazel2snyk.rate_limit import retry_after
+from bazel2snyk.test.fixtures.snyk_api import StubSnykApi
+
+BODY = {
+    "depGraph": {
+        "pkgManager": {"name": "maven"},
+        "pkgs": [{"id": "app@1.0.0", "info": {"name": "app", "version": "1.0.0"}}],
+    }
+}
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_rate_limiter(tmp_path):
+    """
+    Test that limiters sharing a file share one bucket, and a deferral holds
+    back every one of them
+    """
+    clock = FakeClock()
+    path = str(tmp_path / "rate-limit")
+    first, second = (
+        RateLimiter(10, burst=2, path=path, clock=clock, sleep=clock.sleep)
+        for _ in range(2)
+    )
+
+    assert first.acquire() == 0
+    assert second.acquire() == 0
+    assert first.acquire() == pytest.approx(0.1)
+    assert second.acquire() == pytest.approx(0.1)
+
+    first.defer(2)
+    assert second.acquire() == pytest.approx(2.1)
+    assert clock.now == pytest.approx(1002.3)
+
+    assert first.metrics() == {
+        "requests": 2,
+        "waits": 1,
+        "wait_seconds": 0.1,
+        "max_wait_seconds": 0.1,
+        "rate_limited": 1,
+    }
+    assert second.metrics()["wait_seconds"] == 2.2
+
+
+def test_default_rate_limit_file_per_user():
+    """
+    Test that users sharing the temporary directory get a file each, as
+    the file is created readable and writable by its owner alone
+    """
+    assert DEFAULT_RATE_LIMIT_FILE.endswith(f"-{os.getuid()}")
+
+
+def test_retry_after():
+    resp = requests.Response()
+    assert retry_after(resp) == 1.0
+    resp.headers["Retry-After"] = "3"
+    assert retry_after(resp) == 3.0
+    resp.headers["Retry-After"] = formatdate(time.time() + 60, usegmt=True)
+    assert 55 < retry_after(resp) <= 60
+
+
+def post_all(snyk_api, rate_limit_file, count, workers, rate=20):
+    """
+    POST count depGraphs from workers clients, each with its own limiter
+    of rate on rate_limit_file if set, and return the number that failed
+    """
+
+    def post(i):
+        rate_limiter = None
+        if rate_limit_file:
+            rate_limiter = RateLimiter(rate, path=rate_limit_file)
+        client = SessionSnykClient(
+            "stub-token", url=snyk_api.url, rate_limiter=rate_limiter
+        )
+        failed = 0
+        for _ in range(count // workers):
+            try:
+                client.post(f"{DEPGRAPH_BASE_MONITOR_URL}stub-org", BODY)
+            except SnykHTTPError:
+                failed += 1
+        return failed
+
+    with ThreadPoolExecutor(workers) as executor:
+        return sum(executor.map(post, range(workers)))
+
+
+def test_rate_limited_posts(tmp_path):
+    """
+    Test that clients sharing a limiter stay within the API's quota
+    without failures, and near its throughput
+    """
+    with StubSnykApi(quota=(20, 2)) as snyk_api:
+        assert post_all(snyk_api, None, 30, 3) > 0
+
+    with StubSnykApi(quota=(20, 2)) as snyk_api:
+        start = time.perf_counter()
+        assert post_all(snyk_api, str(tmp_path / "rate-limit"), 30, 3) == 0
+        elapsed = time.perf_counter() - start
+
+    assert len(snyk_api.requests) == 30
+    # 29 requests after the first at 20/s, with slack for a Retry-After
+    assert 1.4 < elapsed < 3
+
+
+def test_rate_limited_posts_retry_after(tmp_path):
+    """
+    Test that requests rejected by the API's quota are retried after the
+    Retry-After
+    """
+    with StubSnykApi(quota=(20, 2)) as snyk_api:
+        start = time.perf_counter()
+        assert post_all(snyk_api, str(tmp_path / "rate-limit"), 4, 1, 1000) == 0
+        elapsed = time.perf_counter() - start
+
+    assert len(snyk_api.requests) == 4
+    assert snyk_api.rate_limited >= 1
+    assert elapsed >= 1
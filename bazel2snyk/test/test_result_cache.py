@@ -0,0 +1,90 @@
+import os
+import pytest
+import time
+from bazel2snyk.cli import load_file
+from bazel2snyk.converter import Converter
+from bazel2snyk.result_cache import ResultCache
+from bazel2snyk.result_cache import depgraph_digest
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+
+
+def maven_body(target: str) -> dict:
+    converter = Converter.from_xml(load_file(POLYGLOT_BAZEL_XML_FILE))
+    return converter.convert(target)["maven"].graph().model_dump()
+
+
+def test_depgraph_digest():
+    """
+    Test that the digest ignores the root and the order of pkgs and edges
+    """
+    body = maven_body("//:java-maven-lib")
+    digest = depgraph_digest(body, "org")
+
+    reordered = maven_body("//:java-maven-lib")
+    reordered["depGraph"]["pkgs"].reverse()
+    reordered["depGraph"]["graph"]["nodes"].reverse()
+    for node in reordered["depGraph"]["graph"]["nodes"]:
+        node["deps"].reverse()
+    assert depgraph_digest(reordered, "org") == digest
+
+    renamed = maven_body("//:java-maven-lib")
+    renamed["depGraph"]["pkgs"][0]["id"] = "//other:target@bazel"
+    renamed["depGraph"]["graph"]["rootNodeId"] = "//other:target@bazel"
+    renamed["depGraph"]["graph"]["nodes"][0]["nodeId"] = "//other:target@bazel"
+    renamed["depGraph"]["graph"]["nodes"][0]["pkgId"] = "//other:target@bazel"
+    assert depgraph_digest(renamed, "org") == digest
+
+    assert depgraph_digest(body, "other-org") != digest
+    assert depgraph_digest(maven_body("//:polyglot"), "org") != digest
+
+
+def test_result_cache_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path), ttl=60)
+    assert cache.get("key") is None
+    cache.put("key", {"ok": False})
+    assert cache.get("key") == {"ok": False}
+
+    expired = time.time() - 120
+    os.utime(tmp_path / "key.json", (expired, expired))
+    cache.ttl = 0
+    assert cache.get("key") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert not (tmp_path / "key.json").exists()
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10**6)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, {"payload": "x" * 1000})
+        os.utime(tmp_path / f"{key}.json", (time.time() - 10 + i,) * 2)
+
+    # reading a makes b the least recently used
+    assert cache.get("a") is not None
+    cache.max_bytes = 2500
+    cache.put("d", {"ok": True})
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "c.json", "d.json"]
+
+
+def test_result_cache_put_not_writable(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    os.rmdir(tmp_path / "cache")
+    cache.put("key", {"ok": True})
+    assert cache.get("key") is None
+
+
+def test_result_cache_put_replace_fails(tmp_path):
+    (tmp_path / "key.json").mkdir()
+    cache = ResultCache(str(tmp_path))
+    cache.put("key", {"ok": True})
+    assert os.listdir(tmp_path) == ["key.json"]
+
+
+@pytest.mark.parametrize(
+    "entry", ["[]", '{"response": {}}', '{"created": "now", "response": {}}', "{"]
+)
+def test_result_cache_malformed_entry(tmp_path, entry):
+    (tmp_path / "key.json").write_text(entry)
+    cache = ResultCache(str(tmp_path))
+    assert cache.get("key") is None
+    assert cache.misses == 1
+    assert not (tmp_path / "key.json").exists()
@@ -0,0 +1,103 @@
+from bazel2snyk.converter import Converter
+from bazel2snyk.reverse_index import ReverseDependency
+from bazel2snyk.reverse_index import reverse_dependencies
+from bazel2snyk.reverse_index import top_level_targets
+from bazel2snyk.reverse_index import who_depends
+from bazel2snyk.reverse_index import write_reverse_index
+from bazel2snyk.rules import BazelRule
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+
+BUILD_LOCATION = "/workspace/BUILD:1:1"
+
+
+def rule(name, deps, tags=()):
+    return BazelRule(
+        name=name,
+        rule_class="java_library",
+        location=BUILD_LOCATION,
+        lists={"deps": list(deps), "tags": list(tags)},
+        strings={},
+    )
+
+
+def diamond_converter():
+    """
+    //app:main depends on guava through //a:a and //b:b,
+    and //tools:gen on its own
+    """
+    rules = [
+        rule("//app:main", ["//a:a", "//b:b"]),
+        rule("//a:a", ["@maven//:com_google_guava_guava"]),
+        rule("//b:b", ["@maven//:com_google_guava_guava"]),
+        rule("//tools:gen", ["@maven//:com_google_guava_guava"]),
+        rule(
+            "@maven//:com_google_guava_guava",
+            [],
+            ["maven_coordinates=com.google.guava:guava:28.0-jre"],
+        ),
+    ]
+    return Converter({x.name: x for x in rules})
+
+
+def test_top_level_targets():
+    assert top_level_targets(diamond_converter()) == ["//app:main", "//tools:gen"]
+    assert top_level_targets(
+        Converter.from_file(POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"])
+    ) == ["//:polyglot"]
+
+
+def test_top_level_targets_skip_repository_rules():
+    """
+    Test that repository rules under //external: are not top-level targets
+    """
+    rules = [
+        rule("//app:main", ["@com_github_pkg_errors//:errors"]),
+        rule("@com_github_pkg_errors//:errors", [])._replace(rule_class="go_library"),
+        BazelRule(
+            name="//external:com_github_pkg_errors",
+            rule_class="go_repository",
+            location="/workspace/WORKSPACE:10:14",
+            lists={},
+            strings={"importpath": "github.com/pkg/errors", "version": "v0.9.1"},
+        ),
+        BazelRule(
+            name="//external:maven",
+            rule_class="coursier_fetch",
+            location="/workspace/WORKSPACE:20:14",
+            lists={},
+            strings={},
+        ),
+    ]
+    converter = Converter({x.name: x for x in rules}, package_sources=["go"])
+    assert top_level_targets(converter) == ["//app:main"]
+
+
+def test_reverse_dependencies_count_paths():
+    assert list(reverse_dependencies(diamond_converter())) == [
+        ReverseDependency(
+            "com.google.guava:guava@28.0-jre",
+            "maven",
+            "@maven//:com_google_guava_guava",
+            "//app:main",
+            2,
+        ),
+        ReverseDependency(
+            "com.google.guava:guava@28.0-jre",
+            "maven",
+            "@maven//:com_google_guava_guava",
+            "//tools:gen",
+            1,
+        ),
+    ]
+
+
+def test_who_depends(tmp_path):
+    index_file = str(tmp_path / "index.sqlite")
+    assert (
+        write_reverse_index(reverse_dependencies(diamond_converter()), index_file) == 2
+    )
+
+    by_version = who_depends(index_file, "com.google.guava:guava@28.0-jre")
+    assert [x.target for x in by_version] == ["//app:main", "//tools:gen"]
+    assert who_depends(index_file, "com.google.guava:guava") == by_version
+    assert who_depends(index_file, "com.google.guava:guava@31.1-jre") == []
@@ -0,0 +1,88 @@
+from bazel2snyk.sharding import merge_test_responses
+from bazel2snyk.sharding import shard_dep_graph
+
+
+def shared_dep_body() -> dict:
+    """
+    a depends on c, b depends on c and d
+    """
+    deps = {"root-node": ["a@1", "b@1"], "a@1": ["c@1"], "b@1": ["c@1", "d@1"]}
+    return {
+        "depGraph": {
+            "schemaVersion": "1.2.0",
+            "pkgManager": {"name": "maven"},
+            "pkgs": [
+                {"id": pkg_id, "info": {"name": pkg_id[:-2], "version": "1"}}
+                for pkg_id in ("app@1.0.0", "a@1", "b@1", "c@1", "d@1")
+            ],
+            "graph": {
+                "rootNodeId": "root-node",
+                "nodes": [
+                    {
+                        "nodeId": node_id,
+                        "pkgId": "app@1.0.0" if node_id == "root-node" else node_id,
+                        "deps": [{"nodeId": x} for x in deps.get(node_id, [])],
+                    }
+                    for node_id in ("root-node", "a@1", "b@1", "c@1", "d@1")
+                ],
+            },
+        }
+    }
+
+
+def test_shard_dep_graph():
+    """
+    Test that shards keep the root, split its subtrees and repeat shared nodes
+    """
+    body = shared_dep_body()
+    shards = shard_dep_graph(body, 4)
+
+    assert len(shards) == 2
+    nodes = [
+        {
+            x["nodeId"]: [d["nodeId"] for d in x["deps"]]
+            for x in shard["depGraph"]["graph"]["nodes"]
+        }
+        for shard in shards
+    ]
+    assert nodes == [
+        {"root-node": ["b@1"], "b@1": ["c@1", "d@1"], "c@1": [], "d@1": []},
+        {"root-node": ["a@1"], "a@1": ["c@1"], "c@1": []},
+    ]
+    assert [x["id"] for x in shards[1]["depGraph"]["pkgs"]] == [
+        "app@1.0.0",
+        "a@1",
+        "c@1",
+    ]
+    assert shard_dep_graph(body, 1) == [body]
+
+
+def test_merge_test_responses():
+    """
+    Test that merged responses report each issue once and fail if any shard fails
+    """
+    issue = {"issueId": "SNYK-1", "pkgName": "c", "pkgVersion": "1"}
+    responses = [
+        {
+            "ok": False,
+            "packageManager": "maven",
+            "issuesData": {"SNYK-1": {}},
+            "issues": [issue],
+        },
+        {
+            "ok": False,
+            "packageManager": "maven",
+            "issuesData": {"SNYK-1": {}},
+            "issues": [issue],
+        },
+        {"ok": True, "packageManager": "maven", "issuesData": {}, "issues": []},
+    ]
+    merged = merge_test_responses(responses)
+
+    assert merged == {
+        "ok": False,
+        "packageManager": "maven",
+        "issuesData": {"SNYK-1": {}},
+        "issues": [issue],
+    }
+    assert merge_test_responses(responses[2:] * 2)["ok"] is True
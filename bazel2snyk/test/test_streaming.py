@@ -0,0 +1,69 @@
+import json
+from bazel2snyk.streaming import iter_dict_members
+from bazel2snyk.streaming import iter_response_members
+from bazel2snyk.streaming import merge_test_summaries
+from bazel2snyk.streaming import response_ok
+from bazel2snyk.streaming import summarize_test_response
+
+vulnerable_response = {
+    "ok": False,
+    "packageManager": "pip",
+    "issuesData": {
+        "SNYK-1": {"id": "SNYK-1", "severity": "high", "title": 'ReDoS "quoted"'},
+        "SNYK-2": {"id": "SNYK-2", "severity": "low", "title": "Ünïcode"},
+    },
+    "issues": [
+        {"pkgName": "click", "pkgVersion": "8.1.3", "issueId": "SNYK-1"},
+        {"pkgName": "idna", "pkgVersion": "3.4", "issueId": "SNYK-2"},
+        {"pkgName": "idna", "pkgVersion": "3.4", "issueId": "SNYK-2"},
+    ],
+    "remediation": {},
+    "meta": [],
+}
+
+
+def test_iter_response_members():
+    """
+    Test that members parsed from chunks of any size match the parsed response
+    """
+    data = json.dumps(vulnerable_response, indent=4, ensure_ascii=False).encode()
+    expected = list(iter_dict_members(vulnerable_response))
+
+    for chunk_size in (1, 2, 7, len(data)):
+        chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+        assert list(iter_response_members(chunks)) == expected
+
+
+def test_response_ok():
+    """
+    Test that ok is found before or after the issues
+    """
+    ok_last = {k: v for k, v in vulnerable_response.items() if k != "ok"}
+    ok_last["ok"] = True
+    assert response_ok(iter_dict_members(vulnerable_response)) is False
+    assert response_ok(iter_dict_members(ok_last)) is True
+    assert response_ok(iter_dict_members({"issues": []})) is False
+
+
+def test_summarize_test_response():
+    """
+    Test that a summary lists each issue with its severity and packages
+    """
+    summary = summarize_test_response(iter_dict_members(vulnerable_response))
+
+    assert summary == {
+        "ok": False,
+        "issues": {
+            "SNYK-1": {
+                "severity": "high",
+                "title": 'ReDoS "quoted"',
+                "pkgs": ["click@8.1.3"],
+            },
+            "SNYK-2": {"severity": "low", "title": "Ünïcode", "pkgs": ["idna@3.4"]},
+        },
+    }
+
+    merged = merge_test_summaries([summary, {"ok": True, "issues": {}}, summary])
+    assert merged["ok"] is False
+    assert merged["issueCount"] == 2
+    assert merged["issues"] == summary["issues"]
@@ -0,0 +1,73 @@
+import io
+import json
+from bazel2snyk.budget import TraversalBudget
+from bazel2snyk.converter import Converter
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+from bazel2snyk.tree import render_tree
+from bazel2snyk.tree import write_dependency_tree
+
+GRAPH = {
+    "//:app": ["//a:lib", "//b:lib"],
+    "//a:lib": ["@maven//:guava", "//c:lib"],
+    "//b:lib": ["//c:lib"],
+    "//c:lib": ["@maven//:guava"],
+}
+
+
+def render(**kwargs) -> str:
+    out = io.StringIO()
+    render_tree("//:app", lambda x: GRAPH.get(x, []), str.upper, out, **kwargs)
+    return out.getvalue()
+
+
+def test_render_tree():
+    """
+    Test that repeated subtrees are expanded once and marked after
+    """
+    assert render() == (
+        "//:APP\n"
+        "+- //A:LIB\n"
+        "|  +- @MAVEN//:GUAVA\n"
+        "|  \\- //C:LIB\n"
+        "|     \\- @MAVEN//:GUAVA\n"
+        "\\- //B:LIB\n"
+        "   \\- //C:LIB (*)\n"
+    )
+
+
+def test_render_tree_max_depth():
+    assert render(max_depth=1) == "//:APP\n+- //A:LIB\n\\- //B:LIB\n"
+
+
+def test_render_tree_jsonl():
+    rows = [json.loads(x) for x in render(output_format="jsonl").splitlines()]
+    assert rows[0] == {
+        "depth": 0,
+        "name": "//:APP",
+        "label": "//:app",
+        "parent": None,
+        "repeated": False,
+        "truncated": False,
+    }
+    assert [(x["label"], x["parent"], x["repeated"]) for x in rows[-2:]] == [
+        ("//b:lib", "//:app", False),
+        ("//c:lib", "//b:lib", True),
+    ]
+
+
+def test_write_dependency_tree_truncated():
+    """
+    Test that the tree of a limited traversal only follows the edges it
+    traversed and marks where it cut
+    """
+    converter = Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"]
+    )
+    budget = TraversalBudget(max_nodes=5)
+    bazel2snyk = converter.traverse("//:polyglot", budget)
+    out = io.StringIO()
+    write_dependency_tree(bazel2snyk, "//:polyglot", out, output_format="jsonl")
+    rows = [json.loads(x) for x in out.getvalue().splitlines()]
+
+    assert {x["label"] for x in rows} <= budget.nodes
+    assert {x["label"] for x in rows if x["truncated"]} == set(budget.cuts)
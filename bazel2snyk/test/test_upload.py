@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+from bazel2snyk.client import DEPGRAPH_BASE_MONITOR_URL
+from bazel2snyk.client import DEPGRAPH_BASE_TEST_URL
+from bazel2snyk.client import SessionSnykClient
+from bazel2snyk.converter import Converter
+from bazel2snyk.rules import BazelRule
+from bazel2snyk.test import POLYGLOT_BAZEL_XML_FILE
+from bazel2snyk.test.fixtures.snyk_api import StubSnykApi
+from bazel2snyk.upload import status_table
+from bazel2snyk.upload import upload_targets
+
+TARGETS = ["//:java-maven-lib", "//snyk/scripts/cli:main", "//missing:target"]
+
+
+def polyglot_converter():
+    return Converter.from_file(
+        POLYGLOT_BAZEL_XML_FILE, package_sources=["maven", "pip"]
+    )
+
+
+def test_upload_targets():
+    """
+    Test that every non-empty depGraph is uploaded and reported per target
+    """
+    with StubSnykApi() as snyk_api:
+        snyk_client = SessionSnykClient("stub-token", url=snyk_api.url)
+        statuses = asyncio.run(
+            upload_targets(
+                polyglot_converter(),
+                TARGETS,
+                snyk_client,
+                f"{DEPGRAPH_BASE_TEST_URL}stub-org",
+                upload_workers=2,
+                queue_size=1,
+            )
+        )
+
+    assert snyk_api.paths() == ["/v1/test/dep-graph"] * 2
+    assert [x["target"] for x in statuses] == TARGETS
+    java, cli, missing = statuses
+    assert list(java["uploads"]) == ["maven"]
+    assert java["uploads"]["maven"]["ok"] is True
+    assert list(cli["uploads"]) == ["pip"]
+    assert cli["uploads"]["pip"]["issues"] == 1
+    assert "No dependencies found" in missing["error"]
+
+    table = status_table(statuses).splitlines()
+    assert table[0].split() == ["target", "source", "convert_s", "upload_s", "status"]
+    assert table[1].endswith("  ok")
+    assert table[2].endswith("  1 issue(s)")
+
+
+def test_upload_targets_convert_processes():
+    """
+    Test that targets converted in several processes upload the same
+    """
+    with StubSnykApi() as snyk_api:
+        snyk_client = SessionSnykClient("stub-token", url=snyk_api.url)
+        statuses = asyncio.run(
+            upload_targets(
+                polyglot_converter(),
+                TARGETS,
+                snyk_client,
+                f"{DEPGRAPH_BASE_TEST_URL}stub-org",
+                convert_workers=2,
+            )
+        )
+
+    assert sorted(
+        x["body"]["depGraph"]["pkgManager"]["name"] for x in snyk_api.requests
+    ) == [
+        "maven",
+        "pip",
+    ]
+    java, cli, missing = statuses
+    assert java["uploads"]["maven"]["ok"] is True
+    assert cli["uploads"]["pip"]["issues"] == 1
+    assert "No dependencies found" in missing["error"]
+
+
+class FailingConverter(Converter):
+    def convert(self, bazel_target, **kwargs):
+        if bazel_target == "//:java-maven-lib":
+            raise RuntimeError("store is full")
+        return super().convert(bazel_target, **kwargs)
+
+
+class FailingClient(object):
+    def post(self, path, body):
+        raise RuntimeError("connection pool is closed")
+
+
+def test_upload_targets_failures():
+    """
+    Test that unexpected conversion and upload failures are recorded per
+    target rather than losing every status
+    """
+    converter = FailingConverter(polyglot_converter().rules_index, ["maven", "pip"])
+    statuses = asyncio.run(
+        upload_targets(converter, TARGETS[:2], FailingClient(), DEPGRAPH_BASE_TEST_URL)
+    )
+
+    java, cli = statuses
+    assert java["error"] == "RuntimeError: store is full"
+    assert cli["uploads"]["pip"] == {
+        "ok": False,
+        "error": "RuntimeError: connection pool is closed",
+    }
+    table = status_table(statuses).splitlines()
+    assert table[1].endswith("RuntimeError: store is full")
+    assert table[2].endswith("error: RuntimeError: connection pool is closed")
+
+
+class SlowClient(object):
+    """
+    Client whose POSTs take a while, counting those completed
+    """
+
+    def __init__(self, snyk_client):
+        self.snyk_client = snyk_client
+        self.completed = 0
+        self.lock = threading.Lock()
+
+    def post(self, path, body):
+        time.sleep(0.05)
+        resp = self.snyk_client.post(path, body)
+        with self.lock:
+            self.completed += 1
+        return resp
+
+
+class CountingConverter(Converter):
+    """
+    Converter recording how many uploads had completed at each conversion
+    """
+
+    def __init__(self, client, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = client
+        self.started = []
+
+    def convert(self, bazel_target, **kwargs):
+        self.started.append(self.client.completed)
+        return super().convert(bazel_target, **kwargs)
+
+
+def test_upload_targets_backpressure():
+    """
+    Test that conversion pauses while the uploaders are behind
+    """
+    rules_index = dict(polyglot_converter().rules_index)
+    targets = [f"//app{i}:main" for i in range(8)]
+    for target in targets:
+        rules_index[target] = BazelRule(
+            name=target,
+            rule_class="java_binary",
+            location="/workspace/BUILD:1:1",
+            lists={"deps": ["//:java-maven-lib"]},
+            strings={},
+        )
+    with StubSnykApi() as snyk_api:
+        client = SlowClient(SessionSnykClient("stub-token", url=snyk_api.url))
+        converter = CountingConverter(client, rules_index)
+        statuses = asyncio.run(
+            upload_targets(
+                converter,
+                targets,
+                client,
+                f"{DEPGRAPH_BASE_MONITOR_URL}stub-org",
+                upload_workers=1,
+                queue_size=1,
+            )
+        )
+
+    assert len(snyk_api.requests) == len(statuses) == 8
+    # one depGraph queued, one uploading and one converting at most
+    for i, completed in enumerate(converter.started):
+        assert i - completed <= 2
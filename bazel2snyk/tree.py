@@ -0,0 +1,119 @@
+import json
+from typing import Callable
+from typing import IO
+from typing import List
+from bazel2snyk.bazel import BazelNodeType
+
+# output formats of --print-deps
+TREE_FORMATS = ("text", "jsonl")
+
+# lines handed to the writer at a time
+WRITE_BATCH_LINES = 1024
+
+
+def render_tree(
+    root: str,
+    get_children: Callable[[str], List[str]],
+    get_name: Callable[[str], str],
+    out: IO,
+    max_depth: int = None,
+    output_format: str = "text",
+    is_truncated: Callable[[str], bool] = None,
+):
+    """
+    Write the tree of nodes below root to out, expanding each node once.
+    Later occurrences of a node with children are marked (*), like mvn
+    dependency:tree does, so the output is linear in the unique nodes.
+    Nodes deeper than max_depth below root are left out, and nodes for
+    which is_truncated is true are marked (truncated).
+
+    text draws the tree with +- and \\- branches, jsonl writes a JSON
+    object per line with the depth, name, label, parent, whether the
+    node was repeated and whether it was truncated.
+    """
+    if output_format not in TREE_FORMATS:
+        raise ValueError(f"Allowable tree formats are {','.join(TREE_FORMATS)}")
+
+    lines = []
+    expanded = set()
+    # node, its parent, depth, prefix of its line and of its children's
+    stack = [(root, None, 0, "", "")]
+    while stack:
+        node, parent, depth, prefix, child_prefix = stack.pop()
+        children = get_children(node)
+        repeated = bool(children) and node in expanded
+        truncated = bool(is_truncated and is_truncated(node))
+        if output_format == "text":
+            marks = (" (*)" if repeated else "") + (" (truncated)" if truncated else "")
+            lines.append(f"{prefix}{get_name(node)}{marks}\n")
+        else:
+            row = {
+                "depth": depth,
+                "name": get_name(node),
+                "label": node,
+                "parent": parent,
+                "repeated": repeated,
+                "truncated": truncated,
+            }
+            lines.append(json.dumps(row) + "\n")
+        if len(lines) >= WRITE_BATCH_LINES:
+            # one write per batch, also to line buffered streams
+            out.write("".join(lines))
+            lines.clear()
+
+        if repeated or not children or (max_depth is not None and depth >= max_depth):
+            continue
+        expanded.add(node)
+        last = len(children) - 1
+        for i, child in reversed(list(enumerate(children))):
+            stack.append(
+                (
+                    child,
+                    node,
+                    depth + 1,
+                    child_prefix + ("\\- " if i == last else "+- "),
+                    child_prefix + ("   " if i == last else "|  "),
+                )
+            )
+    out.write("".join(lines))
+
+
+def write_dependency_tree(
+    bazel2snyk, bazel_target: str, out: IO, max_depth: int = None, **kwargs
+):
+    """
+    Write the bazel dependency structure of a traversed target to out,
+    naming each node by its Snyk package id, see render_tree(). If the
+    traversal was limited, the tree follows only the edges it traversed
+    and marks the nodes it cut.
+    """
+    bazel_xml_parser = bazel2snyk.bazel_xml_parser
+    cuts = bazel2snyk.budget.cuts if bazel2snyk.budget else {}
+    # bazel nodes of other types, such as source files, are not listed
+    node_types = (
+        BazelNodeType.INTERNAL_TARGET,
+        BazelNodeType.EXTERNAL_TARGET,
+        BazelNodeType.DEPENDENCY,
+    )
+
+    children = {}
+
+    def get_children(node: str) -> List[str]:
+        if node not in children:
+            skipped = set(cuts[node]["skipped"]) if node in cuts else set()
+            children[node] = [
+                x
+                for x in bazel_xml_parser.get_children_from_rule(node)
+                if bazel_xml_parser.get_node_type(x) in node_types and x not in skipped
+            ]
+        return children[node]
+
+    render_tree(
+        bazel_target,
+        get_children,
+        bazel2snyk.snyk_dep_id,
+        out,
+        max_depth=max_depth,
+        is_truncated=cuts.__contains__,
+        **kwargs,
+    )
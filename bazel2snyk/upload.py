@@ -0,0 +1,197 @@
+import asyncio
+import os
+import tempfile
+import time
+import requests
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+from snyk import SnykClient
+from snyk.errors import SnykHTTPError
+from bazel2snyk import logger
+from bazel2snyk.converter import Converter
+from bazel2snyk.converter import NoDependenciesFoundError
+from bazel2snyk.depgraph import spool_json
+
+# put on the queue once per uploader when every target is converted
+_DONE = None
+
+# converter of a conversion worker process, see _init_convert_worker()
+_worker_converter = None
+
+
+def _convert(
+    converter: Converter, target: str, kwargs: Dict[str, Any]
+) -> Tuple[Dict[str, str], float]:
+    """
+    Convert target and spool the request bodies of its non-empty
+    depGraphs to temporary files, so the DepGraphs themselves can be freed.
+    Returns the paths of the files, which the uploader removes.
+    """
+    start = time.perf_counter()
+    dep_graphs = converter.convert(target, **kwargs)
+    bodies = {}
+    for source, dep_graph in dep_graphs.items():
+        if not dep_graph.is_empty():
+            fd, bodies[source] = tempfile.mkstemp(prefix="depgraph-", suffix=".json")
+            with os.fdopen(fd, "wb") as f:
+                spool_json(dep_graph.serializable(), f)
+    return bodies, time.perf_counter() - start
+
+
+def _init_convert_worker(converter: Converter):
+    global _worker_converter
+    _worker_converter = converter
+
+
+def _convert_in_worker(
+    target: str, kwargs: Dict[str, Any]
+) -> Tuple[Dict[str, str], float]:
+    return _convert(_worker_converter, target, kwargs)
+
+
+def _upload(snyk_client: SnykClient, path: str, body_path: str) -> Dict[str, Any]:
+    """
+    POST a depGraph spooled by _convert() and return the status of the
+    upload, removing the spooled file
+    """
+    start = time.perf_counter()
+    try:
+        with open(body_path, "rb") as body:
+            response = snyk_client.post(path, body).json()
+        status = {"ok": bool(response.get("ok"))}
+        if "issues" in response:
+            status["issues"] = len(response["issues"])
+        if "uri" in response:
+            status["uri"] = response["uri"]
+    except (SnykHTTPError, requests.RequestException, ValueError) as e:
+        logger.error(e)
+        status = {"ok": False, "error": str(e) or type(e).__name__}
+    finally:
+        os.remove(body_path)
+    status["upload_s"] = round(time.perf_counter() - start, 3)
+    return status
+
+
+async def upload_targets(
+    converter: Converter,
+    targets: List[str],
+    snyk_client: SnykClient,
+    path: str,
+    convert_workers: int = 1,
+    upload_workers: int = 4,
+    queue_size: int = 4,
+    **kwargs,
+) -> List[Dict[str, Any]]:
+    """
+    Convert targets and POST their depGraphs to path, overlapping the
+    conversion of the next targets with the upload of the previous ones.
+    Conversion holds the GIL, so with convert_workers > 1 targets are
+    converted in as many processes, each with its own copy of converter.
+    Converted depGraphs are spooled to temporary files that wait in a
+    queue of queue_size, so conversion stays at most queue_size targets
+    ahead of the uploads, and only the DepGraphs being converted are held
+    in memory.
+    Returns a status per target, with an upload per package source.
+    kwargs are passed to Converter.convert().
+    """
+    loop = asyncio.get_running_loop()
+    statuses = {x: {"target": x, "uploads": {}} for x in targets}
+    pending = iter(statuses)
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    if convert_workers > 1:
+        convert_executor = ProcessPoolExecutor(
+            convert_workers, initializer=_init_convert_worker, initargs=(converter,)
+        )
+        convert_args = (_convert_in_worker,)
+    else:
+        # a single conversion still overlaps the uploads, which wait on I/O
+        convert_executor = ThreadPoolExecutor(1)
+        convert_args = (_convert, converter)
+    upload_executor = ThreadPoolExecutor(upload_workers)
+    with convert_executor, upload_executor:
+
+        async def convert_worker():
+            for target in pending:
+                try:
+                    bodies, seconds = await loop.run_in_executor(
+                        convert_executor, *convert_args, target, kwargs
+                    )
+                except NoDependenciesFoundError as e:
+                    logger.error(e)
+                    statuses[target]["error"] = str(e)
+                    continue
+                except Exception as e:
+                    # recorded, so the statuses of the other targets are kept
+                    logger.exception(f"Converting {target} failed")
+                    statuses[target]["error"] = f"{type(e).__name__}: {e}"
+                    continue
+                statuses[target]["convert_s"] = round(seconds, 3)
+                logger.debug(f"{target} converted in {seconds:.3f}s")
+                for source, body in bodies.items():
+                    # waits while the uploaders are behind
+                    await queue.put((target, source, body))
+
+        async def convert_all():
+            await asyncio.gather(*(convert_worker() for _ in range(convert_workers)))
+            for _ in range(upload_workers):
+                await queue.put(_DONE)
+
+        async def upload_worker():
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+                target, source, body = item
+                try:
+                    upload = await loop.run_in_executor(
+                        upload_executor, _upload, snyk_client, path, body
+                    )
+                except Exception as e:
+                    logger.exception(f"Uploading {target} failed")
+                    upload = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                statuses[target]["uploads"][source] = upload
+
+        await asyncio.gather(
+            convert_all(), *(upload_worker() for _ in range(upload_workers))
+        )
+
+    return list(statuses.values())
+
+
+def status_table(statuses: List[Dict[str, Any]]) -> str:
+    """
+    Text table of one row per target and package source uploaded
+    """
+    rows = [("target", "source", "convert_s", "upload_s", "status")]
+    for status in statuses:
+        if "error" in status or not status["uploads"]:
+            rows.append(
+                (status["target"], "-", "-", "-", status.get("error", "no uploads"))
+            )
+            continue
+        for source, upload in status["uploads"].items():
+            if "error" in upload:
+                result = f"error: {upload['error']}"
+            elif upload.get("issues"):
+                result = f"{upload['issues']} issue(s)"
+            else:
+                result = "ok" if upload["ok"] else "not ok"
+            rows.append(
+                (
+                    status["target"],
+                    source,
+                    str(status["convert_s"]),
+                    str(upload.get("upload_s", "-")),
+                    result,
+                )
+            )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+    return "\n".join(
+        "  ".join(x.ljust(w) for x, w in zip(row, widths)) + "  " + row[-1]
+        for row in rows
+    )
@@ -0,0 +1,44 @@
+"""
+Benchmark the depGraph size of a large synthetic target with bazel
+targets collapsed to several depths
+
+    poetry run python -m benchmarks.collapse --target-count 1000 --depths 0,2
+
+The payload is the depGraph JSON as sent to the Snyk API.
+"""
+
+import argparse
+import json
+import time
+from benchmarks.graph_store import synthetic_rules_index
+from bazel2snyk.converter import Converter
+from bazel2snyk.depgraph import iter_json
+
+
+def measure(converter: Converter, **kwargs):
+    start = time.perf_counter()
+    dep_graph = converter.convert("//:all", **kwargs)["maven"]
+    elapsed = time.perf_counter() - start
+    size = sum(len(x) for x in iter_json(dep_graph.serializable()))
+    return {
+        "convert_s": round(elapsed, 2),
+        "nodes": dep_graph.node_count(),
+        "json_kb": round(size / 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target-count", type=int, default=1000)
+    parser.add_argument("--depths", default="0,2")
+    args = parser.parse_args()
+
+    converter = Converter(synthetic_rules_index(args.target_count))
+    print(f"{'full':>10}: {json.dumps(measure(converter))}")
+    for depth in map(int, args.depths.split(",")):
+        result = measure(converter, collapse=True, collapse_depth=depth)
+        print(f"{f'depth {depth}':>10}: {json.dumps(result)}")
+
+
+if __name__ == "__main__":
+    main()
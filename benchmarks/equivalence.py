@@ -0,0 +1,83 @@
+"""
+Compare the engine against the frozen reference engine over the query
+output fixtures and random query outputs, and report how much faster it is
+
+    poetry run python -m benchmarks.equivalence --seeds 10 --stores memory,sqlite
+
+Every case is converted unpruned, pruned and pruned of all repeated
+dependencies. Exits 1 if any depGraph differs from the reference's, or if
+the geometric mean speedup of a store is below --min-speedup, so a change
+to the engine can be gated on both.
+"""
+
+import argparse
+import json
+import math
+import sys
+from bazel2snyk.test.equivalence import PRUNE_MODES
+from bazel2snyk.test.equivalence import compare
+from bazel2snyk.test.equivalence import fixture_cases
+from bazel2snyk.test.equivalence import random_cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seeds", type=int, default=5)
+    parser.add_argument("--target-count", type=int, default=100)
+    parser.add_argument("--package-count", type=int, default=75)
+    parser.add_argument("--stores", default="memory")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--min-speedup", type=float, default=0.0)
+    parser.add_argument("--verbose", action="store_true", help="Print every case")
+    args = parser.parse_args()
+
+    # labels of other package sources are converted differently from the
+    # reference on purpose, test_equivalence.py asserts how
+    cases = fixture_cases() + list(
+        random_cases(
+            range(args.seeds),
+            target_count=args.target_count,
+            package_count=args.package_count,
+            other_source_labels=False,
+        )
+    )
+    failed = False
+    for store in args.stores.split(","):
+        speedups = []
+        differing = 0
+        for case in cases:
+            for prune_mode in PRUNE_MODES:
+                # keep the fastest of each engine's runs
+                results = [compare(case, prune_mode, store) for _ in range(args.repeat)]
+                result = results[0]._replace(
+                    reference_seconds=min(x.reference_seconds for x in results),
+                    engine_seconds=min(x.engine_seconds for x in results),
+                )
+                speedups.append(result.speedup)
+                if not result.equivalent:
+                    differing += 1
+                    print(f"{result.case} differs:", file=sys.stderr)
+                    for difference in result.differences[:20]:
+                        print(f"    {difference}", file=sys.stderr)
+                if args.verbose:
+                    row = {
+                        "equivalent": result.equivalent,
+                        "reference_s": round(result.reference_seconds, 4),
+                        "engine_s": round(result.engine_seconds, 4),
+                        "speedup": round(result.speedup, 2),
+                    }
+                    print(f"{result.case}: {json.dumps(row)}")
+        speedup = math.exp(sum(map(math.log, speedups)) / len(speedups))
+        summary = {
+            "cases": len(speedups),
+            "differing": differing,
+            "speedup": round(speedup, 2),
+            "min_speedup": round(min(speedups), 2),
+        }
+        print(f"{store:>8}: {json.dumps(summary)}")
+        failed = failed or differing > 0 or speedup < args.min_speedup
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
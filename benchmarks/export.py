@@ -0,0 +1,78 @@
+"""
+Benchmark a fleet-wide query, the number of targets depending on each
+package, over indented depGraph JSON files as written by print-graph and
+over the NDJSON tables written by export
+
+    poetry run python -m benchmarks.export --target-count 200 --export-count 100
+
+Both are converted once, the query is timed reading them back from disk.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from benchmarks.graph_store import synthetic_rules_index
+from bazel2snyk.converter import Converter
+from bazel2snyk.export import GraphExporter
+from bazel2snyk.depgraph import iter_json
+
+
+def query_json_files(directory: str) -> Counter:
+    counts = Counter()
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name)) as f:
+            dep_graph = json.load(f)
+        counts.update({x["id"] for x in dep_graph["depGraph"]["pkgs"]})
+    return counts
+
+
+def query_tables(directory: str) -> Counter:
+    with open(os.path.join(directory, "pkgs.ndjson")) as f:
+        pkgs = {}
+        for line in f:
+            row = json.loads(line)
+            pkgs[row["pkg"]] = f"{row['name']}@{row['version']}"
+    with open(os.path.join(directory, "nodes.ndjson")) as f:
+        pairs = {(row["target"], row["pkg"]) for row in map(json.loads, f)}
+    return Counter(pkgs[pkg] for _, pkg in pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target-count", type=int, default=200)
+    parser.add_argument("--export-count", type=int, default=100)
+    args = parser.parse_args()
+
+    converter = Converter(synthetic_rules_index(args.target_count))
+    with tempfile.TemporaryDirectory() as directory:
+        json_dir = os.path.join(directory, "json")
+        export_dir = os.path.join(directory, "export")
+        os.makedirs(json_dir)
+        with GraphExporter(export_dir) as exporter:
+            for i in range(args.export_count):
+                target = f"//pkg{i}:lib"
+                dep_graph = converter.convert(target)["maven"]
+                with open(os.path.join(json_dir, f"pkg{i}.json"), "w") as f:
+                    for chunk in iter_json(dep_graph.serializable(), indent=4):
+                        f.write(chunk)
+                exporter.export(target, "maven", dep_graph)
+
+        results = {}
+        for name, query, path in (
+            ("json", query_json_files, json_dir),
+            ("ndjson", query_tables, export_dir),
+        ):
+            size = sum(os.path.getsize(os.path.join(path, x)) for x in os.listdir(path))
+            start = time.perf_counter()
+            results[name] = query(path)
+            elapsed = time.perf_counter() - start
+            result = {"query_s": round(elapsed, 3), "mb": round(size / 1024 / 1024, 1)}
+            print(f"{name:>8}: {json.dumps(result)}")
+        assert results["json"] == results["ndjson"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Throughput benchmarks for the coordinate extractors
+
+    poetry run python -m benchmarks.extractors --rule-count 100000
+    poetry run python -m benchmarks.extractors --repo-counts 1,10,100
+
+Every registered extractor must provide a synthetic rule generator
+in SYNTHETIC_RULES, so each package source ships with a benchmark.
+"""
+
+import argparse
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+from bazel2snyk.extractors import EXTRACTORS
+from bazel2snyk.extractors import RepoMatcher
+from bazel2snyk.rules import BazelRule
+
+BUILD_LOCATION = "/external/repo/BUILD.bazel:1:1"
+
+
+def maven_rules(count: int) -> List[BazelRule]:
+    return [
+        BazelRule(
+            name=f"@maven//:com_example_artifact_{i}",
+            rule_class="jvm_import",
+            location=BUILD_LOCATION,
+            lists={
+                "tags": [f"maven_coordinates=com.example:artifact-{i}:1.0.{i}"],
+            },
+            strings={},
+        )
+        for i in range(count)
+    ]
+
+
+def pip_rules(count: int) -> List[BazelRule]:
+    return [
+        BazelRule(
+            name=f"@pypi_package{i}//:pkg",
+            rule_class="py_library",
+            location=BUILD_LOCATION,
+            lists={
+                "data": [
+                    f"@pypi_package{i}//:site-packages/package{i}-1.0.{i}.dist-info/INSTALLER",
+                ]
+            },
+            strings={},
+        )
+        for i in range(count)
+    ]
+
+
+def go_rules(count: int) -> List[BazelRule]:
+    rules = []
+    for i in range(count):
+        rules.append(
+            BazelRule(
+                name=f"//external:com_github_example_module{i}",
+                rule_class="go_repository",
+                location="/WORKSPACE:1:1",
+                lists={},
+                strings={
+                    "importpath": f"github.com/example/module{i}",
+                    "version": f"v1.0.{i}",
+                },
+            )
+        )
+        rules.append(
+            BazelRule(
+                name=f"@com_github_example_module{i}//:go_default_library",
+                rule_class="go_library",
+                location=BUILD_LOCATION,
+                lists={},
+                strings={"importpath": f"github.com/example/module{i}"},
+            )
+        )
+    return rules
+
+
+def npm_rules(count: int) -> List[BazelRule]:
+    return [
+        BazelRule(
+            name=f"//:.aspect_rules_js/node_modules/@example+package{i}@1.0.{i}",
+            rule_class="npm_package_store",
+            location="/BUILD.bazel:1:1",
+            lists={},
+            strings={},
+        )
+        for i in range(count)
+    ]
+
+
+def cargo_rules(count: int) -> List[BazelRule]:
+    return [
+        BazelRule(
+            name=f"@crates__crate{i}-1.0.{i}//:crate{i}",
+            rule_class="rust_library",
+            location=BUILD_LOCATION,
+            lists={},
+            strings={"version": f"1.0.{i}"},
+        )
+        for i in range(count)
+    ]
+
+
+SYNTHETIC_RULES: Dict[str, Callable[[int], List[BazelRule]]] = {
+    "maven": maven_rules,
+    "pip": pip_rules,
+    "go": go_rules,
+    "npm": npm_rules,
+    "cargo": cargo_rules,
+}
+
+
+def benchmark_extractor(package_source: str, rule_count: int) -> float:
+    """
+    Return the number of rules per second a single extractor resolves,
+    after classifying them with the repo matcher
+    """
+    rules = SYNTHETIC_RULES[package_source](rule_count)
+    rules_index = {x.name: x for x in rules}
+    extractors = {name: extractor() for name, extractor in EXTRACTORS.items()}
+    extractor = extractors[package_source]
+    extractor.prepare(rules_index)
+    repo_matcher = RepoMatcher(extractors)
+
+    start = time.perf_counter()
+    matched = [
+        x
+        for x in rules
+        if (match := repo_matcher.match(x.name))
+        and match.package_source == package_source
+    ]
+    coordinates = extractor.extract(matched)
+    elapsed = time.perf_counter() - start
+
+    assert len(coordinates) == len(matched) > 0
+    return len(rules) / elapsed
+
+
+def benchmark_repo_matchers(repo_count: int, label_count: int) -> Dict[str, float]:
+    """
+    Return the number of labels per second the repo matcher classifies, and
+    classifies and maps to hubs, by canonical repo name with repo_count
+    maven hubs configured
+    """
+    extractors = {name: extractor() for name, extractor in EXTRACTORS.items()}
+    extractors["maven"].repo_names = [f"@maven_hub{i}" for i in range(repo_count)]
+    labels = [
+        f"@@rules_jvm_external~~maven~maven_hub{i % repo_count}//:artifact_{i}"
+        for i in range(label_count)
+    ]
+
+    repo_matcher = RepoMatcher(extractors)
+    start = time.perf_counter()
+    assert all(repo_matcher.package_source(x) for x in labels)
+    matcher_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert all(repo_matcher.match(x).hub for x in labels)
+    hub_elapsed = time.perf_counter() - start
+
+    return {
+        "matcher": label_count / matcher_elapsed,
+        "matcher+hub": label_count / hub_elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rule-count", type=int, default=100000)
+    parser.add_argument("--repo-counts", default=None)
+    args = parser.parse_args()
+
+    if args.repo_counts:
+        for repo_count in map(int, args.repo_counts.split(",")):
+            rates = benchmark_repo_matchers(repo_count, args.rule_count)
+            print(
+                f"{repo_count:>5} repos: "
+                + ", ".join(f"{k} {v:>12,.0f} labels/s" for k, v in rates.items())
+            )
+        return
+
+    for package_source in EXTRACTORS:
+        rules_per_second = benchmark_extractor(package_source, args.rule_count)
+        print(f"{package_source:>8}: {rules_per_second:>12,.0f} rules/s")
+
+
+if __name__ == "__main__":
+    main()
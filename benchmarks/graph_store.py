@@ -0,0 +1,107 @@
+"""
+Benchmark converting a large synthetic target with each depGraph storage engine
+
+    poetry run python -m benchmarks.graph_store --stores memory,sqlite
+
+Each engine runs in a fresh process, so the peak resident memory
+reported is that of the conversion alone.
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+from typing import Dict
+from bazel2snyk.converter import Converter
+from bazel2snyk.depgraph import iter_json
+from bazel2snyk.rules import BazelRule
+
+BUILD_LOCATION = "/workspace/BUILD.bazel:1:1"
+
+
+def synthetic_rules_index(target_count: int) -> Dict[str, BazelRule]:
+    """
+    A root target depending on every first-party target, each of which
+    depends on two other targets and on two of a pool of maven artifacts
+    """
+    artifact_count = max(target_count // 4, 1)
+    rules = {}
+    for i in range(artifact_count):
+        rules[f"@maven//:com_example_artifact_{i}"] = BazelRule(
+            name=f"@maven//:com_example_artifact_{i}",
+            rule_class="jvm_import",
+            location=BUILD_LOCATION,
+            lists={
+                "tags": [f"maven_coordinates=com.example:artifact-{i}:1.0.{i}"],
+                "deps": [f"@maven//:com_example_artifact_{(i + 1) % artifact_count}"]
+                if i % 8
+                else [],
+            },
+            strings={},
+        )
+    for i in range(target_count):
+        rules[f"//pkg{i}:lib"] = BazelRule(
+            name=f"//pkg{i}:lib",
+            rule_class="java_library",
+            location=BUILD_LOCATION,
+            lists={
+                "deps": [
+                    f"//pkg{j}:lib" for j in (i * 2 + 1, i * 2 + 2) if j < target_count
+                ]
+                + [
+                    f"@maven//:com_example_artifact_{(i * 7 + k) % artifact_count}"
+                    for k in (0, 1)
+                ]
+            },
+            strings={},
+        )
+    rules["//:all"] = BazelRule(
+        name="//:all",
+        rule_class="java_library",
+        location=BUILD_LOCATION,
+        lists={"deps": ["//pkg0:lib"]},
+        strings={},
+    )
+    return rules
+
+
+def run(graph_store: str, target_count: int, queue):
+    converter = Converter(synthetic_rules_index(target_count), graph_store=graph_store)
+    start = time.perf_counter()
+    dep_graph = converter.convert("//:all", prune_all=True)["maven"]
+    converted = time.perf_counter() - start
+    size = sum(len(x) for x in iter_json(dep_graph.serializable()))
+    written = time.perf_counter() - start - converted
+    # ru_maxrss is in KiB on linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((converted, written, size, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target-count", type=int, default=1000)
+    parser.add_argument("--stores", default="memory,sqlite")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for graph_store in args.stores.split(","):
+        queue = context.Queue()
+        process = context.Process(
+            target=run, args=(graph_store, args.target_count, queue)
+        )
+        process.start()
+        converted, written, size, peak_mb = queue.get()
+        process.join()
+        results[graph_store] = {
+            "convert_s": round(converted, 2),
+            "serialize_s": round(written, 2),
+            "json_mb": round(size / 1024 / 1024, 1),
+            "peak_rss_mb": round(peak_mb),
+        }
+        print(f"{graph_store:>8}: {json.dumps(results[graph_store])}")
+
+
+if __name__ == "__main__":
+    main()
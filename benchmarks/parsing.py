@@ -0,0 +1,67 @@
+"""
+Benchmark indexing a large synthetic query output serially and in parallel
+
+    poetry run python -m benchmarks.parsing --rule-count 200000 --workers 1,2,4,8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from bazel2snyk.rules import build_rules_index_from_stream
+from bazel2snyk.rules import build_rules_index_parallel
+
+RULE_TEMPLATE = """    <rule class="jvm_import" location="/external/maven/BUILD:{i}:11"
+          name="@maven//:com_example_artifact_{i}">
+        <string name="name" value="com_example_artifact_{i}"/>
+        <list name="tags">
+            <string value="maven_coordinates=com.example:artifact-{i}:1.0.{i}"/>
+        </list>
+        <list name="deps">
+            <label value="@maven//:com_example_artifact_{dep}"/>
+        </list>
+        <rule-input name="@maven//:com_example_artifact_{dep}"/>
+    </rule>
+    <source-file location="/external/maven/artifact-{i}.jar:1:1"
+                 name="@maven//:artifact-{i}.jar">
+        <visibility-label name="//visibility:public"/>
+    </source-file>
+"""
+
+
+def write_query_output(path: str, rule_count: int):
+    with open(path, "w") as f:
+        f.write('<?xml version="1.1" encoding="UTF-8" standalone="no"?>\n')
+        f.write('<query version="2">\n')
+        for i in range(rule_count):
+            f.write(RULE_TEMPLATE.format(i=i, dep=(i + 1) % rule_count))
+        f.write("</query>\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rule-count", type=int, default=200000)
+    parser.add_argument("--workers", default="1,2,4")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bazel_deps.xml")
+        write_query_output(path, args.rule_count)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"{args.rule_count} rules, {size_mb:.0f}MB")
+
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            build_rules_index_from_stream(f)
+        serial = time.perf_counter() - start
+        print(f" serial: {serial:.2f}s")
+
+        for workers in [int(x) for x in args.workers.split(",")]:
+            start = time.perf_counter()
+            build_rules_index_parallel(path, workers)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>7}: {elapsed:.2f}s ({serial / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark rendering the --print-deps tree of a large synthetic target
+
+    poetry run python -m benchmarks.print_deps --target-count 2000
+
+Reports the lines written and the seconds taken for each format, next to
+the lines a tree reprinting every shared subtree would have.
+"""
+
+import argparse
+import json
+import os
+import time
+from functools import lru_cache
+from benchmarks.graph_store import synthetic_rules_index
+from bazel2snyk.converter import Converter
+from bazel2snyk.tree import TREE_FORMATS
+from bazel2snyk.tree import write_dependency_tree
+
+ROOT_TARGET = "//:all"
+
+
+class LineCounter(object):
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, text: str):
+        self.lines += text.count("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target-count", type=int, default=2000)
+    args = parser.parse_args()
+
+    converter = Converter(
+        synthetic_rules_index(args.target_count), graph_store="sqlite"
+    )
+    bazel2snyk = converter.traverse(ROOT_TARGET)
+    get_children = bazel2snyk.bazel_xml_parser.get_children_from_rule
+
+    @lru_cache(maxsize=None)
+    def tree_lines(node: str) -> int:
+        return 1 + sum(tree_lines(x) for x in get_children(node))
+
+    print(f"{'full':>8}: {json.dumps({'lines': tree_lines(ROOT_TARGET)})}")
+    for output_format in TREE_FORMATS:
+        counter = LineCounter()
+        write_dependency_tree(
+            bazel2snyk, ROOT_TARGET, counter, output_format=output_format
+        )
+        with open(os.devnull, "w") as f:
+            start = time.perf_counter()
+            write_dependency_tree(
+                bazel2snyk, ROOT_TARGET, f, output_format=output_format
+            )
+            elapsed = time.perf_counter() - start
+        result = {"lines": counter.lines, "seconds": round(elapsed, 3)}
+        print(f"{output_format:>8}: {json.dumps(result)}")
+
+
+if __name__ == "__main__":
+    main()
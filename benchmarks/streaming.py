@@ -0,0 +1,80 @@
+"""
+Benchmark summarizing a large synthetic test response, parsed in full
+as test --output-format=json does and streamed as with summary
+
+    poetry run python -m benchmarks.streaming --issue-count 5000
+
+Peak memory is measured with tracemalloc and excludes the response bytes.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from bazel2snyk.cli import RESPONSE_CHUNK_SIZE
+from bazel2snyk.streaming import iter_dict_members
+from bazel2snyk.streaming import iter_response_members
+from bazel2snyk.streaming import summarize_test_response
+
+
+def synthetic_response(issue_count: int) -> bytes:
+    return json.dumps(
+        {
+            "ok": False,
+            "packageManager": "maven",
+            "issuesData": {
+                f"SNYK-{i}": {
+                    "id": f"SNYK-{i}",
+                    "severity": "high",
+                    "title": f"Issue {i}",
+                    "description": "Lorem ipsum dolor sit amet. " * 100,
+                    "semver": {"vulnerable": [f"[,1.{i})"]},
+                }
+                for i in range(issue_count)
+            },
+            "issues": [
+                {
+                    "pkgName": f"com.example:artifact-{i}",
+                    "pkgVersion": "1.0",
+                    "issueId": f"SNYK-{i}",
+                }
+                for i in range(issue_count)
+            ],
+        }
+    ).encode()
+
+
+def parsed(data: bytes):
+    response = json.loads(data)
+    json.dumps(response, indent=4)
+    return summarize_test_response(iter_dict_members(response))
+
+
+def streamed(data: bytes):
+    chunks = (
+        data[i : i + RESPONSE_CHUNK_SIZE]
+        for i in range(0, len(data), RESPONSE_CHUNK_SIZE)
+    )
+    return summarize_test_response(iter_response_members(chunks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--issue-count", type=int, default=5000)
+    args = parser.parse_args()
+
+    data = synthetic_response(args.issue_count)
+    print(f"response: {len(data) / 1024 / 1024:.1f} MB")
+    for name, func in (("parsed", parsed), ("streamed", streamed)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+        result = {"s": round(elapsed, 2), "peak_mb": round(peak_mb, 1)}
+        print(f"{name:>8}: {json.dumps(result)}")
+
+
+if __name__ == "__main__":
+    main()